@@ -1,6 +1,7 @@
 from anthill.framework.utils.text import slugify, camel_case_to_spaces, class_name
 from anthill.framework.utils.module_loading import import_string
 from anthill.framework.utils.functional import cached_property
+from anthill.framework.utils.scoping import get_scope_ident
 from anthill.framework.conf import settings
 from marshmallow_sqlalchemy import ModelConversionError, ModelSchema, convert
 from sqlalchemy_utils import get_columns
@@ -8,7 +9,6 @@ from sqlalchemy import event
 from urllib.parse import urlparse, urljoin
 from collections import defaultdict
 from itertools import chain
-from _thread import get_ident
 import importlib
 import logging
 import re
@@ -124,7 +124,7 @@ class Application:
         self._latest_version = None
         self.has_updates = False
 
-        setattr(self, '__ident_func__', get_ident)
+        setattr(self, '__ident_func__', get_scope_ident)
 
     def __repr__(self):
         return '<%s: %s>' % (self.__class__.__name__, self.label)
@@ -321,6 +321,10 @@ class Application:
         import sqlalchemy as sa
         sa.orm.configure_mappers()
 
+        if getattr(settings, 'CACHE_MODEL_TAGS_INVALIDATION', False):
+            from anthill.framework.core.cache.tags import connect_model_invalidation
+            connect_model_invalidation()
+
     def setup_extra_models(self):
         pass
 
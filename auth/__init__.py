@@ -2,6 +2,7 @@ from anthill.framework.conf import settings
 from anthill.framework.apps.builder import app
 from anthill.framework.core.exceptions import ImproperlyConfigured, PermissionDenied
 from anthill.framework.utils.module_loading import import_string
+import functools
 import inspect
 
 SESSION_KEY = '_auth_user_id'
@@ -10,7 +11,9 @@ HASH_SESSION_KEY = '_auth_user_hash'
 REDIRECT_FIELD_NAME = 'next'
 
 
+@functools.lru_cache(maxsize=None)
 def load_backend(path):
+    """Return authentication backend instance, created once per process."""
     return import_string(path)()
 
 
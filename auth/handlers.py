@@ -71,7 +71,9 @@ class LoginHandlerMixin:
 
 class LogoutHandlerMixin:
     async def logout(self):
-        if not isinstance(self.current_user, (AnonymousUser, type(None))):
+        # noinspection PyUnresolvedReferences
+        user = await self.aget_current_user()
+        if not isinstance(user, (AnonymousUser, type(None))):
             self.session.flush()
             # noinspection PyAttributeOutsideInit
             self.current_user = AnonymousUser()
@@ -107,7 +109,7 @@ class LoginHandler(LoginHandlerMixin, FormHandler):
         """Security check complete. Log the user in."""
         user = await form.authenticate(self.request)
         self.login(user)
-        self.redirect(self.get_success_url())
+        await self.redirect(self.get_success_url())
 
 
 class LogoutHandler(LogoutHandlerMixin, RedirectHandler):
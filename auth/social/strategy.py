@@ -64,7 +64,7 @@ class TornadoStrategy(BaseStrategy):
         return self.request_handler.is_secure()
 
     def redirect(self, url):
-        self.request_handler.redirect(url)
+        return self.request_handler.redirect(url)
 
     def html(self, content):
         self.request_handler.write(content)
@@ -33,6 +33,15 @@ LOCALE_PATH = None
 LOCATION = 'http://localhost:9600'
 UNIX_SOCKET = None
 
+# Number of server worker processes. A value of 1 disables pre-fork mode,
+# 0 or None forks one worker per CPU core.
+SERVER_PROCESSES = 1
+# Maximum number of crashed workers the supervisor respawns before giving up.
+SERVER_MAX_RESTARTS = 100
+# Bind a separate SO_REUSEPORT socket in every worker, so the kernel
+# balances incoming connections between them.
+SERVER_REUSE_PORT = False
+
 ROUTES_CONF = None
 MODELS_CONF = None
 MANAGEMENT_CONF = None
@@ -153,6 +162,12 @@ CACHES = {
     }
 }
 
+# Invalidate cache tags of models on commit.
+# Requires SQLALCHEMY_TRACK_MODIFICATIONS to be enabled.
+CACHE_MODEL_TAGS_INVALIDATION = False
+# The cache alias to keep tag versions in.
+CACHE_TAGS_ALIAS = 'default'
+
 # People who get code error notifications.
 # In the format [('Full Name', 'email@example.com'), ('Full Name', 'anotheremail@example.com')]
 ADMINS = []
@@ -163,6 +178,11 @@ MANAGERS = ADMINS
 
 DEFAULT_CHARSET = 'utf-8'
 
+# JSON engine used for handlers responses, json-rpc, graphql and signing.
+# 'json' (standard library), 'orjson' or dotted path to engine class.
+# See anthill.framework.utils.jsonengine.
+JSON_ENGINE = 'json'
+
 ##############
 # SQLALCHEMY #
 ##############
@@ -281,7 +301,7 @@ HIDE_SERVER_VERSION = False
 # SESSIONS #
 ############
 
-# Cache to store session data if using the cache session backend.
+# Cache to store session data if using the cache or redis_hash session backend.
 SESSION_CACHE_ALIAS = 'default'
 # Cookie name. This can be whatever you want.
 SESSION_COOKIE_NAME = 'sessionid'
@@ -306,6 +326,13 @@ SESSION_ENGINE = 'anthill.framework.sessions.backends.cache'
 SESSION_FILE_PATH = None
 # class to serialize session data
 SESSION_SERIALIZER = 'anthill.framework.sessions.serializers.JSONSerializer'
+# Interval in seconds of periodic removal of expired sessions
+# by the server, or None to disable it.
+SESSION_GC_INTERVAL = None
+# Max number of expired sessions removed at once.
+SESSION_GC_BATCH_SIZE = 1000
+# Delay in seconds between batches, so removal does not compete with requests.
+SESSION_GC_BATCH_DELAY = 1
 
 OUTPUT_TRANSFORMS = [
     'tornado.web.GZipContentEncoding',
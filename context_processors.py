@@ -1,34 +1,112 @@
 from anthill.framework.conf import settings
 from anthill.framework.utils.module_loading import import_string
 from anthill.framework.core.exceptions import ImproperlyConfigured
+from anthill.framework.utils.scoping import get_scope_ident, run_in_new_scope
 from tornado.web import RequestHandler
+from collections import namedtuple
+import functools
 import logging
 import inspect
+import asyncio
 
 logger = logging.getLogger('anthill.handlers')
 
 CONTEXT_PROCESSORS = getattr(settings, 'CONTEXT_PROCESSORS', [])
 
 
+ContextProcessor = namedtuple('ContextProcessor', ['name', 'func', 'is_async', 'memoize'])
+
+
+def memoize_per_request(func):
+    """
+    Mark context processor to be called at most once per request.
+    Its result is reused by all templates rendered by the handler.
+    """
+    func.memoize_per_request = True
+    return func
+
+
+@functools.lru_cache(maxsize=None)
+def get_context_processors():
+    """
+    Returns tuple of configured context processors,
+    imported and classified once.
+    """
+    processors = []
+    for path in CONTEXT_PROCESSORS:
+        f = import_string(path)
+        processors.append(ContextProcessor(
+            name=getattr(f, '__name__', path),
+            func=f,
+            # Context processor can be either co routine or plain function
+            is_async=inspect.iscoroutinefunction(f),
+            memoize=getattr(f, 'memoize_per_request', False)
+        ))
+    return tuple(processors)
+
+
+def _check_result(processor, result):
+    if not isinstance(result, dict):
+        raise ImproperlyConfigured(
+            'Context processor `%s` must return dict object, '
+            'but `%s` returned' % (processor.name, type(result)))
+    if not result:
+        logger.warning('Empty result for context processor `%s`' % processor.name)
+    return result
+
+
+def _call_in_own_scope(handler, func):
+    # Called within a new scope. Database session of the scope is removed
+    # as soon as processor is done, so concurrent processors never share
+    # the request's session. Without contextvars the new scope is
+    # the request's one, so the session must be kept.
+    call_in_db_scope = getattr(handler, 'call_in_db_scope', None)
+    if call_in_db_scope is None or get_scope_ident() == handler.db_scope:
+        return asyncio.ensure_future(func(handler))
+    return asyncio.ensure_future(call_in_db_scope(func, handler))
+
+
 async def build_context_from_context_processors(handler: RequestHandler) -> dict:
-    """Build extra context for current handler on every request."""
+    """
+    Build extra context for current handler on every request.
+
+    Coroutine processors run concurrently, each one in its own scope
+    with its own database session. Results are merged in the order
+    processors are configured.
+    """
+    processors = get_context_processors()
+    if not processors:
+        return {}
+    if not isinstance(handler, RequestHandler):
+        raise ImproperlyConfigured(
+            'Context processor `%s` got `%s` object, '
+            'but need `RequestHandler`' % (processors[0].name, handler.__class__.__name__)
+        )
+
+    # Results of memoized processors for the current request.
+    memo = handler.__dict__.setdefault('_context_processors_memo', {})
+    results = [None] * len(processors)
+    pending = []
+
+    for i, processor in enumerate(processors):
+        if processor.memoize and i in memo:
+            results[i] = memo[i]
+        elif processor.is_async:
+            pending.append(i)
+        else:
+            results[i] = _check_result(processor, processor.func(handler))
+
+    if pending:
+        done = await asyncio.gather(*(
+            run_in_new_scope(_call_in_own_scope, handler, processors[i].func) for i in pending))
+        for i, result in zip(pending, done):
+            results[i] = _check_result(processors[i], result)
+
     ctx = {}
-    for ctx_processor in CONTEXT_PROCESSORS:
-        f = import_string(ctx_processor)
-        # Context processor can be either co routine or plain function
-        result = await f(handler) if inspect.iscoroutinefunction(f) else f(handler)
-        if not isinstance(handler, RequestHandler):
-            raise ImproperlyConfigured(
-                'Context processor `%s` got `%s` object, '
-                'but need `RequestHandler`' % (f.__name__, handler.__class__.__name__)
-            )
-        if not isinstance(result, dict):
-            raise ImproperlyConfigured(
-                'Context processor `%s` must return dict object, '
-                'but `%s` returned' % (f.__name__, type(result)))
-        if not result:
-            logging.warning('Empty result for context processor `%s`' % f.__name__)
-        ctx.update(result)
+    for i, processor in enumerate(processors):
+        if processor.memoize:
+            memo[i] = results[i]
+        ctx.update(results[i])
     return ctx
 
 
@@ -1,11 +1,18 @@
 """Base Cache class."""
 
+import asyncio
+import inspect
+import logging
 import time
+import uuid
 import warnings
 
 from anthill.framework.core.exceptions import ImproperlyConfigured
+from anthill.framework.utils.asynchronous import thread_pool_exec
 from anthill.framework.utils.module_loading import import_string
 
+logger = logging.getLogger('anthill.application')
+
 
 class InvalidCacheBackendError(ImproperlyConfigured):
     ...
@@ -49,6 +56,11 @@ def get_key_func(key_func):
 
 
 class BaseCache:
+    # Whether the backend operations block on I/O (disk, network).
+    # If so, the default async API runs them in the thread pool,
+    # otherwise calls them directly on the IOLoop.
+    io_bound = True
+
     def __init__(self, params):
         timeout = params.get('timeout', params.get('TIMEOUT', 300))
         if timeout is not None:
@@ -75,6 +87,9 @@ class BaseCache:
         self.version = params.get('VERSION', 1)
         self.key_func = get_key_func(params.get('KEY_FUNCTION'))
 
+        # Recomputations of aget_or_set() in progress.
+        self._inflight = {}
+
     def get_backend_timeout(self, timeout=DEFAULT_TIMEOUT):
         """
         Return the timeout value usable by this backend based upon the provided
@@ -111,6 +126,20 @@ class BaseCache:
         """
         raise NotImplementedError('subclasses of BaseCache must provide an add() method')
 
+    def replace(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """
+        Set a value in the cache only if the key already exists. If
+        timeout is given, use that timeout for the key; otherwise use the
+        default cache timeout.
+
+        Return True if the value was stored, False otherwise.
+        Backends supporting it should do this in one atomic operation.
+        """
+        if not self.has_key(key, version=version):
+            return False
+        self.set(key, value, timeout=timeout, version=version)
+        return True
+
     def get(self, key, default=None, version=None):
         """
         Fetch a given key from the cache. If the key does not exist, return
@@ -274,3 +303,156 @@ class BaseCache:
 
     def close(self, **kwargs):
         """Close the cache connection"""
+
+    async def _run_async(self, func, *args, **kwargs):
+        if self.io_bound:
+            return await thread_pool_exec(func, *args, **kwargs)
+        return func(*args, **kwargs)
+
+    async def aadd(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """Async version of add()."""
+        return await self._run_async(self.add, key, value, timeout=timeout, version=version)
+
+    async def areplace(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """Async version of replace()."""
+        return await self._run_async(self.replace, key, value, timeout=timeout, version=version)
+
+    async def aget(self, key, default=None, version=None):
+        """Async version of get()."""
+        return await self._run_async(self.get, key, default=default, version=version)
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """Async version of set()."""
+        return await self._run_async(self.set, key, value, timeout=timeout, version=version)
+
+    async def adelete(self, key, version=None):
+        """Async version of delete()."""
+        return await self._run_async(self.delete, key, version=version)
+
+    async def aget_many(self, keys, version=None):
+        """Async version of get_many()."""
+        return await self._run_async(self.get_many, keys, version=version)
+
+    async def aset_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        """Async version of set_many()."""
+        return await self._run_async(self.set_many, data, timeout=timeout, version=version)
+
+    async def adelete_many(self, keys, version=None):
+        """Async version of delete_many()."""
+        return await self._run_async(self.delete_many, keys, version=version)
+
+    async def ahas_key(self, key, version=None):
+        """Async version of has_key()."""
+        return await self._run_async(self.has_key, key, version=version)
+
+    async def aincr(self, key, delta=1, version=None):
+        """Async version of incr()."""
+        return await self._run_async(self.incr, key, delta=delta, version=version)
+
+    async def adecr(self, key, delta=1, version=None):
+        """Async version of decr()."""
+        return await self._run_async(self.decr, key, delta=delta, version=version)
+
+    async def aclear(self):
+        """Async version of clear()."""
+        return await self._run_async(self.clear)
+
+    # Stale-while-revalidate
+
+    SWR_MARKER = '__swr__'
+
+    def _is_swr_entry(self, entry):
+        # JSON serializers turn tuples into lists.
+        return (isinstance(entry, (tuple, list)) and len(entry) == 3
+                and entry[0] == self.SWR_MARKER)
+
+    async def _aacquire_refresh_lock(self, key, version=None, timeout=10):
+        """
+        Acquires short lock, so only one process recomputes the key.
+        Returns lock object or None if the lock is held by somebody else.
+        """
+        lock_key = '%s:refresh-lock' % key
+        token = uuid.uuid4().hex
+        if await self.aadd(lock_key, token, timeout=timeout, version=version):
+            return lock_key, token, version
+        return None
+
+    async def _arelease_refresh_lock(self, lock):
+        lock_key, token, version = lock
+        if await self.aget(lock_key, version=version) == token:
+            await self.adelete(lock_key, version=version)
+
+    async def _arecompute(self, key, producer, ttl, stale_ttl, version, lock_timeout, stale):
+        lock = await self._aacquire_refresh_lock(key, version=version, timeout=lock_timeout)
+        if lock is None:
+            if stale:
+                # Other process refreshes the value, keep serving stale one.
+                return
+            # Wait for the value computed by other process.
+            deadline = time.monotonic() + lock_timeout
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+                entry = await self.aget(key, version=version)
+                if self._is_swr_entry(entry):
+                    return entry[1]
+        try:
+            value = producer()
+            if inspect.isawaitable(value):
+                value = await value
+            if ttl is None:
+                entry, timeout = (self.SWR_MARKER, value, None), None
+            else:
+                entry, timeout = (self.SWR_MARKER, value, time.time() + ttl), ttl + stale_ttl
+            await self.aset(key, entry, timeout=timeout, version=version)
+            return value
+        finally:
+            if lock is not None:
+                await self._arelease_refresh_lock(lock)
+
+    def _single_flight(self, key, version, coro_func, background=False):
+        flight_key = (key, version, background)
+        future = self._inflight.get(flight_key)
+        if future is None:
+            future = asyncio.ensure_future(coro_func())
+            self._inflight[flight_key] = future
+            future.add_done_callback(lambda f: self._inflight.pop(flight_key, None))
+            if background:
+                future.add_done_callback(self._log_refresh_error)
+        return future
+
+    @staticmethod
+    def _log_refresh_error(future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error('Cache value refresh failed: %s', future.exception())
+
+    async def aget_or_set(self, key, producer, ttl=DEFAULT_TIMEOUT, stale_ttl=0,
+                          version=None, lock_timeout=10):
+        """
+        Fetch a given key from the cache. If the key does not exist,
+        compute it with ``producer`` (a function or coroutine function)
+        and store for ``ttl`` seconds.
+
+        For ``stale_ttl`` seconds after ``ttl`` is passed, the stale value
+        is returned at once, while it is recomputed in background.
+        Concurrent callers in the process wait for the same recomputation,
+        and a short lock keeps other processes from recomputing it too.
+        Recomputation may outlive the caller, so ``producer`` using
+        database should get its own session, e.g. with ``db.scoped``.
+        """
+        if ttl == DEFAULT_TIMEOUT:
+            ttl = self.default_timeout
+        entry = await self.aget(key, version=version)
+
+        def recompute(stale=False):
+            return lambda: self._arecompute(
+                key, producer, ttl, stale_ttl, version, lock_timeout, stale)
+
+        if self._is_swr_entry(entry):
+            marker, value, fresh_until = entry
+            if fresh_until is None or fresh_until > time.time():
+                return value
+            self._single_flight(key, version, recompute(stale=True), background=True)
+            return value
+
+        # Shield the shared future, so cancelled waiter does not cancel it for others.
+        return await asyncio.shield(self._single_flight(key, version, recompute()))
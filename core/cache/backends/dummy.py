@@ -4,6 +4,8 @@ from anthill.framework.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCach
 
 
 class DummyCache(BaseCache):
+    io_bound = False
+
     def __init__(self, host, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
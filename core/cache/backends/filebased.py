@@ -1,11 +1,21 @@
-"""File-based cache backend"""
+"""
+File-based cache backend.
+
+Entries are spread over a two-level hashed directory tree
+(``ab/cd/abcd....cache``), so directories stay small at millions of entries.
+Culling runs in a background thread at most once per ``CULL_INTERVAL``
+seconds, when an estimated number of entries reaches ``MAX_ENTRIES``.
+Entries larger than ``MMAP_THRESHOLD`` bytes are read with mmap.
+"""
 
 import glob
 import hashlib
+import mmap
 import os
 import pickle
 import random
 import tempfile
+import threading
 import time
 import zlib
 
@@ -14,12 +24,40 @@ from anthill.framework.core.files.move import file_move_safe
 from anthill.framework.utils.encoding import force_bytes
 
 
+class _CullState:
+    """Entries counter and culling state of the cache directory, shared by the process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Estimated number of entries, None if not counted yet.
+        self.count = None
+        self.last_cull = 0
+        self.running = False
+        self.pid = os.getpid()
+
+
+_cull_states = {}
+_cull_states_lock = threading.Lock()
+
+
+def _get_cull_state(path):
+    with _cull_states_lock:
+        state = _cull_states.get(path)
+        # Culling thread does not survive fork().
+        if state is None or state.pid != os.getpid():
+            state = _cull_states[path] = _CullState()
+        return state
+
+
 class FileBasedCache(BaseCache):
     cache_suffix = '.cache'
 
     def __init__(self, dir, params):
         super().__init__(params)
+        options = params.get('OPTIONS', {})
         self._dir = os.path.abspath(dir)
+        self._cull_interval = float(options.get('CULL_INTERVAL', 60))
+        self._mmap_threshold = int(options.get('MMAP_THRESHOLD', 1024 * 1024))
         self._createdir()
 
     def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
@@ -33,27 +71,43 @@ class FileBasedCache(BaseCache):
         try:
             with open(fname, 'rb') as f:
                 if not self._is_expired(f):
-                    return pickle.loads(zlib.decompress(f.read()))
+                    return self._read_value(f)
         except FileNotFoundError:
             ...
         return default
 
+    def _read_value(self, f):
+        """Read the value following the expiry header of open cache file `f`."""
+        size = os.fstat(f.fileno()).st_size
+        if size < self._mmap_threshold:
+            return pickle.loads(zlib.decompress(f.read()))
+        # Decompress large entries directly from the page cache,
+        # without copying compressed data into memory.
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            with memoryview(m) as data:
+                return pickle.loads(zlib.decompress(data[f.tell():]))
+
     def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
-        self._createdir()  # Cache dir can be deleted at any time.
         fname = self._key_to_file(key, version)
-        self._cull()  # make some room if necessary
-        fd, tmp_path = tempfile.mkstemp(dir=self._dir)
+        dirname = os.path.dirname(fname)
+        # Cache dir can be deleted at any time.
+        os.makedirs(dirname, 0o700, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=dirname)
         renamed = False
         try:
             with open(fd, 'wb') as f:
                 expiry = self.get_backend_timeout(timeout)
                 f.write(pickle.dumps(expiry, pickle.HIGHEST_PROTOCOL))
                 f.write(zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+            created = not os.path.exists(fname)
             file_move_safe(tmp_path, fname, allow_overwrite=True)
             renamed = True
         finally:
             if not renamed:
                 os.remove(tmp_path)
+        if created:
+            self._update_count(1)
+        self._cull()  # make some room if necessary
 
     def delete(self, key, version=None):
         self._delete(self._key_to_file(key, version))
@@ -65,7 +119,14 @@ class FileBasedCache(BaseCache):
             os.remove(fname)
         except FileNotFoundError:
             # The file may have been removed by another process.
-            ...
+            return
+        self._update_count(-1)
+
+    def _update_count(self, delta):
+        state = _get_cull_state(self._dir)
+        with state.lock:
+            if state.count is not None:
+                state.count = max(0, state.count + delta)
 
     def has_key(self, key, version=None):
         fname = self._key_to_file(key, version)
@@ -75,12 +136,43 @@ class FileBasedCache(BaseCache):
         return False
 
     def _cull(self):
+        """
+        Start culling in background if estimated number of entries reached
+        max_entries and culling was not run for the last CULL_INTERVAL seconds.
+        Number of entries is counted in background on the first call.
+        """
+        state = _get_cull_state(self._dir)
+        with state.lock:
+            if state.running:
+                return
+            if state.count is not None:
+                if state.count < self._max_entries:
+                    return
+                if time.monotonic() - state.last_cull < self._cull_interval:
+                    return
+            state.running = True
+        thread = threading.Thread(
+            target=self._cull_in_background, args=(state,),
+            name='file-cache-cull', daemon=True)
+        thread.start()
+
+    def _cull_in_background(self, state):
+        try:
+            filelist = self._list_cache_files()
+            with state.lock:
+                state.count = len(filelist)
+            self._cull_files(filelist)
+        finally:
+            with state.lock:
+                state.last_cull = time.monotonic()
+                state.running = False
+
+    def _cull_files(self, filelist):
         """
         Remove random cache entries if max_entries is reached at a ratio
         of num_entries / cull_frequency. A value of 0 for CULL_FREQUENCY means
         that the entire cache will be purged.
         """
-        filelist = self._list_cache_files()
         num_entries = len(filelist)
         if num_entries < self._max_entries:
             return  # return early if no culling is required
@@ -102,12 +194,14 @@ class FileBasedCache(BaseCache):
     def _key_to_file(self, key, version=None):
         """
         Convert a key into a cache file path. Basically this is the
-        root cache path joined with the md5sum of the key and a suffix.
+        root cache path joined with two levels of subdirectories named
+        after the md5sum of the key, the md5sum and a suffix.
         """
         key = self.make_key(key, version=version)
         self.validate_key(key)
-        return os.path.join(self._dir, ''.join(
-            [hashlib.md5(force_bytes(key)).hexdigest(), self.cache_suffix]))
+        digest = hashlib.md5(force_bytes(key)).hexdigest()
+        return os.path.join(
+            self._dir, digest[:2], digest[2:4], ''.join([digest, self.cache_suffix]))
 
     def clear(self):
         """
@@ -117,6 +211,9 @@ class FileBasedCache(BaseCache):
             return
         for fname in self._list_cache_files():
             self._delete(fname)
+        state = _get_cull_state(self._dir)
+        with state.lock:
+            state.count = 0
 
     def _is_expired(self, f):
         """
@@ -135,10 +232,24 @@ class FileBasedCache(BaseCache):
     def _list_cache_files(self):
         """
         Get a list of paths to all the cache files. These are all the files
-        in the root cache dir that end on the cache_suffix.
+        in the two-level subdirectories of the root cache dir that end on
+        the cache_suffix. Files of the old flat layout are listed too.
         """
         if not os.path.exists(self._dir):
             return []
         filelist = [os.path.join(self._dir, fname) for fname
                     in glob.glob1(self._dir, '*%s' % self.cache_suffix)]
+        for level1 in self._scan_dirs(self._dir):
+            for level2 in self._scan_dirs(level1):
+                with os.scandir(level2) as it:
+                    filelist.extend(entry.path for entry in it
+                                    if entry.name.endswith(self.cache_suffix))
         return filelist
+
+    @staticmethod
+    def _scan_dirs(path):
+        try:
+            with os.scandir(path) as it:
+                return [entry.path for entry in it if entry.is_dir()]
+        except FileNotFoundError:
+            return []
@@ -1,130 +1,235 @@
-"""Thread-safe in-memory cache backend."""
-
+"""
+Thread-safe in-memory cache backend.
+
+Entries are kept in LRU order, so eviction always drops the least
+recently used entry in O(1). Expired entries are dropped lazily on access
+and from an expiration heap on writes.
+
+Options:
+    MAX_ENTRIES -- max number of entries (default 300).
+    MAX_BYTES -- optional max total size of stored values in bytes.
+    PICKLE -- if False, values are stored by reference, without pickling.
+              Only use it for immutable values. Sizes of such values are
+              estimated with sys.getsizeof() (default True).
+"""
+
+import heapq
 import pickle
+import sys
+import threading
 import time
-from contextlib import contextmanager
+from collections import OrderedDict
 
 from anthill.framework.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
-from anthill.framework.utils.synch import RWLock
 
-# Global in-memory store of cache data. Keyed by name, to provide
+# Global in-memory stores of cache data. Keyed by name, to provide
 # multiple named local memory caches.
-_caches = {}
-_expire_info = {}
-_locks = {}
+_stores = {}
+_stores_lock = threading.Lock()
+
+_MISSING = object()
+
 
+class _Store:
+    """Cache data shared between all backend instances of the same name."""
 
-@contextmanager
-def dummy():
-    """A context manager that does nothing special."""
-    yield
+    def __init__(self):
+        # key -> (value, expiry, size), in LRU order.
+        self.data = OrderedDict()
+        # Heap of (expiry, key). Entries are never removed from it on
+        # update/delete, they are skipped if no longer match the data.
+        self.expiry_heap = []
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+
+def _get_store(name):
+    with _stores_lock:
+        try:
+            return _stores[name]
+        except KeyError:
+            store = _stores[name] = _Store()
+            return store
 
 
 class LocMemCache(BaseCache):
+    io_bound = False
+
     def __init__(self, name, params):
         super().__init__(params)
-        self._cache = _caches.setdefault(name, {})
-        self._expire_info = _expire_info.setdefault(name, {})
-        self._lock = _locks.setdefault(name, RWLock())
+        options = params.get('OPTIONS', {})
+        max_bytes = params.get('max_bytes', options.get('MAX_BYTES'))
+        self._max_bytes = int(max_bytes) if max_bytes else None
+        self._pickle = params.get('pickle', options.get('PICKLE', True))
+        self._store = _get_store(name)
+        self._lock = self._store.lock
+
+    def _encode(self, value):
+        if self._pickle:
+            pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            return pickled, len(pickled)
+        return value, sys.getsizeof(value)
+
+    def _decode(self, value):
+        if self._pickle:
+            return pickle.loads(value)
+        return value
+
+    def _get_entry(self, key):
+        """Returns stored value of the key, or _MISSING. Lock must be held."""
+        store = self._store
+        try:
+            value, expiry, size = store.data[key]
+        except KeyError:
+            return _MISSING
+        if expiry is not None and expiry <= time.time():
+            self._delete(key)
+            store.expirations += 1
+            return _MISSING
+        store.data.move_to_end(key)
+        return value
+
+    def _set(self, key, value, size, timeout=DEFAULT_TIMEOUT):
+        store = self._store
+        expiry = self.get_backend_timeout(timeout)
+        self._delete(key)
+        store.data[key] = (value, expiry, size)
+        store.size += size
+        if expiry is not None:
+            heapq.heappush(store.expiry_heap, (expiry, key))
+        self._cull()
+
+    def _delete(self, key):
+        try:
+            value, expiry, size = self._store.data.pop(key)
+        except KeyError:
+            return False
+        self._store.size -= size
+        return True
+
+    def _purge_expired(self):
+        store = self._store
+        now = time.time()
+        heap = store.expiry_heap
+        while heap and heap[0][0] <= now:
+            expiry, key = heapq.heappop(heap)
+            entry = store.data.get(key)
+            if entry is not None and entry[1] == expiry:
+                self._delete(key)
+                store.expirations += 1
+        # Drop stale heap entries left from updates and deletes.
+        if len(heap) > 2 * len(store.data) + 64:
+            store.expiry_heap = [
+                (expiry, key) for expiry, key in heap
+                if key in store.data and store.data[key][1] == expiry
+            ]
+            heapq.heapify(store.expiry_heap)
+
+    def _cull(self):
+        store = self._store
+        self._purge_expired()
+        while store.data and (
+                len(store.data) > self._max_entries or
+                (self._max_bytes is not None and store.size > self._max_bytes)):
+            key, (value, expiry, size) = store.data.popitem(last=False)
+            store.size -= size
+            store.evictions += 1
 
     def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
         key = self.make_key(key, version=version)
         self.validate_key(key)
-        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
-        with self._lock.writer():
-            if self._has_expired(key):
-                self._set(key, pickled, timeout)
+        value, size = self._encode(value)
+        with self._lock:
+            if self._get_entry(key) is _MISSING:
+                self._set(key, value, size, timeout)
                 return True
             return False
 
-    def get(self, key, default=None, version=None, acquire_lock=True):
+    def get(self, key, default=None, version=None):
         key = self.make_key(key, version=version)
         self.validate_key(key)
-        pickled = None
-        with (self._lock.reader() if acquire_lock else dummy()):
-            if not self._has_expired(key):
-                pickled = self._cache[key]
-        if pickled is not None:
-            try:
-                return pickle.loads(pickled)
-            except pickle.PickleError:
+        with self._lock:
+            value = self._get_entry(key)
+            if value is _MISSING:
+                self._store.misses += 1
                 return default
-
-        with (self._lock.writer() if acquire_lock else dummy()):
-            try:
-                del self._cache[key]
-                del self._expire_info[key]
-            except KeyError:
-                ...
+            self._store.hits += 1
+        try:
+            return self._decode(value)
+        except pickle.PickleError:
             return default
 
-    def _set(self, key, value, timeout=DEFAULT_TIMEOUT):
-        if len(self._cache) >= self._max_entries:
-            self._cull()
-        self._cache[key] = value
-        self._expire_info[key] = self.get_backend_timeout(timeout)
-
     def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
         key = self.make_key(key, version=version)
         self.validate_key(key)
-        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
-        with self._lock.writer():
-            self._set(key, pickled, timeout)
+        value, size = self._encode(value)
+        with self._lock:
+            self._set(key, value, size, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            value = self._get_entry(key)
+            if value is _MISSING:
+                return False
+            self._set(key, value, self._store.data[key][2], timeout)
+            return True
 
     def incr(self, key, delta=1, version=None):
-        with self._lock.writer():
-            value = self.get(key, version=version, acquire_lock=False)
-            if value is None:
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            value = self._get_entry(key)
+            if value is _MISSING:
                 raise ValueError("Key '%s' not found" % key)
-            new_value = value + delta
-            key = self.make_key(key, version=version)
-            pickled = pickle.dumps(new_value, pickle.HIGHEST_PROTOCOL)
-            self._cache[key] = pickled
+            new_value = self._decode(value) + delta
+            value, expiry, size = self._store.data[key]
+            new_pickled, new_size = self._encode(new_value)
+            self._store.data[key] = (new_pickled, expiry, new_size)
+            self._store.size += new_size - size
+            self._cull()
         return new_value
 
     def has_key(self, key, version=None):
         key = self.make_key(key, version=version)
         self.validate_key(key)
-        with self._lock.reader():
-            if not self._has_expired(key):
-                return True
-
-        with self._lock.writer():
-            try:
-                del self._cache[key]
-                del self._expire_info[key]
-            except KeyError:
-                ...
-            return False
-
-    def _has_expired(self, key):
-        exp = self._expire_info.get(key, -1)
-        return exp is not None and exp <= time.time()
-
-    def _cull(self):
-        if self._cull_frequency == 0:
-            self.clear()
-        else:
-            doomed = [k for (i, k) in enumerate(self._cache) if i % self._cull_frequency == 0]
-            for k in doomed:
-                self._delete(k)
-
-    def _delete(self, key):
-        try:
-            del self._cache[key]
-        except KeyError:
-            ...
-        try:
-            del self._expire_info[key]
-        except KeyError:
-            ...
+        with self._lock:
+            return self._get_entry(key) is not _MISSING
 
     def delete(self, key, version=None):
         key = self.make_key(key, version=version)
         self.validate_key(key)
-        with self._lock.writer():
-            self._delete(key)
+        with self._lock:
+            return self._delete(key)
+
+    def _clear(self):
+        self._store.data.clear()
+        self._store.expiry_heap = []
+        self._store.size = 0
 
     def clear(self):
-        self._cache.clear()
-        self._expire_info.clear()
+        with self._lock:
+            self._clear()
+
+    def stats(self):
+        """Returns hit, miss, eviction and expiration counters and current size."""
+        store = self._store
+        with self._lock:
+            return {
+                'hits': store.hits,
+                'misses': store.misses,
+                'evictions': store.evictions,
+                'expirations': store.expirations,
+                'entries': len(store.data),
+                'bytes': store.size,
+            }
+
+    def reset_stats(self):
+        store = self._store
+        with self._lock:
+            store.hits = store.misses = store.evictions = store.expirations = 0
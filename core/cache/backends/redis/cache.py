@@ -1,17 +1,27 @@
+import asyncio
 import functools
 import logging
+import socket
+import threading
 
 from anthill.framework.conf import settings
-from anthill.framework.core.cache.backends.base import BaseCache
+from anthill.framework.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from anthill.framework.core.cache.breaker import CircuitBreaker
 from anthill.framework.utils.module_loading import import_string
+from redis.exceptions import TimeoutError
 
-from .exceptions import ConnectionInterrupted
+from .client.default import _async_lock_exceptions, _main_async_exceptions
+from .exceptions import CircuitBreakerOpen, ConnectionInterrupted
 
 REDIS_IGNORE_EXCEPTIONS = getattr(settings, "REDIS_IGNORE_EXCEPTIONS", False)
 REDIS_LOG_IGNORED_EXCEPTIONS = getattr(settings, "REDIS_LOG_IGNORED_EXCEPTIONS", False)
 REDIS_LOGGER = getattr(settings, "REDIS_LOGGER", False)
 REDIS_SCAN_ITERSIZE = getattr(settings, "REDIS_SCAN_ITERSIZE", 10)
 
+# Refresh lock could not be acquired since redis is not available,
+# the value is recomputed without lock.
+_LOCK_FAILED = object()
+
 
 if REDIS_LOG_IGNORED_EXCEPTIONS:
     logger = logging.getLogger((REDIS_LOGGER or __name__))
@@ -28,18 +38,71 @@ def omit_exception(method=None, return_value=None):
 
     @functools.wraps(method)
     def _decorator(self, *args, **kwargs):
-        try:
-            return method(self, *args, **kwargs)
-        except ConnectionInterrupted as e:
-            if self._ignore_exceptions:
-                if REDIS_LOG_IGNORED_EXCEPTIONS:
-                    logger.error(str(e))
+        return self._call(functools.partial(method, self), return_value, *args, **kwargs)
+    return _decorator
+
+
+def omit_exception_async(method=None, return_value=None):
+    """
+    Same as omit_exception, but for coroutine methods.
+    Falls back to the thread pool based implementation of BaseCache
+    if asyncio redis client is not available.
+    """
+
+    if method is None:
+        return functools.partial(omit_exception_async, return_value=return_value)
 
-                return return_value
-            raise e.parent
+    @functools.wraps(method)
+    async def _decorator(self, *args, **kwargs):
+        if not self.client.async_supported:
+            fallback = getattr(BaseCache, method.__name__, None)
+            if fallback is None:
+                return await self._run_async(
+                    getattr(self, method.__name__[1:]), *args, **kwargs)
+            return await fallback(self, *args, **kwargs)
+        return await self._acall(functools.partial(method, self), return_value, *args, **kwargs)
     return _decorator
 
 
+_timeout_exceptions = (TimeoutError, socket.timeout, asyncio.TimeoutError)
+
+# Circuit breakers are shared by all threads of the process.
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name, options):
+    """
+    Returns circuit breaker for the cache ``name``.
+
+    ``options`` is a value of CIRCUIT_BREAKER option, either True
+    or a dict with FAILURE_THRESHOLD, TIMEOUT_RATIO, WINDOW,
+    COOL_DOWN and HALF_OPEN_MAX_CALLS keys.
+    """
+    if not options:
+        return None
+    if not isinstance(options, dict):
+        options = {}
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(
+                name=name,
+                failure_threshold=options.get('FAILURE_THRESHOLD', 5),
+                timeout_ratio=options.get('TIMEOUT_RATIO', 0.5),
+                window=options.get('WINDOW', 20),
+                cool_down=options.get('COOL_DOWN', 10),
+                half_open_max_calls=options.get('HALF_OPEN_MAX_CALLS', 1),
+            )
+        return _breakers[name]
+
+
+def circuit_breakers_metrics():
+    """Returns metrics of all cache circuit breakers of the process."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return [breaker.metrics() for breaker in breakers]
+
+
 class RedisCache(BaseCache):
     def __init__(self, server, params):
         super(RedisCache, self).__init__(params)
@@ -53,6 +116,8 @@ class RedisCache(BaseCache):
         self._client = None
 
         self._ignore_exceptions = options.get("IGNORE_EXCEPTIONS", REDIS_IGNORE_EXCEPTIONS)
+        self._breaker = get_circuit_breaker(
+            "%s:%s" % (server, self.key_prefix), options.get("CIRCUIT_BREAKER"))
 
     @property
     def client(self):
@@ -63,6 +128,65 @@ class RedisCache(BaseCache):
             self._client = self._client_cls(self._server, self._params, self)
         return self._client
 
+    def _short_circuit(self, return_value):
+        if self._ignore_exceptions:
+            return return_value
+        raise CircuitBreakerOpen("Circuit breaker %s is open" % self._breaker.name)
+
+    def _handle_connection_error(self, e, return_value):
+        if self._breaker is not None:
+            self._breaker.record_failure(timed_out=isinstance(e.parent, _timeout_exceptions))
+        if self._ignore_exceptions:
+            if REDIS_LOG_IGNORED_EXCEPTIONS:
+                logger.error(str(e))
+            return return_value
+        raise e.parent
+
+    def _call(self, func, return_value, *args, **kwargs):
+        """
+        Calls ``func``, handling connection errors
+        according to IGNORE_EXCEPTIONS and CIRCUIT_BREAKER options.
+        """
+        breaker = self._breaker
+        if breaker is not None and not breaker.allow_request():
+            return self._short_circuit(return_value)
+        try:
+            result = func(*args, **kwargs)
+        except ConnectionInterrupted as e:
+            return self._handle_connection_error(e, return_value)
+        except Exception:
+            # Other errors (serialization, redis response errors)
+            # say nothing about server health.
+            if breaker is not None:
+                breaker.record_inconclusive()
+            raise
+        if breaker is not None:
+            breaker.record_success()
+        return result
+
+    async def _acall(self, func, return_value, *args, **kwargs):
+        """Async version of _call()."""
+        breaker = self._breaker
+        if breaker is not None and not breaker.allow_request():
+            return self._short_circuit(return_value)
+        try:
+            result = await func(*args, **kwargs)
+        except ConnectionInterrupted as e:
+            return self._handle_connection_error(e, return_value)
+        except Exception:
+            # Other errors (serialization, redis response errors)
+            # say nothing about server health.
+            if breaker is not None:
+                breaker.record_inconclusive()
+            raise
+        if breaker is not None:
+            breaker.record_success()
+        return result
+
+    def circuit_breaker_metrics(self):
+        """Returns circuit breaker state and counters, if breaker is enabled."""
+        return self._breaker.metrics() if self._breaker is not None else None
+
     @omit_exception
     def set(self, *args, **kwargs):
         return self.client.set(*args, **kwargs)
@@ -76,16 +200,12 @@ class RedisCache(BaseCache):
         return self.client.add(*args, **kwargs)
 
     @omit_exception
+    def replace(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return bool(self.client.set(key, value, timeout, version=version, xx=True))
+
     def get(self, key, default=None, version=None, client=None):
-        try:
-            return self.client.get(key, default=default, version=version,
-                                   client=client)
-        except ConnectionInterrupted as e:
-            if self._ignore_exceptions:
-                if REDIS_LOG_IGNORED_EXCEPTIONS:
-                    logger.error(str(e))
-                return default
-            raise
+        return self._call(self.client.get, default, key, default=default,
+                          version=version, client=client)
 
     @omit_exception
     def delete(self, *args, **kwargs):
@@ -155,3 +275,100 @@ class RedisCache(BaseCache):
     @omit_exception
     def touch(self, key, timeout=None, version=None):
         return self.client.touch(key, timeout=timeout, version=version)
+
+    @omit_exception_async
+    async def aset(self, *args, **kwargs):
+        return await self.client.aset(*args, **kwargs)
+
+    @omit_exception_async
+    async def aadd(self, *args, **kwargs):
+        return await self.client.aadd(*args, **kwargs)
+
+    @omit_exception_async
+    async def areplace(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return bool(await self.client.aset(key, value, timeout, version=version, xx=True))
+
+    async def aget(self, key, default=None, version=None, client=None):
+        if not self.client.async_supported:
+            return await super(RedisCache, self).aget(key, default=default, version=version)
+        return await self._acall(self.client.aget, default, key, default=default,
+                                 version=version, client=client)
+
+    @omit_exception_async
+    async def adelete(self, *args, **kwargs):
+        return await self.client.adelete(*args, **kwargs)
+
+    @omit_exception_async
+    async def adelete_many(self, *args, **kwargs):
+        return await self.client.adelete_many(*args, **kwargs)
+
+    @omit_exception_async
+    async def aclear(self):
+        return await self.client.aclear()
+
+    @omit_exception_async(return_value={})
+    async def aget_many(self, *args, **kwargs):
+        return await self.client.aget_many(*args, **kwargs)
+
+    @omit_exception_async
+    async def aset_many(self, *args, **kwargs):
+        return await self.client.aset_many(*args, **kwargs)
+
+    @omit_exception_async
+    async def aincr(self, *args, **kwargs):
+        return await self.client.aincr(*args, **kwargs)
+
+    @omit_exception_async
+    async def adecr(self, *args, **kwargs):
+        return await self.client.adecr(*args, **kwargs)
+
+    @omit_exception_async
+    async def ahas_key(self, *args, **kwargs):
+        return await self.client.ahas_key(*args, **kwargs)
+
+    @omit_exception_async
+    async def attl(self, *args, **kwargs):
+        return await self.client.attl(*args, **kwargs)
+
+    @omit_exception_async
+    async def atouch(self, key, timeout=None, version=None):
+        return await self.client.atouch(key, timeout=timeout, version=version)
+
+    async def _aacquire_refresh_lock(self, key, version=None, timeout=10):
+        if not self.client.async_supported:
+            return await super(RedisCache, self)._aacquire_refresh_lock(
+                key, version=version, timeout=timeout)
+        lock = self.client.alock('%s:refresh-lock' % key, version=version, timeout=timeout)
+        return await self._acall(self._alock_acquire, _LOCK_FAILED, lock)
+
+    async def _arelease_refresh_lock(self, lock):
+        if not self.client.async_supported:
+            return await super(RedisCache, self)._arelease_refresh_lock(lock)
+        if lock is not _LOCK_FAILED:
+            await self._acall(self._alock_release, None, lock)
+
+    @staticmethod
+    async def _alock_acquire(lock):
+        try:
+            acquired = await lock.acquire(blocking=False)
+        except _main_async_exceptions as e:
+            raise ConnectionInterrupted(connection=None, parent=e)
+        return lock if acquired else None
+
+    @staticmethod
+    async def _alock_release(lock):
+        try:
+            await lock.release()
+        except _async_lock_exceptions:
+            # Lock is expired already.
+            pass
+        except _main_async_exceptions as e:
+            raise ConnectionInterrupted(connection=None, parent=e)
+
+    def compression_stats(self):
+        """
+        Returns compression stats of this cache alias,
+        if compressor keeps them (see AdaptiveCompressor).
+        """
+        stats = getattr(self.client._compressor, 'stats', None)
+        return stats.as_dict() if stats is not None else None
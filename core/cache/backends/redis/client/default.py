@@ -1,6 +1,9 @@
+import asyncio
 import random
 import re
 import socket
+import threading
+import time
 from collections import OrderedDict
 
 from anthill.framework.conf import settings
@@ -8,14 +11,28 @@ from anthill.framework.core.cache.backends.base import DEFAULT_TIMEOUT, get_key_
 from anthill.framework.core.exceptions import ImproperlyConfigured
 from anthill.framework.utils.encoding import smart_text
 from anthill.framework.utils.module_loading import import_string
-from redis.exceptions import ConnectionError, ResponseError, TimeoutError
+from redis.exceptions import ConnectionError, LockError, ResponseError, TimeoutError
 import six
 
 from .. import pool
 from ..exceptions import CompressorError, ConnectionInterrupted
+from ..replicas import ReplicaSelector
 from ..util import CacheKey
 
 _main_exceptions = (TimeoutError, ResponseError, ConnectionError, socket.timeout)
+_main_async_exceptions = _main_exceptions + (asyncio.TimeoutError,)
+_async_lock_exceptions = (LockError,)
+
+if pool.aioredis is not None and pool.aioredis.__name__ == 'aioredis':
+    # Standalone aioredis package has its own exception classes.
+    from aioredis import exceptions as _aioredis_exceptions
+
+    _main_async_exceptions += (
+        _aioredis_exceptions.TimeoutError,
+        _aioredis_exceptions.ResponseError,
+        _aioredis_exceptions.ConnectionError,
+    )
+    _async_lock_exceptions += (_aioredis_exceptions.LockError,)
 
 
 special_re = re.compile('([*?[])')
@@ -43,9 +60,24 @@ class DefaultClient(object):
             self._server = self._server.split(",")
 
         self._clients = [None] * len(self._server)
+        self._async_clients = [None] * len(self._server)
         self._options = params.get("OPTIONS", {})
         self._slave_read_only = self._options.get('SLAVE_READ_ONLY', True)
 
+        self._replicas = ReplicaSelector(
+            len(self._server),
+            alpha=self._options.get('REPLICA_LATENCY_ALPHA', 0.2),
+            eject_failures=self._options.get('REPLICA_EJECT_FAILURES', 3),
+            eject_time=self._options.get('REPLICA_EJECT_TIME', 10),
+        )
+        # Reads of keys written less than this number of seconds ago
+        # go to the master, so they are not affected by replication lag.
+        self._read_your_writes = float(self._options.get('READ_YOUR_WRITES_WINDOW', 0))
+        self._recent_writes = OrderedDict()
+        self._recent_writes_max = 10000
+        # Writes are tracked from thread pool threads too.
+        self._recent_writes_lock = threading.Lock()
+
         serializer_path = self._options.get(
             "SERIALIZER", "anthill.framework.core.cache.backends.redis.serializers.pickle.PickleSerializer")
         serializer_cls = import_string(serializer_path)
@@ -62,11 +94,16 @@ class DefaultClient(object):
     def __contains__(self, key):
         return self.has_key(key)
 
-    def get_next_client_index(self, write=True, tried=()):
+    def get_next_client_index(self, write=True, tried=(), key=None, probe=False):
         """
         Return a next index for read client.
         This function implements a default behavior for
-        get a next read client for master-slave setup.
+        get a next read client for master-slave setup:
+        the replica with lower observed latency is preferred,
+        failing replicas are ejected for a while,
+        and recently written ``key`` is read from the master.
+        Ejected replica is probed only if ``probe`` is set, then
+        the caller must report the result with `_observe()`.
 
         Overwrite this function if you want a specific
         behavior.
@@ -78,9 +115,43 @@ class DefaultClient(object):
         if write or len(self._server) == 1:
             return 0
 
-        return random.randint(1, len(self._server) - 1)
+        if key is not None and self._is_recently_written(key):
+            return 0
+
+        return self._replicas.choose(probe=probe)
 
-    def get_client(self, write=True, tried=(), show_index=False):
+    def _track_writes(self, keys):
+        if not self._read_your_writes:
+            return
+        until = time.monotonic() + self._read_your_writes
+        recent_writes = self._recent_writes
+        with self._recent_writes_lock:
+            for key in keys:
+                recent_writes.pop(key, None)
+                recent_writes[key] = until
+            # Entries are ordered by write time, so expired ones are in the front.
+            now = time.monotonic()
+            while recent_writes:
+                key, until = next(iter(recent_writes.items()))
+                if until > now and len(recent_writes) <= self._recent_writes_max:
+                    break
+                del recent_writes[key]
+
+    def _is_recently_written(self, key):
+        until = self._recent_writes.get(key)
+        return until is not None and until > time.monotonic()
+
+    def _observe(self, index, start, failed=False):
+        if failed:
+            self._replicas.record_failure(index)
+        else:
+            self._replicas.record_success(index, time.monotonic() - start)
+
+    def replicas_stats(self):
+        """Returns observed latency and health of servers."""
+        return self._replicas.stats()
+
+    def get_client(self, write=True, tried=(), show_index=False, key=None, probe=False):
         """
         Method used for obtain a raw redis client.
 
@@ -88,7 +159,7 @@ class DefaultClient(object):
         operations for obtain a native redis client/connection
         instance.
         """
-        index = self.get_next_client_index(write=write, tried=tried or [])
+        index = self.get_next_client_index(write=write, tried=tried or [], key=key, probe=probe)
 
         if self._clients[index] is None:
             self._clients[index] = self.connect(index)
@@ -98,6 +169,32 @@ class DefaultClient(object):
         else:
             return self._clients[index]
 
+    @property
+    def async_supported(self):
+        """Whether asyncio redis client is available."""
+        return self.connection_factory.async_supported
+
+    def get_async_client(self, write=True, tried=(), show_index=False, key=None, probe=False):
+        """
+        Method used for obtain a raw asyncio redis client.
+        Same as get_client(), but for async API.
+        """
+        index = self.get_next_client_index(write=write, tried=tried or [], key=key, probe=probe)
+
+        if self._async_clients[index] is None:
+            self._async_clients[index] = self.connect_async(index)
+
+        if show_index:
+            return self._async_clients[index], index
+        else:
+            return self._async_clients[index]
+
+    def connect_async(self, index=0):
+        """
+        Given a connection index, returns a new asyncio redis client.
+        """
+        return self.connection_factory.connect_async(self._server[index])
+
     def connect(self, index=0):
         """
         Given a connection index, returns a new raw redis client/connection
@@ -140,7 +237,9 @@ class DefaultClient(object):
                             # than to set it and than expire in a pipeline
                             return self.delete(key, client=client, version=version)
 
-                return client.set(nkey, nvalue, nx=nx, px=timeout, xx=xx)
+                result = client.set(nkey, nvalue, nx=nx, px=timeout, xx=xx)
+                self._track_writes([nkey])
+                return result
             except _main_exceptions as e:
                 if not original_client and not self._slave_read_only and len(tried) < len(self._server):
                     tried.append(index)
@@ -194,15 +293,21 @@ class DefaultClient(object):
 
         Returns decoded value if key is found, the default if not.
         """
-        if client is None:
-            client = self.get_client(write=False)
-
         key = self.make_key(key, version=version)
 
+        index = None
+        if client is None:
+            client, index = self.get_client(write=False, show_index=True, key=key, probe=True)
+
+        start = time.monotonic()
         try:
             value = client.get(key)
         except _main_exceptions as e:
+            if index is not None:
+                self._observe(index, start, failed=True)
             raise ConnectionInterrupted(connection=client, parent=e)
+        if index is not None:
+            self._observe(index, start)
 
         if value is None:
             return default
@@ -243,11 +348,13 @@ class DefaultClient(object):
         if client is None:
             client = self.get_client(write=True)
 
+        key = self.make_key(key, version=version, prefix=prefix)
         try:
-            return client.delete(self.make_key(key, version=version,
-                                               prefix=prefix))
+            result = client.delete(key)
         except _main_exceptions as e:
             raise ConnectionInterrupted(connection=client, parent=e)
+        self._track_writes([key])
+        return result
 
     def delete_pattern(self, pattern, version=None, prefix=None, client=None, itersize=None):
         """
@@ -286,9 +393,11 @@ class DefaultClient(object):
             return
 
         try:
-            return client.delete(*keys)
+            result = client.delete(*keys)
         except _main_exceptions as e:
             raise ConnectionInterrupted(connection=client, parent=e)
+        self._track_writes(keys)
+        return result
 
     def clear(self, client=None):
         """
@@ -335,9 +444,6 @@ class DefaultClient(object):
         Retrieve many keys.
         """
 
-        if client is None:
-            client = self.get_client(write=False)
-
         if not keys:
             return {}
 
@@ -347,10 +453,20 @@ class DefaultClient(object):
             (self.make_key(k, version=version), k) for k in keys
         )
 
+        index = None
+        if client is None:
+            write = any(self._is_recently_written(k) for k in map_keys)
+            client, index = self.get_client(write=write, show_index=True, probe=True)
+
+        start = time.monotonic()
         try:
             results = client.mget(*map_keys)
         except _main_exceptions as e:
+            if index is not None:
+                self._observe(index, start, failed=True)
             raise ConnectionInterrupted(connection=client, parent=e)
+        if index is not None:
+            self._observe(index, start)
 
         for key, value in zip(map_keys, results):
             if value is None:
@@ -421,6 +537,7 @@ class DefaultClient(object):
         except _main_exceptions as e:
             raise ConnectionInterrupted(connection=client, parent=e)
 
+        self._track_writes([key])
         return value
 
     def incr(self, key, delta=1, version=None, client=None, ignore_key_check=False):
@@ -468,14 +585,22 @@ class DefaultClient(object):
         Test if key exists.
         """
 
+        key = self.make_key(key, version=version)
+
+        index = None
         if client is None:
-            client = self.get_client(write=False)
+            client, index = self.get_client(write=False, show_index=True, key=key, probe=True)
 
-        key = self.make_key(key, version=version)
+        start = time.monotonic()
         try:
-            return client.exists(key) == 1
+            result = client.exists(key) == 1
         except _main_exceptions as e:
+            if index is not None:
+                self._observe(index, start, failed=True)
             raise ConnectionInterrupted(connection=client, parent=e)
+        if index is not None:
+            self._observe(index, start)
+        return result
 
     def iter_keys(self, search, itersize=None, client=None, version=None):
         """
@@ -535,6 +660,305 @@ class DefaultClient(object):
 
         return CacheKey(self._backend.key_func(pattern, prefix, version))
 
+    # Async API.
+    # Same as sync methods above, but use asyncio redis client,
+    # so they never block the IOLoop.
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None,
+                   nx=False, xx=False):
+        """
+        Persist a value to the cache, and set an optional expiration time.
+        """
+        nkey = self.make_key(key, version=version)
+        nvalue = self.encode(value)
+
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self._backend.default_timeout
+
+        original_client = client
+        tried = []
+        while True:
+            try:
+                if not client:
+                    client, index = self.get_async_client(write=True, tried=tried, show_index=True)
+
+                if timeout is not None:
+                    # Convert to milliseconds
+                    timeout = int(timeout * 1000)
+
+                    if timeout <= 0:
+                        if nx:
+                            return not await self.ahas_key(key, version=version, client=client)
+                        else:
+                            return await self.adelete(key, client=client, version=version)
+
+                result = await client.set(nkey, nvalue, nx=nx, px=timeout, xx=xx)
+                self._track_writes([nkey])
+                return result
+            except _main_async_exceptions as e:
+                if not original_client and not self._slave_read_only and len(tried) < len(self._server):
+                    tried.append(index)
+                    client = None
+                    continue
+                raise ConnectionInterrupted(connection=client, parent=e)
+
+    async def aadd(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        """
+        Add a value to the cache, failing if the key already exists.
+        """
+        return await self.aset(key, value, timeout, version=version, client=client, nx=True)
+
+    async def aget(self, key, default=None, version=None, client=None):
+        """
+        Retrieve a value from the cache.
+        """
+        key = self.make_key(key, version=version)
+
+        index = None
+        if client is None:
+            client, index = self.get_async_client(write=False, show_index=True, key=key, probe=True)
+
+        start = time.monotonic()
+        try:
+            value = await client.get(key)
+        except _main_async_exceptions as e:
+            if index is not None:
+                self._observe(index, start, failed=True)
+            raise ConnectionInterrupted(connection=client, parent=e)
+        if index is not None:
+            self._observe(index, start)
+
+        if value is None:
+            return default
+
+        return self.decode(value)
+
+    async def adelete(self, key, version=None, prefix=None, client=None):
+        """
+        Remove a key from the cache.
+        """
+        if client is None:
+            client = self.get_async_client(write=True)
+
+        key = self.make_key(key, version=version, prefix=prefix)
+        try:
+            result = await client.delete(key)
+        except _main_async_exceptions as e:
+            raise ConnectionInterrupted(connection=client, parent=e)
+        self._track_writes([key])
+        return result
+
+    async def adelete_many(self, keys, version=None, client=None):
+        """
+        Remove multiple keys at once.
+        """
+        if client is None:
+            client = self.get_async_client(write=True)
+
+        keys = [self.make_key(k, version=version) for k in keys]
+
+        if not keys:
+            return
+
+        try:
+            result = await client.delete(*keys)
+        except _main_async_exceptions as e:
+            raise ConnectionInterrupted(connection=client, parent=e)
+        self._track_writes(keys)
+        return result
+
+    async def aget_many(self, keys, version=None, client=None):
+        """
+        Retrieve many keys.
+        """
+        if not keys:
+            return {}
+
+        recovered_data = OrderedDict()
+
+        map_keys = OrderedDict(
+            (self.make_key(k, version=version), k) for k in keys
+        )
+
+        index = None
+        if client is None:
+            write = any(self._is_recently_written(k) for k in map_keys)
+            client, index = self.get_async_client(write=write, show_index=True, probe=True)
+
+        start = time.monotonic()
+        try:
+            results = await client.mget(*map_keys)
+        except _main_async_exceptions as e:
+            if index is not None:
+                self._observe(index, start, failed=True)
+            raise ConnectionInterrupted(connection=client, parent=e)
+        if index is not None:
+            self._observe(index, start)
+
+        for key, value in zip(map_keys, results):
+            if value is None:
+                continue
+            recovered_data[map_keys[key]] = self.decode(value)
+        return recovered_data
+
+    async def aset_many(self, data, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        """
+        Set a bunch of values in the cache at once in one round trip.
+        """
+        if client is None:
+            client = self.get_async_client(write=True)
+
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self._backend.default_timeout
+
+        nkeys = []
+        try:
+            pipeline = client.pipeline(transaction=False)
+            for key, value in data.items():
+                nkey = self.make_key(key, version=version)
+                nkeys.append(nkey)
+                if timeout is not None and timeout <= 0:
+                    pipeline.delete(nkey)
+                else:
+                    px = None if timeout is None else int(timeout * 1000)
+                    pipeline.set(nkey, self.encode(value), px=px)
+            await pipeline.execute()
+        except _main_async_exceptions as e:
+            raise ConnectionInterrupted(connection=client, parent=e)
+        self._track_writes(nkeys)
+
+    async def _aincr(self, key, delta=1, version=None, client=None, ignore_key_check=False):
+        if client is None:
+            client = self.get_async_client(write=True)
+
+        key = self.make_key(key, version=version)
+
+        try:
+            try:
+                if not ignore_key_check:
+                    lua = """
+                    local exists = redis.call('EXISTS', KEYS[1])
+                    if (exists == 1) then
+                        return redis.call('INCRBY', KEYS[1], ARGV[1])
+                    else return false end
+                    """
+                else:
+                    lua = """
+                    return redis.call('INCRBY', KEYS[1], ARGV[1])
+                    """
+                value = await client.eval(lua, 1, key, delta)
+                if value is None:
+                    raise ValueError("Key '%s' not found" % key)
+            except ResponseError:
+                timeout = await client.ttl(key)
+                if timeout == -2:
+                    raise ValueError("Key '%s' not found" % key)
+                value = await self.aget(key, version=version, client=client) + delta
+                await self.aset(key, value, version=version, timeout=timeout, client=client)
+        except _main_async_exceptions as e:
+            raise ConnectionInterrupted(connection=client, parent=e)
+
+        self._track_writes([key])
+        return value
+
+    async def aincr(self, key, delta=1, version=None, client=None, ignore_key_check=False):
+        """
+        Add delta to value in the cache. If the key does not exist, raise a
+        ValueError exception.
+        """
+        return await self._aincr(key=key, delta=delta, version=version, client=client,
+                                 ignore_key_check=ignore_key_check)
+
+    async def adecr(self, key, delta=1, version=None, client=None):
+        """
+        Decrease delta to value in the cache. If the key does not exist, raise a
+        ValueError exception.
+        """
+        return await self._aincr(key=key, delta=-delta, version=version, client=client)
+
+    async def ahas_key(self, key, version=None, client=None):
+        """
+        Test if key exists.
+        """
+        key = self.make_key(key, version=version)
+
+        index = None
+        if client is None:
+            client, index = self.get_async_client(write=False, show_index=True, key=key, probe=True)
+
+        start = time.monotonic()
+        try:
+            result = await client.exists(key) == 1
+        except _main_async_exceptions as e:
+            if index is not None:
+                self._observe(index, start, failed=True)
+            raise ConnectionInterrupted(connection=client, parent=e)
+        if index is not None:
+            self._observe(index, start)
+        return result
+
+    async def attl(self, key, version=None, client=None):
+        """
+        Executes TTL redis command and return the "time-to-live" of specified key.
+        If key is a non volatile key, it returns None.
+        """
+        if client is None:
+            client = self.get_async_client(write=False)
+
+        key = self.make_key(key, version=version)
+        try:
+            t = await client.ttl(key)
+        except _main_async_exceptions as e:
+            raise ConnectionInterrupted(connection=client, parent=e)
+
+        if t >= 0:
+            return t
+        elif t == -1:
+            return None
+        return 0
+
+    async def atouch(self, key, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        """
+        Sets a new expiration for a key.
+        """
+        if client is None:
+            client = self.get_async_client(write=True)
+
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self._backend.default_timeout
+
+        key = self.make_key(key, version=version)
+        try:
+            if timeout is None:
+                return await client.persist(key)
+            return await client.expire(key, timeout)
+        except _main_async_exceptions as e:
+            raise ConnectionInterrupted(connection=client, parent=e)
+
+    def alock(self, key, version=None, timeout=None, sleep=0.1,
+              blocking_timeout=None, client=None):
+        """
+        Returns asyncio redis lock (not acquired yet).
+        """
+        if client is None:
+            client = self.get_async_client(write=True)
+
+        key = self.make_key(key, version=version)
+        return client.lock(key, timeout=timeout, sleep=sleep,
+                           blocking_timeout=blocking_timeout)
+
+    async def aclear(self, client=None):
+        """
+        Flush all cache keys.
+        """
+        if client is None:
+            client = self.get_async_client(write=True)
+
+        try:
+            await client.flushdb()
+        except _main_async_exceptions as e:
+            raise ConnectionInterrupted(connection=client, parent=e)
+
     def close(self, **kwargs):
         if getattr(settings, "REDIS_CLOSE_CONNECTION", False):
             for i in range(len(self._clients)):
@@ -7,7 +7,7 @@ from anthill.framework.conf import settings
 from redis.exceptions import ConnectionError, ResponseError, TimeoutError
 
 from ..exceptions import ConnectionInterrupted
-from .default import DEFAULT_TIMEOUT, DefaultClient
+from .default import DEFAULT_TIMEOUT, DefaultClient, _main_async_exceptions
 
 _main_exceptions = (ConnectionError, ResponseError, TimeoutError, socket.timeout)
 
@@ -74,7 +74,7 @@ class HerdClient(DefaultClient):
 
         return super(HerdClient, self).set(key, packed, timeout=real_timeout,
                                            version=version, client=client,
-                                           nx=nx)
+                                           nx=nx, xx=xx)
 
     def get(self, key, default=None, version=None, client=None):
         packed = super(HerdClient, self).get(key, default=default,
@@ -139,3 +139,75 @@ class HerdClient(DefaultClient):
 
     def decr(self, *args, **kwargs):
         raise NotImplementedError()
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, version=None,
+                   client=None, nx=False, xx=False):
+
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self._backend.default_timeout
+
+        if timeout is None or timeout <= 0:
+            return await super(HerdClient, self).aset(key, value, timeout=timeout,
+                                                      version=version, client=client,
+                                                      nx=nx, xx=xx)
+
+        packed = self._pack(value, timeout)
+        real_timeout = (timeout + CACHE_HERD_TIMEOUT)
+
+        return await super(HerdClient, self).aset(key, packed, timeout=real_timeout,
+                                                  version=version, client=client,
+                                                  nx=nx, xx=xx)
+
+    async def aget(self, key, default=None, version=None, client=None):
+        packed = await super(HerdClient, self).aget(key, default=default,
+                                                    version=version, client=client)
+        val, refresh = self._unpack(packed)
+
+        if refresh:
+            return default
+
+        return val
+
+    async def aget_many(self, keys, version=None, client=None):
+        if client is None:
+            client = self.get_async_client(write=False)
+
+        if not keys:
+            return {}
+
+        recovered_data = OrderedDict()
+
+        new_keys = [self.make_key(key, version=version) for key in keys]
+        map_keys = dict(zip(new_keys, keys))
+
+        try:
+            results = await client.mget(*new_keys)
+        except _main_async_exceptions as e:
+            raise ConnectionInterrupted(connection=client, parent=e)
+
+        for key, value in zip(new_keys, results):
+            if value is None:
+                continue
+
+            val, refresh = self._unpack(self.decode(value))
+            recovered_data[map_keys[key]] = None if refresh else val
+
+        return recovered_data
+
+    async def aset_many(self, data, timeout=DEFAULT_TIMEOUT, version=None, client=None,
+                        herd=True):
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self._backend.default_timeout
+
+        if herd and timeout is not None and timeout > 0:
+            data = {key: self._pack(value, timeout) for key, value in data.items()}
+            timeout += CACHE_HERD_TIMEOUT
+
+        return await super(HerdClient, self).aset_many(
+            data, timeout=timeout, version=version, client=client)
+
+    async def aincr(self, *args, **kwargs):
+        raise NotImplementedError()
+
+    async def adecr(self, *args, **kwargs):
+        raise NotImplementedError()
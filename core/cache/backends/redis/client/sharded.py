@@ -1,5 +1,8 @@
+import asyncio
+import os
 import re
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 from anthill.framework.conf import settings
 from anthill.framework.utils.encoding import smart_text
@@ -9,7 +12,14 @@ from six import text_type
 from ..exceptions import ConnectionInterrupted
 from ..hash_ring import HashRing
 from ..util import CacheKey
-from .default import DEFAULT_TIMEOUT, DefaultClient
+from .default import DEFAULT_TIMEOUT, DefaultClient, _main_exceptions, _main_async_exceptions
+
+_incr_lua = """
+local exists = redis.call('EXISTS', KEYS[1])
+if (exists == 1) then
+    return redis.call('INCRBY', KEYS[1], ARGV[1])
+else return false end
+"""
 
 
 class ShardClient(DefaultClient):
@@ -21,12 +31,18 @@ class ShardClient(DefaultClient):
         if not isinstance(self._server, (list, tuple)):
             self._server = [self._server]
 
-        self._ring = HashRing(self._server)
+        self._ring = HashRing(self._server, ketama=self._options.get("SHARD_KETAMA", False))
         self._serverdict = self.connect()
+        self._async_serverdict = {}
+        self._executor = None
+        self._executor_pid = None
 
     def get_client(self, write=True):
         raise NotImplementedError
 
+    def get_async_client(self, write=True, tried=(), show_index=False, key=None, probe=False):
+        raise NotImplementedError
+
     def connect(self):
         connection_dict = {}
         for name in self._server:
@@ -45,6 +61,65 @@ class ShardClient(DefaultClient):
         name = self.get_server_name(key)
         return self._serverdict[name]
 
+    def get_async_server(self, key):
+        return self.get_async_server_by_name(self.get_server_name(key))
+
+    def get_async_server_by_name(self, name):
+        if name not in self._async_serverdict:
+            self._async_serverdict[name] = self.connection_factory.connect_async(name)
+        return self._async_serverdict[name]
+
+    def group_by_server(self, keys):
+        """
+        Groups already made keys by ring node.
+        Returns ordered dict of server name -> list of keys.
+        """
+        groups = OrderedDict()
+        for key in keys:
+            groups.setdefault(self.get_server_name(key), []).append(key)
+        return groups
+
+    def _get_executor(self):
+        # Executor threads do not survive fork().
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(
+                max_workers=len(self._server), thread_name_prefix='redis-shard')
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def map_servers(self, func, groups):
+        """
+        Calls ``func(client, keys)`` for every node of ``groups``
+        concurrently, so the batch takes as long as the slowest node.
+        Returns dict of server name -> result.
+        """
+        if len(groups) == 1:
+            name, keys = next(iter(groups.items()))
+            return {name: func(self._serverdict[name], keys)}
+        executor = self._get_executor()
+        futures = OrderedDict(
+            (name, executor.submit(func, self._serverdict[name], keys))
+            for name, keys in groups.items()
+        )
+        return OrderedDict((name, f.result()) for name, f in futures.items())
+
+    async def amap_servers(self, func, groups):
+        """
+        Async version of map_servers().
+        ``func(client, keys)`` must be a coroutine function.
+        """
+        names = list(groups)
+        results = await asyncio.gather(
+            *[func(self.get_async_server_by_name(name), groups[name]) for name in names])
+        return OrderedDict(zip(names, results))
+
+    def _pipeline_set(self, pipeline, key, value, timeout):
+        if timeout is not None and timeout <= 0:
+            pipeline.delete(key)
+        else:
+            px = None if timeout is None else int(timeout * 1000)
+            pipeline.set(key, self.encode(value), px=px)
+
     def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None):
         if client is None:
             key = self.make_key(key, version=version)
@@ -61,26 +136,39 @@ class ShardClient(DefaultClient):
         return super(ShardClient, self)\
             .get(key=key, default=default, version=version, client=client)
 
-    def get_many(self, keys, version=None):
-        if not keys:
-            return {}
+    def _collect_many(self, map_keys, groups, results):
+        values = {}
+        for name, node_values in results.items():
+            values.update(zip(groups[name], node_values))
 
         recovered_data = OrderedDict()
+        for nkey, key in map_keys.items():
+            value = values.get(nkey)
+            if value is None:
+                continue
+            recovered_data[key] = self.decode(value)
+        return recovered_data
 
-        new_keys = [self.make_key(key, version=version) for key in keys]
-        map_keys = dict(zip(new_keys, keys))
+    def get_many(self, keys, version=None):
+        """
+        Retrieve many keys with one MGET per node.
+        """
+        if not keys:
+            return {}
 
-        for key in new_keys:
-            client = self.get_server(key)
-            value = self.get(key=key, version=version, client=client)
+        map_keys = OrderedDict((self.make_key(key, version=version), key) for key in keys)
+        groups = self.group_by_server(map_keys)
 
-            if value is None:
-                continue
+        def mget(client, node_keys):
+            try:
+                return client.mget(*node_keys)
+            except _main_exceptions as e:
+                raise ConnectionInterrupted(connection=client, parent=e)
 
-            recovered_data[map_keys[key]] = value
-        return recovered_data
+        return self._collect_many(map_keys, groups, self.map_servers(mget, groups))
 
-    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None, nx=False):
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None,
+            nx=False, xx=False):
         """
         Persist a value to the cache, and set an optional expiration time.
         """
@@ -90,7 +178,7 @@ class ShardClient(DefaultClient):
 
         return super(ShardClient, self).set(key=key, value=value,
                                             timeout=timeout, version=version,
-                                            client=client, nx=nx)
+                                            client=client, nx=nx, xx=xx)
 
     def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
         """
@@ -99,9 +187,29 @@ class ShardClient(DefaultClient):
 
         If timeout is given, that timeout will be used for the key; otherwise
         the default cache timeout will be used.
+
+        Keys are written with one pipeline per node.
         """
-        for key, value in data.items():
-            self.set(key, value, timeout, version=version)
+        if not data:
+            return
+
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self._backend.default_timeout
+
+        values = OrderedDict(
+            (self.make_key(key, version=version), value) for key, value in data.items())
+        groups = self.group_by_server(values)
+
+        def mset(client, node_keys):
+            try:
+                pipeline = client.pipeline(transaction=False)
+                for key in node_keys:
+                    self._pipeline_set(pipeline, key, values[key], timeout)
+                pipeline.execute()
+            except _main_exceptions as e:
+                raise ConnectionInterrupted(connection=client, parent=e)
+
+        self.map_servers(mset, groups)
 
     def has_key(self, key, version=None, client=None):
         """
@@ -165,13 +273,72 @@ class ShardClient(DefaultClient):
 
     def delete_many(self, keys, version=None):
         """
-        Remove multiple keys at once.
+        Remove multiple keys at once, with one DEL per node.
         """
-        res = 0
-        for key in [self.make_key(k, version=version) for k in keys]:
-            client = self.get_server(key)
-            res += self.delete(key, client=client)
-        return res
+        groups = self.group_by_server(self.make_key(k, version=version) for k in keys)
+        if not groups:
+            return 0
+
+        def delete(client, node_keys):
+            try:
+                return client.delete(*node_keys)
+            except _main_exceptions as e:
+                raise ConnectionInterrupted(connection=client, parent=e)
+
+        return sum(self.map_servers(delete, groups).values())
+
+    def has_keys(self, keys, version=None):
+        """
+        Test if keys exist, with one pipeline per node.
+        Returns dict of key -> bool.
+        """
+        map_keys = OrderedDict((self.make_key(key, version=version), key) for key in keys)
+        groups = self.group_by_server(map_keys)
+        if not groups:
+            return {}
+
+        def exists(client, node_keys):
+            try:
+                pipeline = client.pipeline(transaction=False)
+                for key in node_keys:
+                    pipeline.exists(key)
+                return pipeline.execute()
+            except _main_exceptions as e:
+                raise ConnectionInterrupted(connection=client, parent=e)
+
+        found = {}
+        for name, results in self.map_servers(exists, groups).items():
+            found.update(zip(groups[name], results))
+        return OrderedDict((key, found[nkey] == 1) for nkey, key in map_keys.items())
+
+    def incr_many(self, data, version=None):
+        """
+        Add deltas to values of many keys, with one pipeline per node.
+        ``data`` is a dict of key -> delta.
+        Returns dict of key -> new value. Keys that do not exist are skipped.
+        """
+        deltas = OrderedDict(
+            (self.make_key(key, version=version), (key, delta)) for key, delta in data.items())
+        groups = self.group_by_server(deltas)
+        if not groups:
+            return {}
+
+        def incr(client, node_keys):
+            try:
+                pipeline = client.pipeline(transaction=False)
+                for key in node_keys:
+                    pipeline.eval(_incr_lua, 1, key, deltas[key][1])
+                return pipeline.execute()
+            except _main_exceptions as e:
+                raise ConnectionInterrupted(connection=client, parent=e)
+
+        values = {}
+        for name, results in self.map_servers(incr, groups).items():
+            values.update(zip(groups[name], results))
+        return OrderedDict(
+            (key, values[nkey]) for nkey, (key, delta) in deltas.items()
+            if values[nkey] is not None
+        )
 
     def incr_version(self, key, delta=1, version=None, client=None):
         if client is None:
@@ -266,3 +433,143 @@ class ShardClient(DefaultClient):
 
         return super(ShardClient, self).touch(key=key, timeout=timeout,
                                               version=version, client=client)
+
+    # Async API.
+
+    async def aadd(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        if client is None:
+            key = self.make_key(key, version=version)
+            client = self.get_async_server(key)
+
+        return await super(ShardClient, self)\
+            .aadd(key=key, value=value, version=version, client=client, timeout=timeout)
+
+    async def aget(self, key, default=None, version=None, client=None):
+        if client is None:
+            key = self.make_key(key, version=version)
+            client = self.get_async_server(key)
+
+        return await super(ShardClient, self)\
+            .aget(key=key, default=default, version=version, client=client)
+
+    async def aget_many(self, keys, version=None):
+        if not keys:
+            return {}
+
+        map_keys = OrderedDict((self.make_key(key, version=version), key) for key in keys)
+        groups = self.group_by_server(map_keys)
+
+        async def mget(client, node_keys):
+            try:
+                return await client.mget(*node_keys)
+            except _main_async_exceptions as e:
+                raise ConnectionInterrupted(connection=client, parent=e)
+
+        return self._collect_many(map_keys, groups, await self.amap_servers(mget, groups))
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None,
+                   nx=False, xx=False):
+        if client is None:
+            key = self.make_key(key, version=version)
+            client = self.get_async_server(key)
+
+        return await super(ShardClient, self).aset(key=key, value=value,
+                                                   timeout=timeout, version=version,
+                                                   client=client, nx=nx, xx=xx)
+
+    async def aset_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if not data:
+            return
+
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self._backend.default_timeout
+
+        values = OrderedDict(
+            (self.make_key(key, version=version), value) for key, value in data.items())
+        groups = self.group_by_server(values)
+
+        async def mset(client, node_keys):
+            try:
+                pipeline = client.pipeline(transaction=False)
+                for key in node_keys:
+                    self._pipeline_set(pipeline, key, values[key], timeout)
+                await pipeline.execute()
+            except _main_async_exceptions as e:
+                raise ConnectionInterrupted(connection=client, parent=e)
+
+        await self.amap_servers(mset, groups)
+
+    async def ahas_key(self, key, version=None, client=None):
+        if client is None:
+            key = self.make_key(key, version=version)
+            client = self.get_async_server(key)
+
+        return await super(ShardClient, self)\
+            .ahas_key(key=key, version=version, client=client)
+
+    async def adelete(self, key, version=None, prefix=None, client=None):
+        if client is None:
+            key = self.make_key(key, version=version)
+            client = self.get_async_server(key)
+
+        return await super(ShardClient, self)\
+            .adelete(key=key, version=version, client=client)
+
+    async def adelete_many(self, keys, version=None):
+        groups = self.group_by_server(self.make_key(k, version=version) for k in keys)
+        if not groups:
+            return 0
+
+        async def delete(client, node_keys):
+            try:
+                return await client.delete(*node_keys)
+            except _main_async_exceptions as e:
+                raise ConnectionInterrupted(connection=client, parent=e)
+
+        return sum((await self.amap_servers(delete, groups)).values())
+
+    async def aincr(self, key, delta=1, version=None, client=None, ignore_key_check=False):
+        if client is None:
+            key = self.make_key(key, version=version)
+            client = self.get_async_server(key)
+
+        return await super(ShardClient, self)\
+            .aincr(key=key, delta=delta, version=version, client=client,
+                   ignore_key_check=ignore_key_check)
+
+    async def adecr(self, key, delta=1, version=None, client=None):
+        if client is None:
+            key = self.make_key(key, version=version)
+            client = self.get_async_server(key)
+
+        return await super(ShardClient, self)\
+            .adecr(key=key, delta=delta, version=version, client=client)
+
+    async def attl(self, key, version=None, client=None):
+        if client is None:
+            key = self.make_key(key, version=version)
+            client = self.get_async_server(key)
+
+        return await super(ShardClient, self).attl(key=key, version=version, client=client)
+
+    async def atouch(self, key, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        if client is None:
+            key = self.make_key(key, version=version)
+            client = self.get_async_server(key)
+
+        return await super(ShardClient, self).atouch(key=key, timeout=timeout,
+                                                     version=version, client=client)
+
+    def alock(self, key, version=None, timeout=None, sleep=0.1,
+              blocking_timeout=None, client=None):
+        if client is None:
+            key = self.make_key(key, version=version)
+            client = self.get_async_server(key)
+
+        return super(ShardClient, self).alock(key, version=version, timeout=timeout, sleep=sleep,
+                                              blocking_timeout=blocking_timeout, client=client)
+
+    async def aclear(self, client=None):
+        await asyncio.gather(
+            *[super(ShardClient, self).aclear(client=self.get_async_server_by_name(name))
+              for name in self._server])
@@ -0,0 +1,190 @@
+"""
+Adaptive compressor.
+
+Values shorter than ``COMPRESS_MIN_LENGTH`` are stored raw, and so are
+values which do not compress well enough. Every payload starts with
+a header byte naming its format, so values written with different codecs
+can be mixed on the same keyspace. Values without known header are
+written by other compressors: zlib values of ZlibCompressor are
+decompressed, any other values are passed as is.
+
+Options:
+    COMPRESS_CODEC -- zlib (default), lz4, lzma or zstd.
+    COMPRESS_LEVEL -- codec compression level.
+    COMPRESS_MIN_LENGTH -- min value length to compress (default 256).
+    COMPRESS_MIN_RATIO -- max compressed/raw length ratio worth
+                          to store compressed value (default 0.9).
+    COMPRESS_ZSTD_DICTIONARY -- path to zstd dictionary file, that
+                                helps a lot with small repetitive values
+                                (see train_zstd_dictionary()).
+"""
+import threading
+import time
+import zlib
+import lzma
+
+from anthill.framework.core.exceptions import ImproperlyConfigured
+
+from ..exceptions import CompressorError
+from .base import BaseCompressor
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+__all__ = ['AdaptiveCompressor', 'train_zstd_dictionary']
+
+RAW = b'\x00'
+ZLIB = b'\x01'
+LZ4 = b'\x02'
+LZMA = b'\x03'
+ZSTD = b'\x04'
+ZSTD_DICT = b'\x05'
+
+
+def train_zstd_dictionary(samples, dict_size=16 * 1024):
+    """
+    Trains zstd dictionary on list of sample values (bytes).
+    Returns dictionary data to be saved to COMPRESS_ZSTD_DICTIONARY file.
+    """
+    if zstandard is None:
+        raise ImproperlyConfigured('zstd dictionary requires zstandard package')
+    return zstandard.train_dictionary(dict_size, samples).as_bytes()
+
+
+class CompressionStats:
+    """Bytes saved versus time spent counters."""
+
+    fields = (
+        'compressed', 'skipped_small', 'skipped_ratio', 'decompressed',
+        'bytes_in', 'bytes_out', 'compress_time', 'decompress_time',
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = dict.fromkeys(self.fields, 0)
+
+    def incr(self, **counters):
+        with self._lock:
+            for name, value in counters.items():
+                self._data[name] += value
+
+    def as_dict(self):
+        with self._lock:
+            data = dict(self._data)
+        data['bytes_saved'] = data['bytes_in'] - data['bytes_out']
+        data['ratio'] = data['bytes_out'] / data['bytes_in'] if data['bytes_in'] else 1.0
+        return data
+
+    def reset(self):
+        with self._lock:
+            self._data = dict.fromkeys(self.fields, 0)
+
+
+class AdaptiveCompressor(BaseCompressor):
+    def __init__(self, options):
+        super(AdaptiveCompressor, self).__init__(options)
+        self.codec = options.get('COMPRESS_CODEC', 'zlib')
+        self.level = options.get('COMPRESS_LEVEL')
+        self.min_length = int(options.get('COMPRESS_MIN_LENGTH', 256))
+        self.min_ratio = float(options.get('COMPRESS_MIN_RATIO', 0.9))
+        self.stats = CompressionStats()
+        self._zstd_dict = None
+        self._compress, self._header = self._get_compress_func()
+        self._local = threading.local()
+
+    def _get_compress_func(self):
+        if self.codec == 'zlib':
+            level = 6 if self.level is None else self.level
+            return lambda value: zlib.compress(value, level), ZLIB
+        if self.codec == 'lzma':
+            preset = 4 if self.level is None else self.level
+            return lambda value: lzma.compress(value, preset=preset), LZMA
+        if self.codec == 'lz4':
+            if lz4_frame is None:
+                raise ImproperlyConfigured('lz4 codec requires lz4 package')
+            return lz4_frame.compress, LZ4
+        if self.codec == 'zstd':
+            if zstandard is None:
+                raise ImproperlyConfigured('zstd codec requires zstandard package')
+            dict_path = self._options.get('COMPRESS_ZSTD_DICTIONARY')
+            if dict_path:
+                with open(dict_path, 'rb') as f:
+                    self._zstd_dict = zstandard.ZstdCompressionDict(f.read())
+            header = ZSTD_DICT if self._zstd_dict is not None else ZSTD
+            return lambda value: self._get_zstd_compressor().compress(value), header
+        raise ImproperlyConfigured('Unknown compression codec: %s' % self.codec)
+
+    # zstd (de)compressor objects are not thread safe.
+
+    def _get_zstd_compressor(self):
+        compressor = getattr(self._local, 'zstd_compressor', None)
+        if compressor is None:
+            level = 3 if self.level is None else self.level
+            compressor = zstandard.ZstdCompressor(level=level, dict_data=self._zstd_dict)
+            self._local.zstd_compressor = compressor
+        return compressor
+
+    def _get_zstd_decompressor(self, with_dict):
+        name = 'zstd_dict_decompressor' if with_dict else 'zstd_decompressor'
+        decompressor = getattr(self._local, name, None)
+        if decompressor is None:
+            if with_dict and self._zstd_dict is None:
+                raise CompressorError('zstd dictionary is not configured')
+            decompressor = zstandard.ZstdDecompressor(
+                dict_data=self._zstd_dict if with_dict else None)
+            setattr(self._local, name, decompressor)
+        return decompressor
+
+    def compress(self, value):
+        length = len(value)
+        if length < self.min_length:
+            self.stats.incr(skipped_small=1, bytes_in=length + 1, bytes_out=length + 1)
+            return RAW + value
+        start = time.perf_counter()
+        compressed = self._compress(value)
+        elapsed = time.perf_counter() - start
+        if len(compressed) > length * self.min_ratio:
+            self.stats.incr(skipped_ratio=1, compress_time=elapsed,
+                            bytes_in=length + 1, bytes_out=length + 1)
+            return RAW + value
+        self.stats.incr(compressed=1, compress_time=elapsed,
+                        bytes_in=length + 1, bytes_out=len(compressed) + 1)
+        return self._header + compressed
+
+    def decompress(self, value):
+        header, payload = value[:1], value[1:]
+        if header == RAW:
+            return payload
+        start = time.perf_counter()
+        try:
+            if header == ZLIB:
+                result = zlib.decompress(payload)
+            elif header == LZMA:
+                result = lzma.decompress(payload)
+            elif header == LZ4 and lz4_frame is not None:
+                result = lz4_frame.decompress(payload)
+            elif header in (ZSTD, ZSTD_DICT) and zstandard is not None:
+                result = self._get_zstd_decompressor(header == ZSTD_DICT).decompress(payload)
+            else:
+                result = self._decompress_legacy(value)
+        except CompressorError:
+            raise
+        except Exception as e:
+            raise CompressorError(e)
+        self.stats.incr(decompressed=1, decompress_time=time.perf_counter() - start)
+        return result
+
+    def _decompress_legacy(self, value):
+        # Values written by ZlibCompressor have no header,
+        # zlib stream header never matches known ones.
+        try:
+            return zlib.decompress(value)
+        except zlib.error:
+            raise CompressorError('Unknown compression header: %r' % value[:1])
@@ -1,3 +1,6 @@
+from redis.exceptions import ConnectionError
+
+
 class ConnectionInterrupted(Exception):
     def __init__(self, connection, parent=None):
         self.connection = connection
@@ -16,3 +19,8 @@ class ConnectionInterrupted(Exception):
 
 class CompressorError(Exception):
     pass
+
+
+class CircuitBreakerOpen(ConnectionError):
+    """Call is short-circuited, since the cache server is degraded."""
+    pass
@@ -1,57 +1,162 @@
+"""
+Consistent hash ring.
+
+Ring points are integers kept in precomputed sorted arrays, so routing
+a key costs one hash and one bisect over ints.
+
+With ``ketama=True`` points and key hashes are computed as in libketama
+with equal server weights (160 32-bit points per server taken from md5
+digests of ``host:port``), and key goes to the first point not less than
+its hash, so keys are routed the same way as by ketama compatible
+clients of other languages.
+"""
+from collections import Counter
+from urllib.parse import urlparse
 import bisect
 import hashlib
 
+# Points per server in libketama with equal weights.
+KETAMA_POINTS = 160
 
-class HashRing(object):
-    nodes = []
 
-    def __init__(self, nodes=(), replicas=128):
+def hash64(data):
+    """Returns 64-bit integer hash of bytes."""
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big')
+
+
+def ketama_node_name(node):
+    """Returns ``host:port`` of redis URL ``node``, as libketama names servers."""
+    if '://' not in node:
+        return node
+    url = urlparse(node)
+    if url.hostname is None:
+        # Unix socket.
+        return url.path
+    return '{0}:{1}'.format(url.hostname, url.port or 6379)
+
+
+def ketama_points(node, replicas=KETAMA_POINTS):
+    """Yields libketama compatible 32-bit points for ``node``."""
+    name = ketama_node_name(node)
+    for i in range((replicas + 3) // 4):
+        digest = hashlib.md5('{0}-{1}'.format(name, i).encode('utf-8')).digest()
+        for j in range(4):
+            yield int.from_bytes(digest[j * 4:j * 4 + 4], 'little')
+
+
+def ketama_hash(data):
+    """Returns libketama compatible 32-bit hash of bytes."""
+    return int.from_bytes(hashlib.md5(data).digest()[:4], 'little')
+
+
+class HashRing(object):
+    def __init__(self, nodes=(), replicas=None, ketama=False):
+        if replicas is None:
+            replicas = KETAMA_POINTS if ketama else 128
         self.replicas = replicas
+        self.ketama = ketama
+        self.nodes = []
+        # node -> points
         self.ring = {}
+        # Parallel sorted arrays of points and their nodes.
         self.sorted_keys = []
+        self.sorted_nodes = []
 
         for node in nodes:
-            self.add_node(node)
+            self.nodes.append(node)
+            self.ring[node] = self.get_points(node)
+        self._build()
 
-    def add_node(self, node):
-        self.nodes.append(node)
+    def get_points(self, node):
+        if self.ketama:
+            return list(ketama_points(node, self.replicas))
+        return [hash64('{0}:{1}'.format(node, x).encode('utf-8'))
+                for x in range(self.replicas)]
 
-        for x in range(self.replicas):
-            _key = "{0}:{1}".format(node, x)
-            _hash = hashlib.sha256(_key.encode('utf-8')).hexdigest()
+    def hash_key(self, key):
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+        if self.ketama:
+            return ketama_hash(key)
+        return hash64(key)
 
-            self.ring[_hash] = node
-            self.sorted_keys.append(_hash)
+    def _build(self):
+        points = sorted(
+            (point, index)
+            for index, node in enumerate(self.nodes)
+            for point in self.ring[node]
+        )
+        self.sorted_keys = [point for point, index in points]
+        self.sorted_nodes = [self.nodes[index] for point, index in points]
 
-        self.sorted_keys.sort()
+    def add_node(self, node):
+        if node in self.ring:
+            return
+        self.nodes.append(node)
+        self.ring[node] = self.get_points(node)
+        self._build()
 
     def remove_node(self, node):
+        if node not in self.ring:
+            return
         self.nodes.remove(node)
-        for x in range(self.replicas):
-            _hash = hashlib.sha256("%s:%d" % (node, x)).hexdigest()
-            self.ring.remove(_hash)
-            self.sorted_keys.remove(_hash)
+        del self.ring[node]
+        self._build()
 
     def get_node(self, key):
         n, i = self.get_node_pos(key)
         return n
 
     def get_node_pos(self, key):
-        if len(self.ring) == 0:
+        if not self.sorted_keys:
             return (None, None)
 
-        _hash = hashlib.sha256(key.encode('utf-8')).hexdigest()
-        idx = bisect.bisect(self.sorted_keys, _hash)
-        idx = min(idx - 1, (self.replicas * len(self.nodes)) - 1)
-        return (self.ring[self.sorted_keys[idx]], idx)
+        if self.ketama:
+            # libketama picks the first point >= hash.
+            idx = bisect.bisect_left(self.sorted_keys, self.hash_key(key))
+        else:
+            idx = bisect.bisect(self.sorted_keys, self.hash_key(key))
+        if idx == len(self.sorted_keys):
+            idx = 0
+        return (self.sorted_nodes[idx], idx)
 
     def iter_nodes(self, key):
-        if len(self.ring) == 0:
+        if not self.sorted_keys:
             yield None, None
+            return
 
         node, pos = self.get_node_pos(key)
-        for k in self.sorted_keys[pos:]:
-            yield k, self.ring[k]
+        for idx in range(pos, len(self.sorted_keys)):
+            yield self.sorted_keys[idx], self.sorted_nodes[idx]
+
+    def rebalance_report(self, keys, add=(), remove=()):
+        """
+        Returns how many of ``keys`` move to another node if nodes
+        ``add`` are added and nodes ``remove`` are removed.
+        """
+        ring = HashRing(self.nodes, replicas=self.replicas, ketama=self.ketama)
+        for node in add:
+            ring.add_node(node)
+        for node in remove:
+            ring.remove_node(node)
+
+        before, after = Counter(), Counter()
+        total = moved = 0
+        for key in keys:
+            old, new = self.get_node(key), ring.get_node(key)
+            before[old] += 1
+            after[new] += 1
+            total += 1
+            if old != new:
+                moved += 1
+
+        return {
+            'total': total,
+            'moved': moved,
+            'moved_ratio': moved / total if total else 0.0,
+            'before': dict(before),
+            'after': dict(after),
+        }
 
     def __call__(self, key):
         return self.get_node(key)
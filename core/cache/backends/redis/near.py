@@ -0,0 +1,466 @@
+"""
+Two-tier (near) cache backend.
+
+Reads are served from a bounded in-process LRU layer and fall through
+to Redis. Writes go to Redis, and local copies in all processes are
+invalidated via Redis pub/sub channel.
+
+Example::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'anthill.framework.core.cache.backends.redis.near.NearCache',
+            'LOCATION': 'redis://127.0.0.1:6379/1',
+            'OPTIONS': {
+                'NEAR_CACHE_MAX_ENTRIES': 1000,
+                'NEAR_CACHE_TIMEOUT': 5,
+            }
+        }
+    }
+
+Local copies are served only while the invalidation channel is subscribed,
+so lost connection to Redis never leads to serving stale values for longer
+than ``NEAR_CACHE_TIMEOUT`` seconds.
+"""
+from collections import OrderedDict
+from anthill.framework.core.cache.backends.base import DEFAULT_TIMEOUT
+from .cache import RedisCache
+import functools
+import threading
+import logging
+import json
+import time
+import uuid
+import os
+
+logger = logging.getLogger('anthill.application')
+
+__all__ = ['NearCache']
+
+_MISSING = object()
+
+# Marker of the ``clear all`` invalidation message.
+_ALL = None
+
+
+def sync_fallback(method):
+    """
+    Runs sync version of the method in the thread pool
+    if asyncio redis client is not available.
+    """
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        if not self.client.async_supported:
+            return await self._run_async(getattr(self, method.__name__[1:]), *args, **kwargs)
+        return await method(self, *args, **kwargs)
+    return wrapper
+
+
+class LocalCache:
+    """Thread safe in-process LRU storage with per entry expiration."""
+
+    def __init__(self, max_entries=1000, timeout=None):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def generation(self):
+        """Invalidation counter, changes on every delete_many() and clear()."""
+        return self._generation
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expiry, value = self._data[key]
+            except KeyError:
+                return default
+            if expiry is not None and expiry <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, generation=None):
+        """
+        Stores the value. If ``generation`` is given, the value is dropped
+        when any entries were invalidated since it was taken, because
+        the value may be read before the invalidation.
+        """
+        expiry = None if self.timeout is None else time.monotonic() + self.timeout
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._data[key] = (expiry, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+
+class NearCache(RedisCache):
+    """
+    Redis cache backend with in-process LRU layer in front of it.
+
+    Options:
+        NEAR_CACHE_MAX_ENTRIES -- max number of local entries (default 1000).
+        NEAR_CACHE_TIMEOUT -- max age of local entries in seconds (default 5),
+                              bounds staleness if invalidation message is lost.
+        NEAR_CACHE_CHANNEL -- invalidation pub/sub channel name.
+    """
+
+    def __init__(self, server, params):
+        super(NearCache, self).__init__(server, params)
+        options = params.get('OPTIONS', {})
+        self._local = LocalCache(
+            max_entries=int(options.get('NEAR_CACHE_MAX_ENTRIES', 1000)),
+            timeout=options.get('NEAR_CACHE_TIMEOUT', 5)
+        )
+        self._channel = options.get(
+            'NEAR_CACHE_CHANNEL', 'anthill:cache:invalidate:%s' % self.key_prefix)
+        self._origin_id = None
+        self._origin_pid = None
+        self._listener = None
+        self._listener_pid = None
+        self._subscribed = threading.Event()
+        self._publisher = None
+        self._async_publisher = None
+        self._stats_lock = threading.Lock()
+        self._stats = dict.fromkeys(
+            ('local_hits', 'local_misses', 'remote_hits', 'remote_misses'), 0)
+
+    # Invalidation channel
+
+    @property
+    def _origin(self):
+        """Id of this process in invalidation messages, own in every forked worker."""
+        pid = os.getpid()
+        if self._origin_pid != pid:
+            self._origin_id = uuid.uuid4().hex
+            self._origin_pid = pid
+        return self._origin_id
+
+    def _get_server(self):
+        return self.client._server[0]
+
+    def _ensure_listener(self):
+        # Listener thread does not survive fork(), so check the process too.
+        if self._listener_pid == os.getpid() and self._listener.is_alive():
+            return
+        self._subscribed.clear()
+        self._local.clear()
+        self._publisher = None
+        self._async_publisher = None
+        self._listener_pid = os.getpid()
+        self._listener = threading.Thread(
+            target=self._listen, name='near-cache-invalidation', daemon=True)
+        self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                connection = self.client.connection_factory.connect(self._get_server())
+                pubsub = connection.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._channel)
+                # Nothing was received while unsubscribed, so drop everything.
+                self._local.clear()
+                self._subscribed.set()
+                for message in pubsub.listen():
+                    self._on_message(message)
+            except Exception as e:
+                self._subscribed.clear()
+                self._local.clear()
+                logger.warning('Near cache invalidation channel lost: %s', e)
+                time.sleep(1)
+
+    def _on_message(self, message):
+        if message.get('type') != 'message':
+            return
+        try:
+            data = json.loads(message['data'])
+        except (TypeError, ValueError):
+            return
+        if data.get('o') == self._origin:
+            return
+        keys = data.get('k')
+        if keys is _ALL:
+            self._local.clear()
+        else:
+            self._local.delete_many(keys)
+
+    def _make_message(self, keys):
+        return json.dumps({'o': self._origin, 'k': keys})
+
+    def _publish(self, keys):
+        if self._publisher is None:
+            self._publisher = self.client.connection_factory.connect(self._get_server())
+        try:
+            self._publisher.publish(self._channel, self._make_message(keys))
+        except Exception as e:
+            # Other processes can not be notified, so their local copies
+            # live until NEAR_CACHE_TIMEOUT.
+            logger.error('Cannot publish near cache invalidation: %s', e)
+
+    async def _apublish(self, keys):
+        if self._async_publisher is None:
+            self._async_publisher = self.client.connection_factory.connect_async(
+                self._get_server())
+        try:
+            await self._async_publisher.publish(self._channel, self._make_message(keys))
+        except Exception as e:
+            logger.error('Cannot publish near cache invalidation: %s', e)
+
+    def _make_local_keys(self, keys, version=None):
+        return [str(self.client.make_key(key, version=version)) for key in keys]
+
+    def _invalidate(self, keys, version=None):
+        local_keys = _ALL if keys is _ALL else self._make_local_keys(keys, version)
+        if local_keys is _ALL:
+            self._local.clear()
+        else:
+            self._local.delete_many(local_keys)
+        self._publish(local_keys)
+
+    async def _ainvalidate(self, keys, version=None):
+        local_keys = _ALL if keys is _ALL else self._make_local_keys(keys, version)
+        if local_keys is _ALL:
+            self._local.clear()
+        else:
+            self._local.delete_many(local_keys)
+        await self._apublish(local_keys)
+
+    # Local tier
+
+    def _incr_stat(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def _local_get(self, key, version=None):
+        self._ensure_listener()
+        if not self._subscribed.is_set():
+            return _MISSING, None
+        local_key = self._make_local_keys([key], version)[0]
+        value = self._local.get(local_key, _MISSING)
+        if value is _MISSING:
+            self._incr_stat('local_misses')
+            return _MISSING, local_key
+        self._incr_stat('local_hits')
+        # Values are kept encoded, so callers never share mutable objects.
+        return self.client.decode(value), local_key
+
+    def _local_set(self, local_key, value, generation):
+        # ``generation`` is taken before the remote read, so the value is
+        # not stored if invalidation message came in the meantime.
+        if value is _MISSING:
+            self._incr_stat('remote_misses')
+            return
+        self._incr_stat('remote_hits')
+        if local_key is not None:
+            self._local.set(local_key, self.client.encode(value), generation)
+
+    def stats(self):
+        """Returns hit/miss counters and hit ratio per tier."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        for tier in ('local', 'remote'):
+            total = stats['%s_hits' % tier] + stats['%s_misses' % tier]
+            stats['%s_hit_ratio' % tier] = stats['%s_hits' % tier] / total if total else 0.0
+        stats['local_entries'] = len(self._local)
+        return stats
+
+    def reset_stats(self):
+        with self._stats_lock:
+            for name in self._stats:
+                self._stats[name] = 0
+
+    # Cache API
+
+    def get(self, key, default=None, version=None, client=None):
+        value, local_key = self._local_get(key, version=version)
+        if value is not _MISSING:
+            return value
+        generation = self._local.generation
+        value = super(NearCache, self).get(key, default=_MISSING, version=version, client=client)
+        self._local_set(local_key, value, generation)
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        recovered_data = OrderedDict()
+        missing = OrderedDict()
+        for key in keys:
+            value, local_key = self._local_get(key, version=version)
+            if value is _MISSING:
+                missing[key] = local_key
+            else:
+                recovered_data[key] = value
+        if missing:
+            generation = self._local.generation
+            remote_data = super(NearCache, self).get_many(list(missing), version=version)
+            for key, local_key in missing.items():
+                value = remote_data.get(key, _MISSING)
+                self._local_set(local_key, value, generation)
+                if value is not _MISSING:
+                    recovered_data[key] = value
+        return recovered_data
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, *args, **kwargs):
+        result = super(NearCache, self).set(key, value, timeout, version, *args, **kwargs)
+        self._invalidate([key], version=version)
+        return result
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, *args, **kwargs):
+        result = super(NearCache, self).add(key, value, timeout, version, *args, **kwargs)
+        if result:
+            self._invalidate([key], version=version)
+        return result
+
+    def replace(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        result = super(NearCache, self).replace(key, value, timeout, version)
+        if result:
+            self._invalidate([key], version=version)
+        return result
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None, *args, **kwargs):
+        result = super(NearCache, self).set_many(data, timeout, version, *args, **kwargs)
+        self._invalidate(list(data), version=version)
+        return result
+
+    def delete(self, key, version=None, *args, **kwargs):
+        result = super(NearCache, self).delete(key, version, *args, **kwargs)
+        self._invalidate([key], version=version)
+        return result
+
+    def delete_many(self, keys, version=None, *args, **kwargs):
+        keys = list(keys)
+        result = super(NearCache, self).delete_many(keys, version, *args, **kwargs)
+        self._invalidate(keys, version=version)
+        return result
+
+    def delete_pattern(self, *args, **kwargs):
+        result = super(NearCache, self).delete_pattern(*args, **kwargs)
+        self._invalidate(_ALL)
+        return result
+
+    def incr(self, key, delta=1, version=None, *args, **kwargs):
+        result = super(NearCache, self).incr(key, delta, version, *args, **kwargs)
+        self._invalidate([key], version=version)
+        return result
+
+    def decr(self, key, delta=1, version=None, *args, **kwargs):
+        result = super(NearCache, self).decr(key, delta, version, *args, **kwargs)
+        self._invalidate([key], version=version)
+        return result
+
+    def incr_version(self, key, delta=1, version=None, *args, **kwargs):
+        result = super(NearCache, self).incr_version(key, delta, version, *args, **kwargs)
+        self._invalidate([key], version=version)
+        return result
+
+    def clear(self):
+        result = super(NearCache, self).clear()
+        self._invalidate(_ALL)
+        return result
+
+    # Async cache API
+
+    @sync_fallback
+    async def aget(self, key, default=None, version=None, client=None):
+        value, local_key = self._local_get(key, version=version)
+        if value is not _MISSING:
+            return value
+        generation = self._local.generation
+        value = await super(NearCache, self).aget(key, default=_MISSING, version=version)
+        self._local_set(local_key, value, generation)
+        return default if value is _MISSING else value
+
+    @sync_fallback
+    async def aget_many(self, keys, version=None):
+        recovered_data = OrderedDict()
+        missing = OrderedDict()
+        for key in keys:
+            value, local_key = self._local_get(key, version=version)
+            if value is _MISSING:
+                missing[key] = local_key
+            else:
+                recovered_data[key] = value
+        if missing:
+            generation = self._local.generation
+            remote_data = await super(NearCache, self).aget_many(list(missing), version=version)
+            for key, local_key in missing.items():
+                value = remote_data.get(key, _MISSING)
+                self._local_set(local_key, value, generation)
+                if value is not _MISSING:
+                    recovered_data[key] = value
+        return recovered_data
+
+    @sync_fallback
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, *args, **kwargs):
+        result = await super(NearCache, self).aset(key, value, timeout, version, *args, **kwargs)
+        await self._ainvalidate([key], version=version)
+        return result
+
+    @sync_fallback
+    async def aadd(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, *args, **kwargs):
+        result = await super(NearCache, self).aadd(key, value, timeout, version, *args, **kwargs)
+        if result:
+            await self._ainvalidate([key], version=version)
+        return result
+
+    @sync_fallback
+    async def areplace(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        result = await super(NearCache, self).areplace(key, value, timeout, version)
+        if result:
+            await self._ainvalidate([key], version=version)
+        return result
+
+    @sync_fallback
+    async def aset_many(self, data, timeout=DEFAULT_TIMEOUT, version=None, *args, **kwargs):
+        result = await super(NearCache, self).aset_many(data, timeout, version, *args, **kwargs)
+        await self._ainvalidate(list(data), version=version)
+        return result
+
+    @sync_fallback
+    async def adelete(self, key, version=None, *args, **kwargs):
+        result = await super(NearCache, self).adelete(key, version, *args, **kwargs)
+        await self._ainvalidate([key], version=version)
+        return result
+
+    @sync_fallback
+    async def adelete_many(self, keys, version=None, *args, **kwargs):
+        keys = list(keys)
+        result = await super(NearCache, self).adelete_many(keys, version, *args, **kwargs)
+        await self._ainvalidate(keys, version=version)
+        return result
+
+    @sync_fallback
+    async def aincr(self, key, delta=1, version=None, *args, **kwargs):
+        result = await super(NearCache, self).aincr(key, delta, version, *args, **kwargs)
+        await self._ainvalidate([key], version=version)
+        return result
+
+    @sync_fallback
+    async def adecr(self, key, delta=1, version=None, *args, **kwargs):
+        result = await super(NearCache, self).adecr(key, delta, version, *args, **kwargs)
+        await self._ainvalidate([key], version=version)
+        return result
+
+    @sync_fallback
+    async def aclear(self):
+        result = await super(NearCache, self).aclear()
+        await self._ainvalidate(_ALL)
+        return result
@@ -1,7 +1,16 @@
 from anthill.framework.conf import settings
+from anthill.framework.core.exceptions import ImproperlyConfigured
 from anthill.framework.utils.module_loading import import_string
 from redis.connection import DefaultParser
 
+try:
+    from redis import asyncio as aioredis  # redis-py >= 4.2
+except ImportError:
+    try:
+        import aioredis
+    except ImportError:
+        aioredis = None
+
 
 class ConnectionFactory(object):
 
@@ -12,6 +21,7 @@ class ConnectionFactory(object):
     # (DefaultClient) instance for every request.
 
     _pools = {}
+    _async_pools = {}
 
     def __init__(self, options):
         pool_cls_path = options.get("CONNECTION_POOL_CLASS",
@@ -24,8 +34,14 @@ class ConnectionFactory(object):
         self.redis_client_cls = import_string(redis_client_cls_path)
         self.redis_client_cls_kwargs = options.get("REDIS_CLIENT_KWARGS", {})
 
+        self.async_pool_cls_kwargs = options.get("ASYNC_CONNECTION_POOL_KWARGS", {})
+
         self.options = options
 
+    @property
+    def async_supported(self):
+        return aioredis is not None
+
     def make_connection_params(self, url):
         """
         Given a main connection parameters, build a complete
@@ -112,6 +128,39 @@ class ConnectionFactory(object):
 
         return pool
 
+    def connect_async(self, url):
+        """
+        Given a basic connection parameters,
+        return a new asyncio redis client.
+        """
+        if not self.async_supported:
+            raise ImproperlyConfigured(
+                "Async redis client requires redis-py >= 4.2 or aioredis package")
+        params = self.make_connection_params(url)
+        pool = self.get_or_create_async_connection_pool(params)
+        return aioredis.Redis(connection_pool=pool)
+
+    def get_or_create_async_connection_pool(self, params):
+        """
+        Given a connection parameters and return a new
+        or cached asyncio connection pool for them.
+        """
+        key = params["url"]
+        if key not in self._async_pools:
+            self._async_pools[key] = self.get_async_connection_pool(params)
+        return self._async_pools[key]
+
+    def get_async_connection_pool(self, params):
+        """
+        Given a connection parameters, return a new
+        asyncio connection pool for them.
+        """
+        cp_params = dict(params)
+        # Sync parser class is not compatible with asyncio connections.
+        cp_params.pop("parser_class", None)
+        cp_params.update(self.async_pool_cls_kwargs)
+        return aioredis.ConnectionPool.from_url(**cp_params)
+
 
 def get_connection_factory(path=None, options=None):
     if path is None:
@@ -0,0 +1,105 @@
+"""
+Latency and health aware selection of read replicas.
+
+Reads go to the faster one of two random healthy replicas (by moving
+average of observed latency), so load is spread but slow replicas get
+less traffic. Replica failing several times in a row is ejected for
+a while, and re-admitted after successful probe read. Probe reads are
+given only to callers reporting the result back, and a probe not
+reported in ``eject_time`` seconds is considered lost.
+"""
+import random
+import threading
+import time
+
+
+class ReplicaSelector:
+    """
+    Keeps stats of servers with indexes ``0..count-1``,
+    where 0 is the master, and others are read replicas.
+    """
+
+    def __init__(self, count, alpha=0.2, eject_failures=3, eject_time=10):
+        self.count = count
+        self.alpha = alpha
+        self.eject_failures = eject_failures
+        self.eject_time = eject_time
+
+        self._lock = threading.Lock()
+        # Moving average of latency in seconds, None if unknown yet.
+        self._latency = [None] * count
+        self._failures = [0] * count
+        # Ejected replica is probed after this moment.
+        self._ejected_until = [None] * count
+        # Probe read of ejected replica is in flight until this moment.
+        self._probing = [None] * count
+
+    def choose(self, exclude=(), probe=False):
+        """
+        Returns index of replica to read from, or 0 if no healthy replicas.
+        Ejected replica may be returned for a probe read only if ``probe``
+        is set, then the caller must report the result back with
+        `record_success()` or `record_failure()`.
+        """
+        now = time.monotonic()
+        candidates = []
+        with self._lock:
+            for index in range(1, self.count):
+                if index in exclude:
+                    continue
+                ejected_until = self._ejected_until[index]
+                if ejected_until is not None:
+                    if not probe or ejected_until > now:
+                        continue
+                    probing_until = self._probing[index]
+                    if probing_until is not None and probing_until > now:
+                        continue
+                    # Let one probe read through.
+                    self._probing[index] = now + self.eject_time
+                    return index
+                candidates.append(index)
+
+            if not candidates:
+                return 0
+            if len(candidates) == 1:
+                return candidates[0]
+
+            # Power of two choices.
+            a, b = random.sample(candidates, 2)
+            latency_a, latency_b = self._latency[a], self._latency[b]
+            # Replicas without stats yet are tried first.
+            if latency_a is None:
+                return a
+            if latency_b is None:
+                return b
+            return a if latency_a <= latency_b else b
+
+    def record_success(self, index, elapsed):
+        with self._lock:
+            self._failures[index] = 0
+            self._ejected_until[index] = None
+            self._probing[index] = None
+            latency = self._latency[index]
+            if latency is None:
+                self._latency[index] = elapsed
+            else:
+                self._latency[index] = self.alpha * elapsed + (1 - self.alpha) * latency
+
+    def record_failure(self, index):
+        with self._lock:
+            self._failures[index] += 1
+            if self._probing[index] is not None or self._failures[index] >= self.eject_failures:
+                self._ejected_until[index] = time.monotonic() + self.eject_time
+            self._probing[index] = None
+
+    def stats(self):
+        """Returns list of dicts with latency and health of every server."""
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                'index': index,
+                'latency': self._latency[index],
+                'failures': self._failures[index],
+                'ejected': (self._ejected_until[index] is not None and
+                            self._ejected_until[index] > now),
+            } for index in range(self.count)]
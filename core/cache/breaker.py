@@ -0,0 +1,142 @@
+"""
+Circuit breaker for cache backends.
+
+When the cache server is degraded, every call waits out the socket
+timeout. Circuit breaker counts failures and, once the circuit is open,
+calls are short-circuited at once for a cool-down period. After that
+a few probe calls are let through (half-open state), and the circuit
+closes again as soon as a probe succeeds.
+"""
+import threading
+import time
+
+__all__ = ['CircuitBreaker', 'CLOSED', 'OPEN', 'HALF_OPEN']
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures, or if
+    ``timeout_ratio`` of the last ``window`` calls timed out.
+    Stays open for ``cool_down`` seconds, then lets
+    ``half_open_max_calls`` probe calls through.
+    """
+
+    def __init__(self, name='', failure_threshold=5, timeout_ratio=0.5, window=20,
+                 cool_down=10, half_open_max_calls=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.timeout_ratio = timeout_ratio
+        self.window = window
+        self.cool_down = cool_down
+        self.half_open_max_calls = half_open_max_calls
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = None
+        self._consecutive_failures = 0
+        # Outcomes of last calls, True if call timed out.
+        self._outcomes = []
+        self._probes = 0
+
+        self._opened_count = 0
+        self._short_circuited_count = 0
+        self._failures_count = 0
+        self._calls_count = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            self._update_state()
+            return self._state
+
+    def _update_state(self):
+        if self._state == OPEN and time.monotonic() >= self._opened_at + self.cool_down:
+            self._state = HALF_OPEN
+            self._probes = 0
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._opened_count += 1
+        self._outcomes = []
+
+    def _close(self):
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._outcomes = []
+
+    def allow_request(self):
+        """
+        Returns whether the call may be done.
+        Every allowed call must be followed by record_success(),
+        record_failure() or record_inconclusive().
+        """
+        with self._lock:
+            self._update_state()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return True
+            self._short_circuited_count += 1
+            return False
+
+    def _record(self, timed_out):
+        self._calls_count += 1
+        self._outcomes.append(timed_out)
+        if len(self._outcomes) > self.window:
+            del self._outcomes[0]
+
+    def record_success(self):
+        with self._lock:
+            self._record(False)
+            if self._state == HALF_OPEN:
+                self._close()
+            self._consecutive_failures = 0
+
+    def record_failure(self, timed_out=False):
+        with self._lock:
+            self._record(timed_out)
+            self._failures_count += 1
+            self._consecutive_failures += 1
+            if self._state == HALF_OPEN:
+                self._open()
+            elif self._state == CLOSED:
+                if self._consecutive_failures >= self.failure_threshold:
+                    self._open()
+                elif (len(self._outcomes) >= self.window and
+                      sum(self._outcomes) / len(self._outcomes) >= self.timeout_ratio):
+                    self._open()
+
+    def record_inconclusive(self):
+        """
+        Records call failed for reason unrelated to server health,
+        so the probe of half-open circuit may be retried.
+        """
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def reset(self):
+        with self._lock:
+            self._close()
+
+    def metrics(self):
+        """Returns breaker state and counters."""
+        with self._lock:
+            self._update_state()
+            return {
+                'name': self.name,
+                'state': self._state,
+                'consecutive_failures': self._consecutive_failures,
+                'timeout_ratio': (
+                    sum(self._outcomes) / len(self._outcomes) if self._outcomes else 0.0),
+                'opened': self._opened_count,
+                'short_circuited': self._short_circuited_count,
+                'failures': self._failures_count,
+                'calls': self._calls_count,
+            }
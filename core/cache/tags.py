@@ -0,0 +1,238 @@
+"""
+Tag-based cache invalidation.
+
+Every tag has a version stored in the cache. Tagged entries keep versions
+of their tags they were stored with, and become invalid as soon as any
+of these versions changes. So invalidation of a tag is a single write,
+no matter how many entries are tagged with it; stale entries just miss.
+
+    from anthill.framework.core.cache.tags import tagged_cache
+
+    tagged_cache.set('profile:1', profile, tags=['profiles'])
+    tagged_cache.invalidate_tags(['profiles'])
+
+If ``CACHE_MODEL_TAGS_INVALIDATION`` setting is enabled, committed model
+changes invalidate tag ``model_tag(Model)`` of every changed model.
+"""
+from anthill.framework.conf import settings
+from anthill.framework.core.cache import caches, DEFAULT_CACHE_ALIAS
+from anthill.framework.core.cache.backends.base import DEFAULT_TIMEOUT
+import asyncio
+import inspect
+import uuid
+
+__all__ = [
+    'TaggedCache', 'tagged_cache', 'model_tag', 'invalidate_model_tags',
+    'connect_model_invalidation'
+]
+
+TAG_KEY_PREFIX = 'tag:'
+TAGGED_MARKER = '__tagged__'
+
+_MISSING = object()
+
+
+def _new_tag_version():
+    return uuid.uuid4().hex[:16]
+
+
+class TaggedCache:
+    """
+    Cache wrapper which adds tags support to any cache backend.
+    If ``cache`` is not set, the cache of ``CACHE_TAGS_ALIAS`` is used.
+    """
+
+    def __init__(self, cache=None):
+        self._cache = cache
+
+    @property
+    def cache(self):
+        if self._cache is not None:
+            return self._cache
+        return caches[getattr(settings, 'CACHE_TAGS_ALIAS', DEFAULT_CACHE_ALIAS)]
+
+    def _tag_key(self, tag):
+        return TAG_KEY_PREFIX + tag
+
+    def _is_tagged_entry(self, entry):
+        # JSON serializers turn tuples into lists.
+        return (isinstance(entry, (tuple, list)) and len(entry) == 3
+                and entry[0] == TAGGED_MARKER)
+
+    def _make_entry(self, value, versions):
+        return TAGGED_MARKER, value, versions
+
+    def _missing_versions(self, tags, versions):
+        """Returns versions of tags having no version yet."""
+        return {tag: _new_tag_version() for tag in tags
+                if versions.get(self._tag_key(tag)) is None}
+
+    def _is_valid(self, entry, versions):
+        return all(version is not None and versions.get(self._tag_key(tag)) == version
+                   for tag, version in entry[2].items())
+
+    def _is_known(self, tag_versions):
+        # Version may be unknown if it could not be read back from
+        # the cache (evicted or cache error ignored). Value stored
+        # with it could never be invalidated, so it is not stored.
+        return all(version is not None for version in tag_versions.values())
+
+    def tag_versions(self, tags):
+        """
+        Returns current versions of ``tags``,
+        creating versions of new tags. Version is None if it is unknown.
+        """
+        tags = list(tags)
+        versions = self.cache.get_many([self._tag_key(tag) for tag in tags])
+        for tag, version in self._missing_versions(tags, versions).items():
+            # Other process might create version at the same time.
+            if not self.cache.add(self._tag_key(tag), version, timeout=None):
+                version = self.cache.get(self._tag_key(tag))
+            versions[self._tag_key(tag)] = version
+        return {tag: versions[self._tag_key(tag)] for tag in tags}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, tags=(), tag_versions=None):
+        """
+        Set a value in the cache tagged with ``tags``.
+        Values computed from data read before should be stored with
+        ``tag_versions`` read before that data, so an invalidation
+        made in between is not lost. Value is not stored if
+        any tag version is unknown.
+        """
+        if not tags:
+            return self.cache.set(key, value, timeout=timeout, version=version)
+        if tag_versions is None:
+            tag_versions = self.tag_versions(tags)
+        if not self._is_known(tag_versions):
+            return False
+        entry = self._make_entry(value, tag_versions)
+        return self.cache.set(key, entry, timeout=timeout, version=version)
+
+    def get(self, key, default=None, version=None):
+        entry = self.cache.get(key, _MISSING, version=version)
+        if entry is _MISSING:
+            return default
+        if not self._is_tagged_entry(entry):
+            return entry
+        versions = self.cache.get_many([self._tag_key(tag) for tag in entry[2]])
+        if not self._is_valid(entry, versions):
+            return default
+        return entry[1]
+
+    def get_or_set(self, key, producer, timeout=DEFAULT_TIMEOUT, version=None, tags=()):
+        """
+        Fetch a given key from the cache. If the key does not exist or
+        is invalidated, compute it with ``producer`` and store with ``tags``.
+        """
+        value = self.get(key, _MISSING, version=version)
+        if value is not _MISSING:
+            return value
+        # Versions are read before the value is computed, so the value
+        # is invalid if any tag is invalidated during the computation.
+        tag_versions = self.tag_versions(tags)
+        value = producer()
+        self.set(key, value, timeout=timeout, version=version, tags=tags, tag_versions=tag_versions)
+        return value
+
+    def delete(self, key, version=None):
+        return self.cache.delete(key, version=version)
+
+    def invalidate_tags(self, tags):
+        """Invalidates all entries tagged with any of ``tags``."""
+        tags = list(tags)
+        if tags:
+            self.cache.set_many(
+                {self._tag_key(tag): _new_tag_version() for tag in tags}, timeout=None)
+
+    # Async API
+
+    async def atag_versions(self, tags):
+        """Async version of tag_versions()."""
+        tags = list(tags)
+        versions = await self.cache.aget_many([self._tag_key(tag) for tag in tags])
+        for tag, version in self._missing_versions(tags, versions).items():
+            if not await self.cache.aadd(self._tag_key(tag), version, timeout=None):
+                version = await self.cache.aget(self._tag_key(tag))
+            versions[self._tag_key(tag)] = version
+        return {tag: versions[self._tag_key(tag)] for tag in tags}
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, tags=(), tag_versions=None):
+        """Async version of set()."""
+        if not tags:
+            return await self.cache.aset(key, value, timeout=timeout, version=version)
+        if tag_versions is None:
+            tag_versions = await self.atag_versions(tags)
+        if not self._is_known(tag_versions):
+            return False
+        entry = self._make_entry(value, tag_versions)
+        return await self.cache.aset(key, entry, timeout=timeout, version=version)
+
+    async def aget(self, key, default=None, version=None):
+        """Async version of get()."""
+        entry = await self.cache.aget(key, _MISSING, version=version)
+        if entry is _MISSING:
+            return default
+        if not self._is_tagged_entry(entry):
+            return entry
+        versions = await self.cache.aget_many([self._tag_key(tag) for tag in entry[2]])
+        if not self._is_valid(entry, versions):
+            return default
+        return entry[1]
+
+    async def adelete(self, key, version=None):
+        """Async version of delete()."""
+        return await self.cache.adelete(key, version=version)
+
+    async def ainvalidate_tags(self, tags):
+        """Async version of invalidate_tags()."""
+        tags = list(tags)
+        if tags:
+            await self.cache.aset_many(
+                {self._tag_key(tag): _new_tag_version() for tag in tags}, timeout=None)
+
+    async def aget_or_set(self, key, producer, timeout=DEFAULT_TIMEOUT, version=None, tags=()):
+        """
+        Fetch a given key from the cache. If the key does not exist or
+        is invalidated, compute it with ``producer`` and store with ``tags``.
+        Concurrent callers in the process wait for the same computation.
+        """
+        value = await self.aget(key, _MISSING, version=version)
+        if value is not _MISSING:
+            return value
+
+        async def compute():
+            # Versions are read before the value is computed, so the value
+            # is invalid if any tag is invalidated during the computation.
+            tag_versions = await self.atag_versions(tags)
+            result = producer()
+            if inspect.isawaitable(result):
+                result = await result
+            await self.aset(key, result, timeout=timeout, version=version,
+                            tags=tags, tag_versions=tag_versions)
+            return result
+
+        return await asyncio.shield(self.cache._single_flight(('tagged', key), version, compute))
+
+
+tagged_cache = TaggedCache()
+
+
+def model_tag(model):
+    """Returns cache tag of the model class or instance."""
+    if not inspect.isclass(model):
+        model = type(model)
+    return 'model:%s' % getattr(model, '__tablename__', model.__name__)
+
+
+def invalidate_model_tags(sender, changes, **kwargs):
+    """
+    Receiver of ``models_committed`` signal.
+    Invalidates cache tags of all changed models.
+    """
+    tags = {model_tag(target) for target, operation in changes}
+    tagged_cache.invalidate_tags(tags)
+
+
+def connect_model_invalidation():
+    from anthill.framework.db.sqlalchemy import models_committed
+    models_committed.connect(invalidate_model_tags)
@@ -1,6 +1,7 @@
 """JSON-RPC Exceptions."""
 import six
-import json
+
+from anthill.framework.utils import jsonengine
 
 
 class JSONRPCError(object):
@@ -33,8 +34,8 @@ class JSONRPCError(object):
         information, nested errors etc.).
     """
 
-    serialize = staticmethod(json.dumps)
-    deserialize = staticmethod(json.loads)
+    serialize = staticmethod(jsonengine.dumps)
+    deserialize = staticmethod(jsonengine.loads)
 
     def __init__(self, code=None, message=None, data=None):
         self._data = dict()
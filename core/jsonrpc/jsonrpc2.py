@@ -1,5 +1,6 @@
 ﻿import six
-import json
+
+from anthill.framework.utils import jsonengine
 
 from .exceptions import JSONRPCError, JSONRPCInvalidRequestException
 from .base import JSONRPCBaseRequest, JSONRPCBaseResponse
@@ -152,7 +153,7 @@ class JSONRPC20BatchRequest(object):
 
     @property
     def json(self):
-        return json.dumps([r.data for r in self.requests])
+        return jsonengine.dumps([r.data for r in self.requests])
 
     def __iter__(self):
         return iter(self.requests)
@@ -247,7 +248,7 @@ class JSONRPC20BatchResponse(object):
 
     @property
     def json(self):
-        return json.dumps(self.data)
+        return jsonengine.dumps(self.data)
 
     def __iter__(self):
         return iter(self.responses)
@@ -1,6 +1,6 @@
-import json
 import logging
 import inspect
+from anthill.framework.utils import jsonengine
 from .utils import is_invalid_params
 from .exceptions import (
     JSONRPCInvalidParams,
@@ -47,7 +47,7 @@ class JSONRPCResponseManager(object):
             request_str = request_str.decode("utf-8")
 
         try:
-            data = json.loads(request_str)
+            data = jsonengine.loads(request_str)
         except (TypeError, ValueError):
             return JSONRPC20Response(error=JSONRPCParseError()._data)
 
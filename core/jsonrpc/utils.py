@@ -6,12 +6,14 @@ import inspect
 import json
 import six
 
+from anthill.framework.utils import jsonengine
+
 
 class JSONSerializable(six.with_metaclass(ABCMeta, object)):
     """Common functionality for json serializable objects."""
 
-    serialize = staticmethod(json.dumps)
-    deserialize = staticmethod(json.loads)
+    serialize = staticmethod(jsonengine.dumps)
+    deserialize = staticmethod(jsonengine.loads)
 
     @abstractmethod
     def json(self):
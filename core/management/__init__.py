@@ -3,7 +3,8 @@ from .base import Group, Command, Option, InvalidCommand
 from .commands import (
     Server, Shell, Version,
     StartApplication, ApplicationChooser, SendTestEmail,
-    CompileMessages, StartProject, GeoIPMMDBUpdate, DumpData, LoadData
+    CompileMessages, StartProject, GeoIPMMDBUpdate, DumpData, LoadData,
+    CacheBenchmark, ClearSessions
 )
 import argparse
 import os
@@ -426,6 +427,10 @@ class AppManager(BaseManager):
             self.add_command("loaddata", LoadData)
         if "dumpdata" not in self._commands:
             self.add_command("dumpdata", DumpData)
+        if "cache_benchmark" not in self._commands:
+            self.add_command("cache_benchmark", CacheBenchmark)
+        if "clearsessions" not in self._commands:
+            self.add_command("clearsessions", ClearSessions)
 
         super(AppManager, self).add_default_commands()
 
@@ -11,10 +11,13 @@ from .version import Version
 from .mmdbupdate import GeoIPMMDBUpdate
 from .dumpdata import DumpData
 from .loaddata import LoadData
+from .cachebenchmark import CacheBenchmark
+from .clearsessions import ClearSessions
 
 
 __all__ = [
     'ApplicationChooser', 'Clean', 'CompileMessages', 'Server',
     'Shell', 'StartApplication', 'SendTestEmail', 'Version', 'StartProject',
-    'MakeMessages', 'GeoIPMMDBUpdate', 'DumpData', 'LoadData'
+    'MakeMessages', 'GeoIPMMDBUpdate', 'DumpData', 'LoadData', 'CacheBenchmark',
+    'ClearSessions'
 ]
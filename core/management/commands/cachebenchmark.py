@@ -0,0 +1,56 @@
+from anthill.framework.core.management import Command, Option
+from anthill.framework.conf import settings
+
+
+class CacheBenchmark(Command):
+    help = description = (
+        'Benchmark cache serializers and compressors, '
+        'and recommend OPTIONS for each cache alias.')
+
+    option_list = (
+        Option('-a', '--alias', dest='aliases', action='append', default=[],
+               help='Cache alias to make recommendation for (default: all redis aliases).'),
+        Option('-c', '--capture', action='store_true', default=False,
+               help='Sample payloads from live caches instead of synthesized ones.'),
+        Option('-l', '--limit', type=int, default=200,
+               help='Max number of values to sample from each cache.'),
+        Option('-r', '--repeat', type=int, default=20,
+               help='Number of times each value is encoded and decoded.'),
+    )
+
+    def run(self, aliases, capture, limit, repeat):
+        from anthill.framework.core.cache import caches
+        from anthill.framework.core.cache.backends.redis.cache import RedisCache
+        from anthill.framework.testing import benchmarks
+
+        aliases = aliases or list(settings.CACHES)
+        synthesized = None
+
+        for alias in aliases:
+            cache = caches[alias]
+            if not isinstance(cache, RedisCache):
+                self.stdout.write('[%s] skipped, not a redis cache.' % alias)
+                continue
+
+            if capture:
+                payloads = benchmarks.capture_payloads(cache, limit=limit)
+            else:
+                if synthesized is None:
+                    synthesized = benchmarks.synthesize_payloads()
+                payloads = synthesized
+
+            options = settings.CACHES[alias].get('OPTIONS', {})
+            self.stdout.write('[%s]' % alias)
+            results = benchmarks.cache_codecs(
+                payloads, options=options, repeat=repeat, on_error=self.write_codec_error)
+            self.stdout.write(benchmarks.format_report(results))
+            recommended = benchmarks.recommend_options(results)
+            if recommended is None:
+                self.stdout.write('No lossless combination found.')
+            else:
+                self.stdout.write('Recommended OPTIONS: %r' % recommended)
+            self.stdout.write('')
+
+    def write_codec_error(self, payload, serializer, compressor, error):
+        self.stdout.write('%s payload failed with %s serializer and %s compressor: %s' % (
+            payload, serializer, compressor, error))
@@ -0,0 +1,29 @@
+from anthill.framework.core.management import Command, Option
+from anthill.framework.conf import settings
+
+
+class ClearSessions(Command):
+    help = description = (
+        'Remove expired sessions in batches. '
+        'Does nothing for backends with built-in expiration (e.g. cache).')
+
+    option_list = (
+        Option('-b', '--batch-size', dest='batch_size', type=int, default=None,
+               help='Max number of sessions removed at once.'),
+        Option('-d', '--delay', type=float, default=None,
+               help='Delay in seconds between batches.'),
+        Option('-m', '--max-batches', dest='max_batches', type=int, default=None,
+               help='Stop after this number of batches.'),
+    )
+
+    def run(self, batch_size, delay, max_batches):
+        from anthill.framework.sessions.gc import clear_expired_sessions
+
+        try:
+            removed = clear_expired_sessions(batch_size, delay, max_batches)
+        except NotImplementedError:
+            self.stdout.write(
+                "Session engine '%s' doesn't support clearing expired "
+                "sessions." % settings.SESSION_ENGINE)
+        else:
+            self.stdout.write('Expired sessions removed: %s.' % removed)
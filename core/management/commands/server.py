@@ -1,4 +1,4 @@
-from anthill.framework.core.management import Command
+from anthill.framework.core.management import Command, Option
 
 
 class Server(Command):
@@ -7,6 +7,17 @@ class Server(Command):
     """
     help = description = 'Runs the server i.e. app.run().'
 
+    option_list = (
+        Option('-p', '--processes', dest='processes', type=int, default=None,
+               help='Number of worker processes to fork '
+                    '(0 means one per CPU core, default is settings.SERVER_PROCESSES).'),
+        Option('--max-restarts', dest='max_restarts', type=int, default=None,
+               help='Maximum number of worker respawns '
+                    '(default is settings.SERVER_MAX_RESTARTS).'),
+        Option('--reuse-port', dest='reuse_port', action='store_true', default=None,
+               help='Bind a separate SO_REUSEPORT socket in every worker.'),
+    )
+
     def __call__(self, app=None, *args, **kwargs):
         app.run(**kwargs)
 
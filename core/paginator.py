@@ -79,6 +79,12 @@ class Paginator:
     @cached_property
     def count(self):
         """Return the total number of objects, across all pages."""
+        try:
+            # Ordering is useless for counting, so drop it
+            # if object_list is an sqlalchemy query.
+            return self.object_list.order_by(None).count()
+        except AttributeError:
+            pass
         try:
             return self.object_list.count()
         except (AttributeError, TypeError):
@@ -3,16 +3,116 @@ from anthill.framework.utils.module_loading import import_string
 from tornado.web import Application as TornadoWebApplication
 from tornado.ioloop import IOLoop
 from tornado.httpserver import HTTPServer
-from tornado.netutil import bind_unix_socket
+from tornado.netutil import bind_unix_socket, bind_sockets
+from tornado.process import cpu_count
+import asyncio
+import binascii
+import random
 import signal
 import logging
+import gc
+import os
 import sys
 
 logger = logging.getLogger('anthill.application')
 
 
+class WorkerSupervisor:
+    """
+    Forks ``num_processes`` worker processes and supervises them.
+
+    Workers exited with a non-zero status or killed by a signal are
+    respawned, up to ``max_restarts`` times in total. Termination signals
+    received by the supervisor are forwarded to the workers.
+    """
+    stop_signals = ('SIGTERM', 'SIGHUP', 'SIGINT')
+
+    def __init__(self, num_processes=None, max_restarts=100):
+        if not num_processes or num_processes <= 0:
+            num_processes = cpu_count()
+        self.num_processes = num_processes
+        self.max_restarts = max_restarts
+        self.children = {}
+        self.stopping = False
+
+    def __repr__(self):
+        return '<%s: %s processes>' % (self.__class__.__name__, self.num_processes)
+
+    # noinspection PyMethodMayBeStatic
+    def setup_child(self):
+        for s in self.stop_signals:
+            signal.signal(getattr(signal, s), signal.SIG_DFL)
+        # Each worker must not share random sequence with the others.
+        random.seed(int(binascii.hexlify(os.urandom(16)), 16))
+
+    def start_child(self, worker_id):
+        pid = os.fork()
+        if pid == 0:
+            self.setup_child()
+            return worker_id
+        self.children[pid] = worker_id
+        logger.debug('Worker %s started (pid %s).', worker_id, pid)
+        return None
+
+    def __sig_handler__(self, sig, frame):
+        logger.warning('Supervisor caught signal: %s', sig)
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        """
+        Start worker processes.
+
+        Returns worker id in each worker process.
+        Never returns in the supervisor process.
+        """
+        logger.info('Starting %s worker processes.', self.num_processes)
+        for i in range(self.num_processes):
+            worker_id = self.start_child(i)
+            if worker_id is not None:
+                return worker_id
+
+        for s in self.stop_signals:
+            signal.signal(getattr(signal, s), self.__sig_handler__)
+
+        num_restarts = 0
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            worker_id = self.children.pop(pid, None)
+            if worker_id is None:
+                continue
+            if self.stopping:
+                continue
+            if os.WIFSIGNALED(status):
+                logger.warning('Worker %s (pid %s) killed by signal %s, restarting.',
+                               worker_id, pid, os.WTERMSIG(status))
+            elif os.WEXITSTATUS(status) != 0:
+                logger.warning('Worker %s (pid %s) exited with status %s, restarting.',
+                               worker_id, pid, os.WEXITSTATUS(status))
+            else:
+                logger.info('Worker %s (pid %s) exited normally.', worker_id, pid)
+                continue
+            num_restarts += 1
+            if num_restarts > self.max_restarts:
+                raise RuntimeError('Too many worker restarts, giving up.')
+            new_worker_id = self.start_child(worker_id)
+            if new_worker_id is not None:
+                return new_worker_id
+
+        logger.info('All workers stopped.')
+        sys.exit(0)
+
+
 class BaseService(TornadoWebApplication):
     server_class = HTTPServer
+    supervisor_class = WorkerSupervisor
 
     def __init__(self, handlers=None, default_host=None, transforms=None, app=None, **kwargs):
         kwargs.update(debug=app.debug)
@@ -35,6 +135,7 @@ class BaseService(TornadoWebApplication):
         self.db = app.db
         self.version = app.version
         self.debug = app.debug
+        self.worker_id = None
 
         self.setup()
 
@@ -61,6 +162,10 @@ class BaseService(TornadoWebApplication):
             self.settings.update(default_handler_class=import_string(default_handler_class))
             self.settings.update(default_handler_args=self.config.DEFAULT_HANDLER_ARGS)
 
+        # Import and classify context processors once, before serving requests.
+        from anthill.framework.context_processors import get_context_processors
+        get_context_processors()
+
         # template_loader_class = getattr(
         #     self.app.settings, 'TEMPLATE_LOADER_CLASS', 'anthill.framework.core.template.Loader')
         # template_loader_kwargs = dict()
@@ -140,18 +245,95 @@ class BaseService(TornadoWebApplication):
 
         return kwargs
 
-    def setup_server(self, **kwargs):
+    def bind_sockets(self, reuse_port=False):
         if self.config.UNIX_SOCKET is not None:
-            socket = bind_unix_socket(self.config.UNIX_SOCKET)
-            self.server.add_socket(socket)
+            return [bind_unix_socket(self.config.UNIX_SOCKET)]
+        return bind_sockets(self.app.port, self.app.host, reuse_port=reuse_port)
+
+    def get_server_processes(self, **kwargs):
+        processes = kwargs.get('processes')
+        if processes is None:
+            processes = getattr(self.config, 'SERVER_PROCESSES', 1)
+        if processes is None or processes <= 0:
+            processes = cpu_count()
+        return processes
+
+    # noinspection PyMethodMayBeStatic
+    def freeze_memory(self):
+        """
+        Move all objects created during application setup
+        into a permanent generation, so forked workers
+        never touch them and share memory pages with the parent.
+        """
+        if hasattr(gc, 'freeze'):  # Python 3.7+
+            gc.collect()
+            gc.freeze()
+            logger.debug('Objects frozen: %s.', gc.get_freeze_count())
+
+    def setup_worker(self, worker_id):
+        """
+        Called in every forked worker process before it starts serving.
+        Replaces event loop and database connections inherited from the parent.
+        """
+        self.worker_id = worker_id
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        self.io_loop = IOLoop.current()
+        self.io_loop.handle_callback_exception = self.__io_loop_handle_callback_exception__
+        try:
+            from anthill.framework.db.sqlalchemy import get_state
+            for connector in get_state(self.app).connectors.values():
+                if connector._engine is not None:
+                    connector._engine.dispose()
+        except Exception as e:
+            logger.warning('Cannot dispose inherited database connections: %s', e)
+        logger.debug('Worker %s (pid %s) set up.', worker_id, os.getpid())
+
+    def setup_server(self, **kwargs):
+        processes = self.get_server_processes(**kwargs)
+        reuse_port = kwargs.get('reuse_port')
+        if reuse_port is None:
+            reuse_port = getattr(self.config, 'SERVER_REUSE_PORT', False)
+        reuse_port = reuse_port and self.config.UNIX_SOCKET is None
+
+        if processes > 1:
+            # With SO_REUSEPORT every worker binds its own socket and the kernel
+            # balances connections between them, otherwise sockets are bound
+            # once and inherited by the workers.
+            sockets = None if reuse_port else self.bind_sockets()
+            self.freeze_memory()
+            max_restarts = kwargs.get('max_restarts')
+            if max_restarts is None:
+                max_restarts = getattr(self.config, 'SERVER_MAX_RESTARTS', 100)
+            supervisor = self.supervisor_class(processes, max_restarts)
+            worker_id = supervisor.run()
+            self.setup_worker(worker_id)
+            if sockets is None:
+                sockets = self.bind_sockets(reuse_port=True)
         else:
-            self.server.listen(self.app.port, self.app.host)
+            sockets = self.bind_sockets(reuse_port=reuse_port)
+
+        self.server.add_sockets(sockets)
         for s in ('SIGTERM', 'SIGHUP', 'SIGINT'):
             signal.signal(getattr(signal, s), self.__sig_handler__)
 
+    def setup_session_gc(self):
+        """
+        Start periodic removal of expired sessions, if SESSION_GC_INTERVAL
+        is set. Only the first worker does it.
+        """
+        self.session_gc = None
+        if self.worker_id not in (None, 0):
+            return
+        if not getattr(self.config, 'SESSION_GC_INTERVAL', None):
+            return
+        from anthill.framework.sessions.gc import SessionGC
+        self.session_gc = SessionGC(interval=self.config.SESSION_GC_INTERVAL)
+        self.session_gc.start()
+
     def start(self, **kwargs):
         """Start server."""
         self.setup_server(**kwargs)
+        self.setup_session_gc()
         self.io_loop.add_callback(self.on_start)
         self.io_loop.start()
 
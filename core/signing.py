@@ -35,13 +35,12 @@ These functions make use of all of them.
 
 import base64
 import datetime
-import json
 import re
 import time
 import zlib
 
 from anthill.framework.conf import settings
-from anthill.framework.utils import baseconv
+from anthill.framework.utils import baseconv, jsonengine
 from anthill.framework.utils.crypto import constant_time_compare, salted_hmac
 from anthill.framework.utils.encoding import force_bytes
 from anthill.framework.utils.module_loading import import_string
@@ -84,10 +83,10 @@ class JSONSerializer:
     """
 
     def dumps(self, obj):
-        return json.dumps(obj, separators=(',', ':')).encode('latin-1')
+        return jsonengine.dumpb(obj)
 
     def loads(self, data):
-        return json.loads(data.decode('latin-1'))
+        return jsonengine.loads(data)
 
 
 def dumps(obj, key=None, salt='anthill.framework.core.signing', serializer=JSONSerializer, compress=False):
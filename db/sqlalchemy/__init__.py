@@ -27,10 +27,16 @@ from anthill.framework.http import Http404
 
 from anthill.framework.apps.builder import app
 from anthill.framework.core.signals import Namespace
+from anthill.framework.utils.scoping import new_scope
 
 from .model import Model
 from six import string_types
 from .model import DefaultMeta
+from .keyset import (
+    KeysetPagination, InvalidCursor, NEXT, PREV,
+    decode_cursor, get_keyset_columns, keyset_criterion
+)
+from tornado.escape import to_unicode
 import logging
 
 logger = logging.getLogger('anthill.application')
@@ -434,6 +440,85 @@ class BaseQuery(orm.Query):
 
         return Pagination(self, page, per_page, total, items)
 
+    def keyset_paginate(self, request=None, cursor=None, per_page=None, columns=None,
+                        descending=False, error_out=True, max_per_page=None):
+        """
+        Returns ``per_page`` items following (or preceding) the position
+        pointed by ``cursor``, using keyset pagination: rows are ordered by
+        ``columns`` (primary key by default) and selected with a ``WHERE``
+        clause instead of ``OFFSET``, so deep pages cost the same as the first one.
+        Any existing ordering of the query is replaced.
+
+        If ``cursor`` or ``per_page`` are ``None``, they will be retrieved from
+        the request query. If ``max_per_page`` is specified, ``per_page`` will
+        be limited to that value. ``per_page`` defaults to 20.
+
+        When ``error_out`` is ``True`` (default), invalid cursor or
+        ``per_page`` cause a 404 response, otherwise the first page
+        is returned with default ``per_page``.
+
+        Returns a :class:`KeysetPagination` object.
+        """
+
+        if request:
+            if cursor is None:
+                cursor = request.arguments.get('cursor', [None])[0]
+                if cursor is not None:
+                    cursor = to_unicode(cursor)
+
+            if per_page is None:
+                try:
+                    per_page = int(request.arguments.get('per_page', [20])[0])
+                except (TypeError, ValueError, IndexError):
+                    if error_out:
+                        raise Http404
+                    per_page = 20
+
+        if per_page is None:
+            per_page = 20
+
+        if max_per_page is not None:
+            per_page = min(per_page, max_per_page)
+
+        if per_page < 1:
+            if error_out:
+                raise Http404
+            else:
+                per_page = 20
+
+        columns = get_keyset_columns(self, columns)
+
+        direction, values = NEXT, None
+        if cursor:
+            try:
+                direction, values = decode_cursor(cursor)
+            except InvalidCursor:
+                if error_out:
+                    raise Http404
+                cursor = None
+
+        backward = direction == PREV
+        reverse = descending != backward
+
+        query = self.order_by(None)
+        if values is not None:
+            query = query.filter(keyset_criterion(columns, values, descending=reverse))
+        query = query.order_by(*[c.desc() if reverse else c.asc() for c in columns])
+
+        # One extra row tells if there are more items in that direction.
+        items = query.limit(per_page + 1).all()
+        has_more = len(items) > per_page
+        items = items[:per_page]
+
+        if backward:
+            items.reverse()
+            has_prev, has_next = has_more, True
+        else:
+            has_prev, has_next = values is not None, has_more
+
+        return KeysetPagination(self, columns, per_page, items, cursor,
+                                has_next=has_next, has_prev=has_prev)
+
 
 class _QueryProperty:
     def __init__(self, sa):
@@ -606,10 +691,11 @@ class SQLAlchemy:
         on the factory from :meth:`create_session`.
 
         An extra key ``'scopefunc'`` can be set on the ``options`` dict to
-        specify a custom scope function.  If it's not provided, Flask's app
-        context stack identity is used. This will ensure that sessions are
-        created and removed with the request/response cycle, and should be fine
-        in most cases.
+        specify a custom scope function.  If it's not provided, application
+        scope identity is used, i.e. one scope per request, websocket message
+        or background task (see :mod:`anthill.framework.utils.scoping`).
+        This will ensure that sessions are created and removed with
+        the request/response cycle, and should be fine in most cases.
 
         :param options: dict of keyword arguments passed to session class  in
         ``create_session``
@@ -694,13 +780,40 @@ class SQLAlchemy:
         app.extensions['sqlalchemy'] = _SQLAlchemyState(self)
         logger.debug('SQLAlchemy ext installed.')
 
-        def shutdown_session(response_or_exc):
-            if getattr(app.config, 'SQLALCHEMY_COMMIT_ON_TEARDOWN', None):
-                if response_or_exc is None:
-                    self.session.commit()
+    def shutdown_session(self, commit=True):
+        """
+        Removes the session of the current scope. If ``commit`` is true and
+        ``SQLALCHEMY_COMMIT_ON_TEARDOWN`` is set, commits it before.
 
+        Called by request handlers when request is finished.
+        Does nothing if no session was used within the current scope.
+        """
+        if not self.session.registry.has():
+            return
+        try:
+            if commit and getattr(self.get_app().config, 'SQLALCHEMY_COMMIT_ON_TEARDOWN', None):
+                self.session.commit()
+        finally:
             self.session.remove()
-            return response_or_exc
+
+    def scoped(self, func):
+        """
+        Decorator for coroutine functions running outside of request
+        handlers, e.g. background tasks. Every call gets its own session,
+        removed when the call is done.
+        """
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with new_scope():
+                try:
+                    result = await func(*args, **kwargs)
+                except BaseException:
+                    self.shutdown_session(commit=False)
+                    raise
+                self.shutdown_session()
+                return result
+
+        return wrapper
 
     def apply_pool_defaults(self, app, options):
         def _setdefault(optionkey, configkey):
@@ -7,7 +7,9 @@ __all__ = ['ActiveRecordMixin', 'json_value']
 
 import datetime as dt
 from functools import wraps
+from sqlalchemy import event, types
 from sqlalchemy.orm import RelationshipProperty, object_mapper, class_mapper, defer, eagerload
+from anthill.framework.utils.serializer import compile_serializer, get_model_serializer
 
 
 def _get_mapper(obj):
@@ -19,6 +21,8 @@ def _get_mapper(obj):
 
 __CACHE = {}
 
+EMPTY = tuple()
+
 
 def _memoize(f):
     @wraps(f)
@@ -62,9 +66,6 @@ def _get_relations(model):
 
 def _model_to_dict(models, *fields, **props):
     """Serialize an ActiveRecord object to a JSON dict."""
-    result = []
-    fields = list(fields)
-
     has_many = isinstance(models, list)
 
     # terminate early if there is nothing to work on
@@ -79,69 +80,122 @@ def _model_to_dict(models, *fields, **props):
 
     # pop of meta information
     # _overwrite = props.pop('_overwrite', None)
-    _exclude = props.pop('_exclude', [])
+    _exclude = props.pop('_exclude', ())
     if isinstance(_exclude, str):
         _exclude = [e.strip() for e in _exclude.split(',')]
 
+    serializer = _get_serializer(models[0].__class__, tuple(fields), tuple(_exclude))
+
+    # no fields to return
+    if serializer is None:
+        return {}
+
+    if not props:
+        result = [serializer(model) for model in models]
+    else:
+        result = []
+        for model in models:
+            data = serializer(model)
+            # handle extra properties
+            for k in props:
+                data[k] = props[k]
+                if callable(data[k]):
+                    data[k] = data[k](model)
+            result.append(data)
+
+    return result if has_many else result[0]
+
+
+def _get_serializer(model, fields=(), exclude=()):
+    """
+    Returns serializer of the model instances for given fields,
+    compiled once and cached on the model class.
+    """
+    serializers = model.__dict__.get('__serializers__')
+    if serializers is None:
+        serializers = {}
+        setattr(model, '__serializers__', serializers)
+    key = (fields, exclude)
+    try:
+        return serializers[key]
+    except KeyError:
+        serializer = serializers[key] = _compile_serializer(model, fields, exclude)
+        return serializer
+
+
+def _compile_serializer(model, fields, exclude):
+    """
+    Compiles function turning the model instance into dict in one pass,
+    with selected columns and relationships.
+    Returns None if there are no fields to return.
+    """
+    fields = set(fields)
+
     # select columns given or all if non was specified
-    model_attr = set(_get_columns(models[0]))
-    if not model_attr & set(fields):
-        fields = model_attr | set(fields)
+    columns = _get_columns(model)
+    model_attr = set(columns)
+    if not model_attr & fields:
+        fields = model_attr | fields
 
     # correctly filter relation attributes and column attributes
-    related_attr = set(fields) - model_attr
-    model_attr = set(fields) - (set(_exclude) | related_attr)
+    related_attr = fields - model_attr
+    model_attr = fields - (set(exclude) | related_attr)
 
     # check if there are relationships
-    related_fields = _get_relations(models[0])
+    related_fields = _get_relations(model)
     related_map = {}
     # check if remaining fields are valid related attributes
-    for k in related_attr:
+    for k in sorted(related_attr):
         if '.' in k:
-            index = k.index('.')
-            model, attr = k[:index], k[index + 1:]
-            if model in related_fields:
-                related_map[model] = related_map.get(model, [])
-            related_map[model].append(attr)
+            rel, attr = k.split('.', 1)
+            if rel in related_fields:
+                related_map.setdefault(rel, []).append(attr)
         elif k in related_fields:
-            related_map[k] = []
+            related_map.setdefault(k, [])
 
     # no fields to return
     if not model_attr and not related_map:
-        return {}
+        return None
 
-    for key in _get_primary_keys(models[0]):
-        model_attr.add(key)
+    model_attr.update(_get_primary_keys(model))
+    model_attr -= set(model.__attribute_filters__.get('hidden', EMPTY))
 
-    for model in models:
-        data = {}
+    mapper = _get_mapper(model)
+    serializer_fields = [(k, k, _get_converter(mapper.columns[k]))
+                         for k in columns if k in model_attr]
+    for k, attrs in related_map.items():
+        serializer_fields.append((k, k, _make_related_converter(attrs)))
 
-        hidden_attributes = model.__attribute_filters__.get('hidden', EMPTY)
+    return compile_serializer(serializer_fields, name='serialize_%s' % model.__name__)
+
+
+# Column types with values serializable as is.
+_NATIVE_TYPES = (types.Integer, types.Float, types.String, types.Boolean)
+# Column types with values converted to isoformat.
+_DATETIME_TYPES = (types.DateTime, types.Date, types.Time)
 
-        # handle column attributes
-        for k in model_attr:
-            if k in hidden_attributes:
-                continue
-            v = getattr(model, k)
-            # change dates to human readable format
-            data[k] = json_value(v)
 
-        # handle relationships
-        for k in related_map:
-            val = getattr(model, k)
-            fields = related_map[k]
-            data[k] = _model_to_dict(val, *fields)
+def _isoformat(value):
+    return value if value is None else value.isoformat()
 
-        # handle extra properties
-        for k in props:
-            data[k] = props[k]
-            if callable(data[k]):
-                data[k] = data[k](model)
 
-        result.append(data)
+def _get_converter(column):
+    """Returns function converting value of the column to JSON type, or None."""
+    column_type = column.type
+    if isinstance(column_type, types.TypeDecorator):
+        return json_value
+    if isinstance(column_type, _NATIVE_TYPES) and not isinstance(column_type, types.Enum):
+        if not isinstance(column_type, types.Numeric) or not column_type.asdecimal:
+            return None
+    elif isinstance(column_type, _DATETIME_TYPES):
+        return _isoformat
+    return json_value
 
-    result = result if has_many else result[0]
-    return result
+
+def _make_related_converter(fields):
+    def convert(value):
+        return _model_to_dict(value, *fields)
+    return convert
 
 
 def json_value(value):
@@ -416,9 +470,6 @@ class _QueryHelper:
                 offset += batch_size
 
 
-EMPTY = tuple()
-
-
 class ActiveRecordMixin:
     """A implementation of the `ActiveRecord` pattern for Anthill SQLAlchemy models."""
 
@@ -563,3 +614,10 @@ class ActiveRecordMixin:
     @classmethod
     def where(cls, *criteria, **filters):
         return _QueryHelper(cls).where(*criteria, **filters)
+
+
+@event.listens_for(ActiveRecordMixin, 'mapper_configured', propagate=True)
+def _compile_default_serializer(mapper, cls):
+    """Compiles default serializers when the model mapper is configured."""
+    _get_serializer(cls)
+    get_model_serializer(cls)
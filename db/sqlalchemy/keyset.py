@@ -0,0 +1,181 @@
+"""
+Keyset (seek) pagination helpers.
+
+Instead of ``OFFSET`` the next page is selected with a ``WHERE`` clause
+on an indexed column tuple, starting right after the last row of the
+previous page. So any page costs the same as the first one.
+
+Position in the result set is passed to clients as an opaque
+signed cursor token (see :mod:`anthill.framework.core.signing`).
+"""
+from anthill.framework.core import signing
+from anthill.framework.utils import jsonengine
+from sqlalchemy import and_, or_, inspect
+import datetime
+import decimal
+import uuid
+
+__all__ = [
+    'KeysetPagination', 'InvalidCursor', 'encode_cursor', 'decode_cursor',
+    'get_keyset_columns', 'keyset_criterion'
+]
+
+CURSOR_SALT = 'anthill.framework.db.sqlalchemy.keyset'
+
+NEXT = 'n'
+PREV = 'p'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorSerializer:
+    """
+    JSON serializer for cursor values, keeping types of
+    date/time, decimal and uuid values.
+    """
+
+    @staticmethod
+    def _encode_value(value):
+        if isinstance(value, datetime.datetime):
+            offset = value.utcoffset()
+            return {'$dt': [
+                value.year, value.month, value.day, value.hour, value.minute,
+                value.second, value.microsecond,
+                None if offset is None else offset.total_seconds()
+            ]}
+        if isinstance(value, datetime.date):
+            return {'$d': [value.year, value.month, value.day]}
+        if isinstance(value, datetime.time):
+            return {'$t': [value.hour, value.minute, value.second, value.microsecond]}
+        if isinstance(value, decimal.Decimal):
+            return {'$dec': str(value)}
+        if isinstance(value, uuid.UUID):
+            return {'$uuid': value.hex}
+        return value
+
+    @staticmethod
+    def _decode_value(value):
+        if not isinstance(value, dict):
+            return value
+        if '$dt' in value:
+            *parts, offset = value['$dt']
+            tzinfo = None
+            if offset is not None:
+                tzinfo = datetime.timezone(datetime.timedelta(seconds=offset))
+            return datetime.datetime(*parts, tzinfo=tzinfo)
+        if '$d' in value:
+            return datetime.date(*value['$d'])
+        if '$t' in value:
+            return datetime.time(*value['$t'])
+        if '$dec' in value:
+            return decimal.Decimal(value['$dec'])
+        if '$uuid' in value:
+            return uuid.UUID(value['$uuid'])
+        raise ValueError('Unknown cursor value: %r' % value)
+
+    def dumps(self, obj):
+        direction, values = obj
+        obj = [direction, [self._encode_value(v) for v in values]]
+        return jsonengine.dumpb(obj)
+
+    def loads(self, data):
+        direction, values = jsonengine.loads(data)
+        return direction, [self._decode_value(v) for v in values]
+
+
+def encode_cursor(values, direction=NEXT, salt=CURSOR_SALT):
+    """Returns signed cursor token pointing to the row with given key ``values``."""
+    return signing.dumps((direction, list(values)), salt=salt, serializer=CursorSerializer)
+
+
+def decode_cursor(token, salt=CURSOR_SALT, max_age=None):
+    """
+    Reverse of encode_cursor(). Returns ``(direction, values)`` tuple.
+    Raises ``InvalidCursor`` if token is malformed or tampered.
+    """
+    try:
+        direction, values = signing.loads(
+            token, salt=salt, serializer=CursorSerializer, max_age=max_age)
+    except (signing.BadSignature, ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor: %s' % token)
+    if direction not in (NEXT, PREV):
+        raise InvalidCursor('Invalid cursor direction: %s' % direction)
+    return direction, values
+
+
+def get_keyset_columns(query, columns=None):
+    """
+    Returns list of mapped attributes to paginate ``query`` by.
+
+    ``columns`` may contain attribute names or mapped attributes.
+    If not set, primary key of the first query entity is used.
+    The columns must identify a row uniquely, so add primary key to
+    non unique columns, and should be covered by an index.
+    """
+    entity = query.column_descriptions[0]['entity']
+    if not columns:
+        mapper = inspect(entity)
+        columns = [mapper.get_property_by_column(c).key for c in mapper.primary_key]
+    return [getattr(entity, c) if isinstance(c, str) else c for c in columns]
+
+
+def keyset_criterion(columns, values, descending=False):
+    """
+    Returns criterion selecting rows placed after the row with key ``values``,
+    i.e. ``(a > x) OR (a = x AND b > y) OR ...``.
+    This form is portable across databases, unlike row value comparison.
+    """
+    if len(columns) != len(values):
+        raise InvalidCursor('Cursor does not match keyset columns')
+    clauses = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        equals = [c == v for c, v in zip(columns[:i], values[:i])]
+        after = column < value if descending else column > value
+        clauses.append(and_(*equals, after))
+    return or_(*clauses)
+
+
+class KeysetPagination:
+    """
+    Helper class returned by :meth:`BaseQuery.keyset_paginate`.
+    Holds items of the current page and cursors of adjacent pages.
+    """
+
+    def __init__(self, query, columns, per_page, items, cursor=None,
+                 has_next=False, has_prev=False, salt=CURSOR_SALT):
+        #: the unlimited query object that was used to create this
+        #: pagination object.
+        self.query = query
+        #: keyset columns.
+        self.columns = columns
+        #: the number of items to be displayed on a page.
+        self.per_page = per_page
+        #: the items for the current page
+        self.items = items
+        #: cursor used to get the current page.
+        self.cursor = cursor
+        self.has_next = has_next
+        self.has_prev = has_prev
+        self.salt = salt
+
+    def __repr__(self):
+        return '<%s: %s items>' % (self.__class__.__name__, len(self.items))
+
+    def _key(self, item):
+        return [getattr(item, c.key) for c in self.columns]
+
+    @property
+    def next_cursor(self):
+        """Cursor of the next page or ``None``."""
+        if not self.has_next or not self.items:
+            return None
+        return encode_cursor(self._key(self.items[-1]), NEXT, salt=self.salt)
+
+    @property
+    def prev_cursor(self):
+        """Cursor of the previous page or ``None``."""
+        if not self.has_prev or not self.items:
+            return None
+        return encode_cursor(self._key(self.items[0]), PREV, salt=self.salt)
@@ -12,8 +12,11 @@ from anthill.framework.utils.translation import default_locale
 from anthill.framework.utils.module_loading import import_string
 from anthill.framework.utils.urls import build_absolute_uri
 from anthill.framework.utils.serializer import AlchemyJSONEncoder
+from anthill.framework.utils import jsonengine
 from anthill.framework.http import HttpGoneError, Http404, HttpServerError
 from anthill.framework.utils.crypto import constant_time_compare
+from anthill.framework.utils.scoping import get_scope_ident, use_scope, run_in_new_scope
+from anthill.framework.apps.cls import ApplicationExtensionNotRegistered
 from anthill.framework.auth import (
     _get_user_session_key,
     _get_backends,
@@ -26,9 +29,12 @@ from anthill.framework.auth import (
 from anthill.framework.auth.models import AnonymousUser
 from anthill.framework.auth.log import get_user_logger, ApplicationLogger
 from anthill.framework.conf import settings
-from tornado import httputil
+from tornado import httputil, gen
+from tornado.concurrent import Future
+from tornado.log import app_log
 from typing import Any
-import json
+import functools
+import asyncio
 import logging
 import os
 
@@ -79,13 +85,79 @@ class CommonRequestHandlerMixin:
         return self.request.protocol in ('https',)
 
 
+class DatabaseSessionHandlerMixin:
+    """
+    Runs every request in its own database session scope,
+    so concurrent requests never share one session and transaction.
+    """
+    db_scope = None
+
+    def _execute(self, transforms, *args, **kwargs):
+        return run_in_new_scope(self._execute_in_db_scope, transforms, *args, **kwargs)
+
+    def _execute_in_db_scope(self, transforms, *args, **kwargs):
+        self.db_scope = get_scope_ident()
+        return self.call_in_db_scope(self._execute_request, transforms, *args, **kwargs)
+
+    def _execute_request(self, transforms, *args, **kwargs):
+        """Executes the request within its database session scope."""
+        # noinspection PyUnresolvedReferences
+        return super()._execute(transforms, *args, **kwargs)
+
+    def call_in_db_scope(self, func, *args, **kwargs):
+        """
+        Calls ``func`` and removes database session of the current scope
+        as soon as the result is ready. Session is committed only if the call
+        succeeded and ``SQLALCHEMY_COMMIT_ON_TEARDOWN`` is set.
+        """
+        scope = get_scope_ident()
+
+        def shutdown(future=None, commit=False):
+            if future is not None:
+                commit = not future.cancelled() and future.exception() is None
+            with use_scope(scope):
+                self.shutdown_db_session(commit=commit)
+
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            shutdown()
+            raise
+        if result is None:
+            shutdown(commit=True)
+            return
+        future = gen.convert_yielded(result)
+        future.add_done_callback(shutdown)
+        return future
+
+    def shutdown_db_session(self, commit=True):
+        try:
+            # noinspection PyUnresolvedReferences
+            db = self.db
+        except ApplicationExtensionNotRegistered:
+            return
+        db.shutdown_session(commit=commit)
+
+
 class UserHandlerMixin:
+    """
+    The current user is resolved lazily, on first
+    `await self.aget_current_user()`, so handlers never touching it skip
+    the session store and the database. Until then synchronous
+    `current_user` is None for requests with the session cookie
+    (including templates, `user_logger` and `app_logger`).
+    Set `preload_user = True` for handlers using it synchronously.
+    """
+    # Resolve the user in prepare() if request has the session cookie.
+    preload_user = False
+
     async def get_user(self):
         """
         Return the user model instance associated with the given session.
         If no user is retrieved, return an instance of `AnonymousUser`.
         """
         user = None
+        await self.aget_session()
         try:
             user_id = _get_user_session_key(self)
             backend_path = self.session[BACKEND_SESSION_KEY]
@@ -103,24 +175,54 @@ class UserHandlerMixin:
                         user.get_session_auth_hash()
                     )
                     if not session_hash_verified:
-                        self.session.flush()
+                        await self.session.aflush()
                         user = None
 
         return user or AnonymousUser()
 
-    # noinspection PyAttributeOutsideInit
+    def get_current_user(self):
+        """
+        Called on first access of `current_user`, if it is not resolved yet.
+        Requests without session cookie are anonymous, so neither session
+        store nor database is touched for them. Otherwise user can not be
+        resolved synchronously and None is returned,
+        use `await self.aget_current_user()` or `preload_user`.
+        """
+        if not self.has_session_cookie():
+            return AnonymousUser()
+
+    async def aget_current_user(self):
+        """Resolve the current user once per request and return it."""
+        if getattr(self, '_current_user', None) is None:
+            if self.has_session_cookie():
+                self.current_user = await self.get_user()
+            else:
+                self.current_user = self.get_current_user()
+        return self.current_user
+
+    @property
+    def user_logger(self):
+        """Logger of the current user, resolve it before."""
+        return get_user_logger(self.current_user)
+
+    @property
+    def app_logger(self):
+        """Application logger of the current user, resolve it before."""
+        return ApplicationLogger(self.current_user)
+
     async def prepare(self):
-        # super().prepare()
-        self.current_user = await self.get_user()
-        self.user_logger = get_user_logger(self.current_user)
-        self.app_logger = ApplicationLogger(self.current_user)
+        if self.preload_user and self.has_session_cookie():
+            await self.aget_current_user()
 
 
 class RequestHandler(TranslationHandlerMixin, LogExceptionHandlerMixin, UserHandlerMixin,
-                     SessionHandlerMixin, CommonRequestHandlerMixin, BaseRequestHandler):
+                     SessionHandlerMixin, CommonRequestHandlerMixin, DatabaseSessionHandlerMixin,
+                     BaseRequestHandler):
     def __init__(self, application, request, **kwargs):
         super().__init__(application, request, **kwargs)
         self.init_session()
+        self._session_updated = False
+        self._finish_future = None
 
     def get_content_type(self):
         content_type = self.request.headers.get('Content-Type', 'text/plain')
@@ -131,13 +233,6 @@ class RequestHandler(TranslationHandlerMixin, LogExceptionHandlerMixin, UserHand
         url = super().reverse_url(name, *args)
         return url.rstrip('?')
 
-    def get_current_user(self):
-        """
-        Override to determine the current user from, e.g., a cookie.
-        This method may not be a coroutine.
-        """
-        return None
-
     def data_received(self, chunk):
         """
         Implement this method to handle streamed request data.
@@ -149,16 +244,86 @@ class RequestHandler(TranslationHandlerMixin, LogExceptionHandlerMixin, UserHand
 
     async def prepare(self):
         """Called at the beginning of a request before  `get`/`post`/etc."""
-        self.setup_session()
         await super().prepare()
 
+    async def _execute_request(self, transforms, *args, **kwargs):
+        # Response is finished here instead of tornado,
+        # so the session is saved asynchronously before.
+        self._auto_finish = False
+        await super()._execute_request(transforms, *args, **kwargs)
+        if not self._finished and self._finish_future is None:
+            await self._afinish_with_session(self.finish)
+        # Wait for responses finished by not awaited render(), redirect(), etc.
+        while self._finish_future is not None:
+            future, self._finish_future = self._finish_future, None
+            await future
+
+    async def asave_session(self):
+        """
+        Saves the session asynchronously.
+        Later changes of the session are not saved.
+        """
+        if not self._session_updated:
+            self._session_updated = True
+            await self.aupdate_session()
+
+    async def _afinish_with_session(self, finish, *args, **kwargs):
+        try:
+            await self.asave_session()
+            finish(*args, **kwargs)
+        except Exception as e:
+            try:
+                self._handle_request_exception(e)
+            except Exception:
+                app_log.error("Exception in exception handler", exc_info=True)
+
+    def _finish_with_session(self, finish, *args, **kwargs):
+        """
+        Calls ``finish`` once the session is saved asynchronously.
+        Returns future, that may be awaited. The request waits for it anyway.
+        """
+        if self._session_updated:
+            finish(*args, **kwargs)
+            future = Future()
+            future.set_result(None)
+            return future
+        self._finish_future = asyncio.ensure_future(
+            self._afinish_with_session(finish, *args, **kwargs))
+        return self._finish_future
+
+    def render(self, template_name, **kwargs):
+        """
+        Renders the template as the response, once the session is saved.
+        Returns future, that may be awaited.
+        """
+        return self._finish_with_session(super().render, template_name, **kwargs)
+
+    def redirect(self, url, permanent=False, status=None):
+        """
+        Sends a redirect to the given URL, once the session is saved.
+        Returns future, that may be awaited.
+        """
+        return self._finish_with_session(super().redirect, url, permanent=permanent, status=status)
+
+    def send_error(self, status_code=500, **kwargs):
+        """Sends the given HTTP error code, once the session is saved."""
+        return self._finish_with_session(super().send_error, status_code, **kwargs)
+
     def finish(self, chunk=None):
-        """Finishes this response, ending the HTTP request."""
-        self.update_session()
-        super().finish(chunk)
+        """
+        Finishes this response, ending the HTTP request.
+        Saves the session synchronously, if it is not saved yet,
+        so await `asave_session()` before calling it directly.
+        """
+        if not self._session_updated:
+            self._session_updated = True
+            self.update_session()
+        return super().finish(chunk)
 
     def on_finish(self):
         """Called after the end of a request."""
+        with use_scope(self.db_scope):
+            self.shutdown_db_session(commit=self.get_status() < 500)
 
     def set_default_headers(self):
         """
@@ -202,7 +367,8 @@ class InMemoryClientsWatcher(BaseClientsWatcher):
 
 
 class WebSocketHandler(TranslationHandlerMixin, LogExceptionHandlerMixin, UserHandlerMixin,
-                       SessionHandlerMixin, CommonRequestHandlerMixin, BaseWebSocketHandler):
+                       SessionHandlerMixin, CommonRequestHandlerMixin, DatabaseSessionHandlerMixin,
+                       BaseWebSocketHandler):
     clients = None
 
     def __init__(self, application, request, **kwargs):
@@ -211,18 +377,19 @@ class WebSocketHandler(TranslationHandlerMixin, LogExceptionHandlerMixin, UserHa
         self.settings.update(websocket_ping_timeout=settings.WEBSOCKET_PING_TIMEOUT)
         self.settings.update(websocket_max_message_size=settings.WEBSOCKET_MAX_MESSAGE_SIZE)
         self.init_session()
+        # Every incoming message is handled in its own database session scope.
+        self.on_message = functools.partial(run_in_new_scope, self.call_in_db_scope, self.on_message)
 
     async def prepare(self):
         """
         Called at the beginning of a request before websocket
         connection is opened.
         """
-        self.setup_session()
         await super().prepare()
 
     async def on_message(self, message):
         """Handle incoming messages on the WebSocket."""
-        self.update_session()
+        await self.aupdate_session()
 
     def data_received(self, chunk):
         """Implement this method to handle streamed request data."""
@@ -297,20 +464,22 @@ class JSONHandlerMixin:
                 error_message = http_error.log_message
         self.write_json(status_code=status_code, message=error_message)
 
-    def write_json(self, status_code: int = 200, message: str = None, data: Any = None) -> None:
+    def write_json(self, status_code: int = 200, message: str = None, data: Any = None) -> Future:
         """
         Writes json response to client, decoding `data` to json with HTTP-header.
+        Response is finished once the session is saved.
 
         :param status_code: HTTP response code
         :param message: status code message
         :param data: data to pass to client
-        :return:
+        :return: future, that may be awaited
         """
         self.set_header('Content-Type', self.content_type)
         self.set_status(status_code, message)
         if status_code == 204:
             # status code expects no body
-            self.finish()
+            # noinspection PyUnresolvedReferences
+            return self._finish_with_session(self.finish)
         else:
             result = {
                 'meta': {
@@ -319,10 +488,11 @@ class JSONHandlerMixin:
                 },
                 'data': data,
             } if status_code != 204 else None
-            self.finish(self.dumps(result))
+            # noinspection PyUnresolvedReferences
+            return self._finish_with_session(self.finish, self.dumps(result))
 
     def dumps(self, data):
-        return json.dumps(data, cls=self.encoder).replace("</", "<\\/")
+        return jsonengine.dumps(data, default=self.encoder().default).replace("</", "<\\/")
 
     async def get_context_data(self, **kwargs):
         if self.extra_context is not None:
@@ -397,7 +567,7 @@ class TemplateMixin:
         template_name = template_name or self.get_template_name()
         self.set_header('Content-Type', self.content_type)
         # noinspection PyUnresolvedReferences
-        super().render(template_name, **kwargs)
+        return super().render(template_name, **kwargs)
 
     def get_template_namespace(self):
         from anthill.framework.apps import app
@@ -478,7 +648,7 @@ class TemplateHandler(TemplateMixin, ContextMixin, RequestHandler):
 
     async def get(self, *args, **kwargs):
         context = await self.get_context_data(**kwargs)
-        self.render(**context)
+        await self.render(**context)
 
 
 class RedirectHandler(RedirectMixin, RequestHandler):
@@ -488,7 +658,7 @@ class RedirectHandler(RedirectMixin, RequestHandler):
     async def get(self, *args, **kwargs):
         url = self.get_redirect_url(*args, **kwargs)
         if url:
-            self.redirect(url, permanent=self.permanent)
+            await self.redirect(url, permanent=self.permanent)
         else:
             raise HttpGoneError
 
@@ -514,7 +684,7 @@ class RedirectHandler(RedirectMixin, RequestHandler):
 class JSONHandler(JSONHandlerMixin, RequestHandler):
     async def get(self, *args, **kwargs):
         data = await self.get_context_data(**kwargs)
-        self.write_json(data=data)
+        await self.write_json(data=data)
 
 
 class StaticFileHandler(SessionHandlerMixin, BaseStaticFileHandler):
@@ -523,7 +693,7 @@ class StaticFileHandler(SessionHandlerMixin, BaseStaticFileHandler):
         self.init_session()
 
     async def prepare(self):
-        self.setup_session()
+        await self.aget_session()
         # noinspection PyAttributeOutsideInit
         self.root = self.get_root()
 
@@ -541,6 +711,6 @@ class StaticFileHandler(SessionHandlerMixin, BaseStaticFileHandler):
 class Handler404(TemplateHandler):
     template_name = 'errors/404.html'
 
-    def prepare(self):
+    async def prepare(self):
         self.set_status(404)
-        self.render()
+        await self.render()
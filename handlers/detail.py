@@ -156,4 +156,4 @@ class DetailHandler(SingleObjectMixin, SingleObjectTemplateMixin, RequestHandler
         # noinspection PyAttributeOutsideInit
         self.object = await self.get_object()
         context = await self.get_context_data(object=self.object)
-        self.render(context)
+        await self.render(context)
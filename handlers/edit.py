@@ -53,12 +53,12 @@ class FormMixin(ContextMixin):
 
     async def form_valid(self, form):
         """If the form is valid, redirect to the supplied URL."""
-        self.redirect(self.get_success_url())
+        await self.redirect(self.get_success_url())
 
     async def form_invalid(self, form):
         """If the form is invalid, render the invalid form."""
         context = await self.get_context_data(form=form)
-        self.render(**context)
+        await self.render(**context)
 
     async def get_context_data(self, **kwargs):
         """Insert the form into the context dict."""
@@ -145,7 +145,7 @@ class ProcessFormMixin:
     async def get(self, *args, **kwargs):
         """Handle GET requests: instantiate a blank version of the form."""
         context = await self.get_context_data(**kwargs)
-        self.render(**context)
+        await self.render(**context)
 
     async def post(self, *args, **kwargs):
         """
@@ -236,7 +236,7 @@ class DeletionMixin:
         # noinspection PyAttributeOutsideInit
         self.object = await self.get_object()
         await future_exec(self.object.delete)
-        self.redirect(self.get_success_url())
+        await self.redirect(self.get_success_url())
 
     # Add support for browsers which only accept GET and POST for now.
     async def post(self, *args, **kwargs):
@@ -2,7 +2,7 @@ from anthill.framework.handlers import RequestHandler, TemplateMixin
 from graphql.execution.executors.asyncio import AsyncioExecutor
 from graphql.type.schema import GraphQLSchema
 from anthill.framework.conf import settings
-from tornado.escape import json_decode, json_encode
+from anthill.framework.utils import jsonengine
 from graphql.error import GraphQLError, format_error as format_graphql_error
 from anthill.framework.http import HttpForbiddenError, HttpBadRequestError
 from tornado.log import app_log
@@ -25,6 +25,12 @@ IMPORT_STRINGS = (
 )
 
 
+def json_encode(value):
+    # Escape "</" so the output is safe to embed into html script tag,
+    # same as tornado.escape.json_encode.
+    return jsonengine.dumps(value).replace("</", "<\\/")
+
+
 def perform_import(val, setting_name):
     """
     If the given setting is a string import notation,
@@ -272,7 +278,7 @@ class GraphQLHandler(TemplateMixin, RequestHandler):
         variables = data.get('variables')
         if variables and isinstance(variables, six.text_type):
             try:
-                variables = json_decode(variables)
+                variables = jsonengine.loads(variables)
             except Exception as e:
                 raise HttpBadRequestError(
                     'Variables are invalid JSON.', reason=str(e))
@@ -296,7 +302,7 @@ class GraphQLHandler(TemplateMixin, RequestHandler):
 
         elif content_type == 'application/json':
             try:
-                request_json = json_decode(self.request.body)
+                request_json = jsonengine.loads(self.request.body)
             except Exception as e:
                 raise HttpBadRequestError(
                     'The received data is not a valid JSON query.', reason=str(e))
@@ -4,12 +4,12 @@ from anthill.framework.core.jsonrpc.jsonrpc import JSONRPCRequest
 from anthill.framework.core.jsonrpc.manager import JSONRPCResponseManager
 from anthill.framework.core.jsonrpc.dispatcher import Dispatcher
 from anthill.framework.core.jsonrpc.utils import DatetimeDecimalEncoder
-import json
+from anthill.framework.utils import jsonengine
 
 
 def response_serialize(obj):
     """Serializes response's data object to JSON."""
-    return json.dumps(obj, cls=DatetimeDecimalEncoder)
+    return jsonengine.dumps(obj, default=DatetimeDecimalEncoder().default)
 
 
 class JSONRPCMixin:
@@ -1,4 +1,4 @@
-from anthill.framework.handlers.base import ContextMixin, TemplateMixin, TemplateHandler
+from anthill.framework.handlers.base import ContextMixin, TemplateMixin, TemplateHandler, JSONHandler
 from anthill.framework.utils.asynchronous import thread_pool_exec as future_exec, as_future
 from anthill.framework.core.paginator import Paginator, InvalidPage
 from anthill.framework.core.exceptions import ImproperlyConfigured
@@ -19,6 +19,10 @@ class MultipleObjectMixin(ContextMixin):
     paginator_class = Paginator
     page_kwarg = 'page'
     ordering = None
+    keyset_pagination = False
+    keyset_columns = None
+    keyset_descending = False
+    cursor_kwarg = 'cursor'
 
     def get_queryset(self):
         """
@@ -75,6 +79,26 @@ class MultipleObjectMixin(ContextMixin):
                 'message': str(e)
             })
 
+    def paginate_queryset_by_keyset(self, queryset, page_size):
+        """
+        Paginate the queryset using keyset pagination.
+        Page is pointed by opaque cursor token instead of page number.
+        """
+        cursor = self.path_kwargs.get(self.cursor_kwarg) or self.get_argument(self.cursor_kwarg, None)
+        page = queryset.keyset_paginate(
+            cursor=cursor, per_page=page_size, columns=self.get_keyset_columns(),
+            descending=self.keyset_descending)
+        if not page.items and page.has_prev and not self.get_allow_empty():
+            raise Http404(_('Invalid page.'))
+        return None, page, page.items, page.has_prev or page.has_next
+
+    def get_keyset_columns(self):
+        """
+        Return the columns (or column names) to order and paginate by.
+        Must be unique and indexed. Defaults to primary key.
+        """
+        return self.keyset_columns
+
     def get_paginate_by(self, queryset):
         """
         Get the number of items to paginate by, or ``None`` for no pagination.
@@ -113,13 +137,20 @@ class MultipleObjectMixin(ContextMixin):
         """Get the context for this handler."""
 
         queryset = object_list if object_list is not None else self.object_list
-        if isinstance(queryset, Query):
-            queryset = await future_exec(queryset.all)
 
         page_size = self.get_paginate_by(queryset)
         context_object_name = self.get_context_object_name(queryset)
         if page_size:
-            paginator, page, queryset, is_paginated = self.paginate_queryset(queryset, page_size)
+            if isinstance(queryset, Query) and self.keyset_pagination:
+                paginator, page, queryset, is_paginated = await future_exec(
+                    self.paginate_queryset_by_keyset, queryset, page_size)
+            elif isinstance(queryset, Query):
+                # Paginator issues a count query and fetches the requested page
+                # only (LIMIT/OFFSET), so the whole table is never loaded.
+                paginator, page, queryset, is_paginated = await future_exec(
+                    self.paginate_queryset, queryset, page_size)
+            else:
+                paginator, page, queryset, is_paginated = self.paginate_queryset(queryset, page_size)
             context = {
                 'paginator': paginator,
                 'page_obj': page,
@@ -127,6 +158,8 @@ class MultipleObjectMixin(ContextMixin):
                 'object_list': queryset
             }
         else:
+            if isinstance(queryset, Query):
+                queryset = await future_exec(queryset.all)
             context = {
                 'paginator': None,
                 'page_obj': None,
@@ -153,7 +186,8 @@ class BaseListHandler(MultipleObjectMixin, TemplateHandler):
             # it's better to do a cheap query than to load the unpaginated
             # queryset in memory.
             if self.get_paginate_by(self.object_list) is not None:
-                is_empty = not (await future_exec(self.object_list.exists))
+                query = self.object_list.session.query(self.object_list.exists())
+                is_empty = not (await future_exec(query.scalar))
             else:
                 is_empty = not self.object_list
             if is_empty:
@@ -162,7 +196,7 @@ class BaseListHandler(MultipleObjectMixin, TemplateHandler):
                 })
 
         context = await self.get_context_data()
-        return self.render(context)
+        await self.render(context)
 
 
 class MultipleObjectTemplateMixin(TemplateMixin):
@@ -207,3 +241,29 @@ class ListHandler(MultipleObjectTemplateMixin, BaseListHandler):
     Render some list of objects, set by `self.model` or `self.queryset`.
     `self.queryset` can actually be any iterable of items, not just a queryset.
     """
+
+
+class JSONListHandler(MultipleObjectMixin, JSONHandler):
+    """
+    Respond with JSON list of objects, set by `self.model` or `self.queryset`.
+    Keyset pagination is used by default, so any page costs the same as the first one.
+    """
+    keyset_pagination = True
+    paginate_by = 20
+
+    def get_json_data(self, context):
+        """Return data to be written as JSON response."""
+        page = context['page_obj']
+        data = {'items': context['object_list']}
+        if self.keyset_pagination and page is not None:
+            data.update(next_cursor=page.next_cursor, prev_cursor=page.prev_cursor)
+        elif page is not None:
+            data.update(page=page.number, num_pages=page.paginator.num_pages,
+                        count=page.paginator.count)
+        return data
+
+    async def get(self, *args, **kwargs):
+        # noinspection PyAttributeOutsideInit
+        self.object_list = self.get_queryset()
+        context = await self.get_context_data()
+        await self.write_json(data=self.get_json_data(context))
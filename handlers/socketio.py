@@ -1,7 +1,7 @@
 from anthill.framework.conf import settings
 from anthill.framework.handlers.base import (
     TranslationHandlerMixin, LogExceptionHandlerMixin, SessionHandlerMixin,
-    CommonRequestHandlerMixin, UserHandlerMixin
+    CommonRequestHandlerMixin, UserHandlerMixin, DatabaseSessionHandlerMixin
 )
 import socketio
 import logging
@@ -30,7 +30,8 @@ BaseSocketIOHandler = socketio.get_tornado_handler(socketio_server)
 
 
 class SocketIOHandler(TranslationHandlerMixin, LogExceptionHandlerMixin, UserHandlerMixin,
-                      SessionHandlerMixin, CommonRequestHandlerMixin, BaseSocketIOHandler):
+                      SessionHandlerMixin, CommonRequestHandlerMixin, DatabaseSessionHandlerMixin,
+                      BaseSocketIOHandler):
     clients = None
 
     def __init__(self, application, request, **kwargs):
@@ -45,13 +46,12 @@ class SocketIOHandler(TranslationHandlerMixin, LogExceptionHandlerMixin, UserHan
         Called at the beginning of a request before websocket
         connection is opened.
         """
-        self.setup_session()
         await super().prepare()
 
     async def on_message(self, message):
         """Handle incoming messages on the WebSocket."""
         await super().on_message(message)
-        self.update_session()
+        await self.aupdate_session()
 
     async def open(self, *args, **kwargs):
         """Invoked when a new WebSocket is opened."""
@@ -1,4 +1,5 @@
 import base64
+import functools
 import logging
 import string
 from datetime import datetime, timedelta
@@ -7,6 +8,7 @@ from anthill.framework.conf import settings
 from anthill.framework.sessions.exceptions import SuspiciousSession
 from anthill.framework.core.exceptions import SuspiciousOperation
 from anthill.framework.utils import timezone
+from anthill.framework.utils.asynchronous import thread_pool_exec
 from anthill.framework.utils.crypto import (
     constant_time_compare, get_random_string, salted_hmac,
 )
@@ -17,6 +19,19 @@ from anthill.framework.utils.module_loading import import_string
 # on case insensitive file systems.
 VALID_KEY_CHARS = string.ascii_lowercase + string.digits
 
+# Encoded session data is "<version>:" followed by base64 of the raw HMAC-SHA1
+# digest and serialized data. Legacy data has no version prefix and is
+# base64 of "<hex digest>:<serialized data>", it is still decoded.
+# Version separator can not appear in base64 output, so formats never clash.
+ENCODING_VERSION = b'1'
+_VERSION_PREFIX = ENCODING_VERSION + b':'
+_DIGEST_SIZE = 20
+
+
+@functools.lru_cache(maxsize=None)
+def _get_serializer(path):
+    return import_string(path)
+
 
 class CreateError(Exception):
     """
@@ -44,7 +59,7 @@ class SessionBase:
         self._session_key = session_key
         self.accessed = False
         self.modified = False
-        self.serializer = import_string(settings.SESSION_SERIALIZER)
+        self.serializer = _get_serializer(settings.SESSION_SERIALIZER)
 
     def __contains__(self, key):
         return key in self._session
@@ -85,26 +100,39 @@ class SessionBase:
     def delete_test_cookie(self):
         del self[self.TEST_COOKIE_NAME]
 
-    def _hash(self, value):
+    def _hmac(self, value):
         key_salt = "anthill.framework.sessions" + self.__class__.__name__
-        return salted_hmac(key_salt, value).hexdigest()
+        return salted_hmac(key_salt, value)
+
+    def _hash(self, value):
+        return self._hmac(value).hexdigest()
 
     def encode(self, session_dict):
         """Return the given session dictionary serialized and encoded as a string."""
         serialized = self.serializer().dumps(session_dict)
-        hash = self._hash(serialized)
-        return base64.b64encode(hash.encode() + b":" + serialized).decode('ascii')
+        digest = self._hmac(serialized).digest()
+        return (_VERSION_PREFIX + base64.b64encode(digest + serialized)).decode('ascii')
+
+    def _decode_legacy(self, encoded_data):
+        # could produce ValueError if there is no ':'
+        hash, serialized = encoded_data.split(b':', 1)
+        expected_hash = self._hash(serialized)
+        if not constant_time_compare(hash.decode(), expected_hash):
+            raise SuspiciousSession("Session data corrupted")
+        return serialized
 
     def decode(self, session_data):
-        encoded_data = base64.b64decode(force_bytes(session_data))
+        session_data = force_bytes(session_data)
         try:
-            # could produce ValueError if there is no ':'
-            hash, serialized = encoded_data.split(b':', 1)
-            expected_hash = self._hash(serialized)
-            if not constant_time_compare(hash.decode(), expected_hash):
-                raise SuspiciousSession("Session data corrupted")
+            if session_data.startswith(_VERSION_PREFIX):
+                encoded_data = base64.b64decode(session_data[len(_VERSION_PREFIX):])
+                digest = encoded_data[:_DIGEST_SIZE]
+                serialized = encoded_data[_DIGEST_SIZE:]
+                if not constant_time_compare(digest, self._hmac(serialized).digest()):
+                    raise SuspiciousSession("Session data corrupted")
             else:
-                return self.serializer().loads(serialized)
+                serialized = self._decode_legacy(base64.b64decode(session_data))
+            return self.serializer().loads(serialized)
         except Exception as e:
             # ValueError, SuspiciousOperation, unpickling exceptions. If any of
             # these happen, just return an empty dictionary (an empty session).
@@ -195,6 +223,18 @@ class SessionBase:
 
     _session = property(_get_session)
 
+    async def _aget_session(self, no_load=False):
+        """Async version of _get_session()."""
+        self.accessed = True
+        try:
+            return self._session_cache
+        except AttributeError:
+            if self.session_key is None or no_load:
+                self._session_cache = {}
+            else:
+                self._session_cache = await self.aload()
+        return self._session_cache
+
     def get_expiry_age(self, **kwargs):
         """
         Get the number of seconds until the session expires.
@@ -300,6 +340,21 @@ class SessionBase:
         if key:
             self.delete(key)
 
+    async def aflush(self):
+        """Async version of flush()."""
+        self.clear()
+        await self.adelete()
+        self._session_key = None
+
+    async def acycle_key(self):
+        """Async version of cycle_key()."""
+        data = await self._aget_session()
+        key = self.session_key
+        await self.acreate()
+        self._session_cache = data
+        if key:
+            await self.adelete(key)
+
     # Methods that child classes must implement.
 
     def exists(self, session_key):
@@ -337,6 +392,29 @@ class SessionBase:
         """
         raise NotImplementedError('subclasses of SessionBase must provide a load() method')
 
+    # Async methods. By default sync ones are run in the thread pool,
+    # child classes with async storage client should override them.
+
+    async def aexists(self, session_key):
+        """Async version of exists()."""
+        return await thread_pool_exec(self.exists, session_key)
+
+    async def acreate(self):
+        """Async version of create()."""
+        return await thread_pool_exec(self.create)
+
+    async def asave(self, must_create=False):
+        """Async version of save()."""
+        return await thread_pool_exec(self.save, must_create=must_create)
+
+    async def adelete(self, session_key=None):
+        """Async version of delete()."""
+        return await thread_pool_exec(self.delete, session_key)
+
+    async def aload(self):
+        """Async version of load()."""
+        return await thread_pool_exec(self.load)
+
     @classmethod
     def clear_expired(cls):
         """
@@ -347,3 +425,15 @@ class SessionBase:
         a built-in expiration mechanism, it should be a no-op.
         """
         raise NotImplementedError('This backend does not support clear_expired().')
+
+    @classmethod
+    def clear_expired_batch(cls, batch_size=1000):
+        """
+        Remove at most ``batch_size`` expired sessions from the session store
+        and return the number of removed sessions, so the caller can go on
+        while batches are full.
+
+        By default the whole clear_expired() is done at once and 0 is returned.
+        """
+        cls.clear_expired()
+        return 0
@@ -1,8 +1,9 @@
 from anthill.framework.conf import settings
 from anthill.framework.sessions.backends.base import (
-    CreateError, SessionBase, UpdateError,
+    CreateError, SessionBase, UpdateError, VALID_KEY_CHARS,
 )
 from anthill.framework.core.cache import caches
+from anthill.framework.utils.crypto import get_random_string
 
 KEY_PREFIX = "anthill.framework.sessions.cache"
 
@@ -10,6 +11,10 @@ KEY_PREFIX = "anthill.framework.sessions.cache"
 class SessionStore(SessionBase):
     """
     A cache-based session store.
+
+    New sessions are stored with ``add()`` (``SET NX`` for redis) and
+    existing ones with ``replace()`` (``SET XX``), so every save is
+    a single round trip without checking the key first.
     """
     cache_key_prefix = KEY_PREFIX
 
@@ -17,9 +22,23 @@ class SessionStore(SessionBase):
         self._cache = caches[settings.SESSION_CACHE_ALIAS]
         super().__init__(session_key)
 
+    def _make_cache_key(self, session_key):
+        return '.'.join([self.cache_key_prefix, session_key])
+
     @property
     def cache_key(self):
-        return '.'.join([self.cache_key_prefix, self._get_or_create_session_key()])
+        return self._make_cache_key(self._get_or_create_session_key())
+
+    def _get_new_session_key(self):
+        # Key collisions are detected by add() in create(),
+        # so there is no need to ask the cache if the key exists.
+        return get_random_string(32, VALID_KEY_CHARS)
+
+    def _load_result(self, session_data):
+        if session_data is not None:
+            return session_data
+        self._session_key = None
+        return {}
 
     def load(self):
         try:
@@ -28,10 +47,14 @@ class SessionStore(SessionBase):
             # Some backends (e.g. memcache) raise an exception on invalid
             # cache keys. If this happens, reset the session. See #17810.
             session_data = None
-        if session_data is not None:
-            return session_data
-        self._session_key = None
-        return {}
+        return self._load_result(session_data)
+
+    async def aload(self):
+        try:
+            session_data = await self._cache.aget(self.cache_key)
+        except Exception:
+            session_data = None
+        return self._load_result(session_data)
 
     def create(self):
         # Because a cache can fail silently (e.g. memcache), we don't know if
@@ -51,30 +74,59 @@ class SessionStore(SessionBase):
             "Unable to create a new session key. "
             "It is likely that the cache is unavailable.")
 
+    async def acreate(self):
+        for i in range(10000):
+            self._session_key = self._get_new_session_key()
+            try:
+                await self.asave(must_create=True)
+            except CreateError:
+                continue
+            self.modified = True
+            return
+        raise RuntimeError(
+            "Unable to create a new session key. "
+            "It is likely that the cache is unavailable.")
+
     def save(self, must_create=False):
         if self.session_key is None:
             return self.create()
+        data = self._get_session(no_load=must_create)
+        if must_create:
+            if not self._cache.add(self.cache_key, data, self.get_expiry_age()):
+                raise CreateError
+        elif not self._cache.replace(self.cache_key, data, self.get_expiry_age()):
+            raise UpdateError
+
+    async def asave(self, must_create=False):
+        if self.session_key is None:
+            return await self.acreate()
+        data = await self._aget_session(no_load=must_create)
         if must_create:
-            func = self._cache.add
-        elif self._cache.get(self.cache_key) is not None:
-            func = self._cache.set
-        else:
+            if not await self._cache.aadd(self.cache_key, data, self.get_expiry_age()):
+                raise CreateError
+        elif not await self._cache.areplace(self.cache_key, data, self.get_expiry_age()):
             raise UpdateError
-        result = func(self.cache_key,
-                      self._get_session(no_load=must_create),
-                      self.get_expiry_age())
-        if must_create and not result:
-            raise CreateError
 
     def exists(self, session_key):
-        return bool(session_key) and (self.cache_key_prefix + session_key) in self._cache
+        return bool(session_key) and self._make_cache_key(session_key) in self._cache
+
+    async def aexists(self, session_key):
+        return bool(session_key) and await self._cache.ahas_key(
+            self._make_cache_key(session_key))
 
     def delete(self, session_key=None):
         if session_key is None:
             if self.session_key is None:
                 return
             session_key = self.session_key
-        self._cache.delete(self.cache_key_prefix + session_key)
+        self._cache.delete(self._make_cache_key(session_key))
+
+    async def adelete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        await self._cache.adelete(self._make_cache_key(session_key))
 
     @classmethod
     def clear_expired(cls):
@@ -89,4 +89,16 @@ class SessionStore(SessionBase):
     @classmethod
     def clear_expired(cls):
         model = cls.get_model_class()
-        model.query.filter(model.expire_date < timezone.now()).delete()
+        model.query.filter(model.expire_date < timezone.now()).delete(synchronize_session=False)
+
+    @classmethod
+    def clear_expired_batch(cls, batch_size=1000):
+        model = cls.get_model_class()
+        query = model.query
+        # Range scan of the expire_date index.
+        session_keys = [key for key, in query.session.query(model.session_key).filter(
+            model.expire_date < timezone.now()).limit(batch_size)]
+        if session_keys:
+            query.filter(model.session_key.in_(session_keys)).delete(synchronize_session=False)
+            query.session.commit()
+        return len(session_keys)
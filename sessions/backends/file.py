@@ -1,8 +1,9 @@
 import datetime
 import logging
 import os
-import shutil
 import tempfile
+import threading
+import time
 
 from anthill.framework.conf import settings
 from anthill.framework.sessions.backends.base import (
@@ -16,7 +17,14 @@ from anthill.framework.utils import timezone
 class SessionStore(SessionBase):
     """
     Implement a file based session store.
+
+    Session files are spread over subdirectories named after the first
+    characters of the session key, so no directory grows too large.
+    Files of the old flat layout are moved to their subdirectory
+    on first access.
     """
+    # Number of session key characters naming the subdirectory.
+    subdir_length = 2
 
     def __init__(self, session_key=None):
         self.storage_path = type(self)._get_storage_path()
@@ -39,10 +47,7 @@ class SessionStore(SessionBase):
             cls._storage_path = storage_path
             return storage_path
 
-    def _key_to_file(self, session_key=None):
-        """
-        Get the file associated with this session key.
-        """
+    def _validate_key(self, session_key=None):
         if session_key is None:
             session_key = self._get_or_create_session_key()
 
@@ -53,8 +58,40 @@ class SessionStore(SessionBase):
             raise InvalidSessionKey(
                 "Invalid characters in session key")
 
+        return session_key
+
+    def _key_to_file(self, session_key=None):
+        """
+        Get the file associated with this session key.
+        """
+        session_key = self._validate_key(session_key)
+        return os.path.join(
+            self.storage_path, session_key[:self.subdir_length], self.file_prefix + session_key)
+
+    def _key_to_legacy_file(self, session_key=None):
+        """
+        Get the file associated with this session key in the flat layout.
+        """
+        session_key = self._validate_key(session_key)
         return os.path.join(self.storage_path, self.file_prefix + session_key)
 
+    def _migrate_legacy_file(self, session_key=None):
+        """
+        Move the session file of the flat layout to its subdirectory.
+        Return True if the file was moved.
+        """
+        legacy_file_name = self._key_to_legacy_file(session_key)
+        if not os.path.exists(legacy_file_name):
+            return False
+        session_file_name = self._key_to_file(session_key)
+        try:
+            os.makedirs(os.path.dirname(session_file_name), exist_ok=True)
+            os.replace(legacy_file_name, session_file_name)
+        except FileNotFoundError:
+            # Moved by another process.
+            return os.path.exists(session_file_name)
+        return True
+
     def _last_modification(self):
         """
         Return the modification time of the file storing the session's content.
@@ -70,11 +107,20 @@ class SessionStore(SessionBase):
                 self._last_modification() + datetime.timedelta(seconds=settings.SESSION_COOKIE_AGE)
         )
 
+    def _read_file(self):
+        try:
+            with open(self._key_to_file(), "rb") as session_file:
+                return session_file.read()
+        except FileNotFoundError:
+            if not self._migrate_legacy_file():
+                raise
+        with open(self._key_to_file(), "rb") as session_file:
+            return session_file.read()
+
     def load(self):
         session_data = {}
         try:
-            with open(self._key_to_file(), "rb") as session_file:
-                file_data = session_file.read()
+            file_data = self._read_file()
             # Don't fail if there is no data in the session file.
             # We may have opened the empty placeholder file.
             if file_data:
@@ -114,6 +160,8 @@ class SessionStore(SessionBase):
         session_data = self._get_session(no_load=must_create)
 
         session_file_name = self._key_to_file()
+        if must_create:
+            os.makedirs(os.path.dirname(session_file_name), exist_ok=True)
 
         try:
             # Make sure the file exists.  If it does not already exist, an
@@ -156,42 +204,141 @@ class SessionStore(SessionBase):
                 finally:
                     os.close(output_file_fd)
 
-                # This will atomically rename the file (os.rename) if the OS
-                # supports it. Otherwise this will result in a shutil.copy2
-                # and os.unlink (for example on Windows). See #9084.
-                shutil.move(output_file_name, session_file_name)
+                # Temporary file is created in the same directory,
+                # so it is atomically renamed on every platform.
+                os.replace(output_file_name, session_file_name)
                 renamed = True
+                self._set_expiry_mtime(session_file_name, session_data)
             finally:
                 if not renamed:
                     os.unlink(output_file_name)
         except (OSError, IOError, EOFError):
             pass
 
+    def _set_expiry_mtime(self, session_file_name, session_data):
+        """
+        Make "mtime + SESSION_COOKIE_AGE" the expiry time of every session
+        file, so expired files are found without reading them.
+        Sessions without custom expiry already satisfy it.
+        """
+        expiry = session_data.get('_session_expiry')
+        if not expiry:
+            return
+        expiry_age = self.get_expiry_age(expiry=expiry)
+        mtime = time.time() + expiry_age - settings.SESSION_COOKIE_AGE
+        os.utime(session_file_name, (time.time(), mtime))
+
     def exists(self, session_key):
-        return os.path.exists(self._key_to_file(session_key))
+        return (os.path.exists(self._key_to_file(session_key)) or
+                os.path.exists(self._key_to_legacy_file(session_key)))
 
     def delete(self, session_key=None):
         if session_key is None:
             if self.session_key is None:
                 return
             session_key = self.session_key
-        try:
-            os.unlink(self._key_to_file(session_key))
-        except OSError:
-            pass
+        for file_name in (self._key_to_file(session_key), self._key_to_legacy_file(session_key)):
+            try:
+                os.unlink(file_name)
+            except OSError:
+                pass
 
     def clean(self):
         pass
 
     @classmethod
-    def clear_expired(cls):
+    def _iter_session_files(cls):
+        """
+        Yield directory entries of all session files,
+        in subdirectories and in the flat layout.
+        """
         storage_path = cls._get_storage_path()
         file_prefix = settings.SESSION_COOKIE_NAME
+        subdirs = []
+
+        with os.scandir(storage_path) as entries:
+            for entry in entries:
+                if entry.name.startswith(file_prefix):
+                    yield entry
+                elif len(entry.name) == cls.subdir_length and entry.is_dir():
+                    subdirs.append(entry.path)
 
-        for session_file in os.listdir(storage_path):
-            if not session_file.startswith(file_prefix):
+        for subdir in subdirs:
+            try:
+                with os.scandir(subdir) as entries:
+                    for entry in entries:
+                        if entry.name.startswith(file_prefix):
+                            yield entry
+            except FileNotFoundError:
                 continue
-            session_key = session_file[len(file_prefix):]
+
+    # Scan of session files continued by the next batch.
+    _expired_scan = None
+    _expired_scan_lock = threading.Lock()
+
+    @classmethod
+    def clear_expired_batch(cls, batch_size=1000):
+        """
+        Remove expired session files found by modification time,
+        without reading most of them. Every batch continues the scan
+        where the previous one stopped.
+        """
+        expired_mtime = time.time() - settings.SESSION_COOKIE_AGE
+        removed = 0
+
+        with cls._expired_scan_lock:
+            if cls._expired_scan is None:
+                cls._expired_scan = cls._iter_session_files()
+            for entry in cls._expired_scan:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if stat.st_mtime >= expired_mtime:
+                    continue
+                if cls._remove_expired_file(entry, stat):
+                    removed += 1
+                    if removed >= batch_size:
+                        break
+            else:
+                # Scan is finished, the next batch starts a new one.
+                cls._expired_scan = None
+        return removed
+
+    @classmethod
+    def _remove_expired_file(cls, entry, stat):
+        """
+        Remove session file older than SESSION_COOKIE_AGE if it is expired.
+        Return True if the file was removed.
+
+        Sessions with custom expiry saved before modification time was
+        adjusted to it (see _set_expiry_mtime) may be still valid, so the
+        file is read to check it, and gets the adjusted modification time.
+        """
+        session_key = entry.name[len(settings.SESSION_COOKIE_NAME):]
+        try:
+            if not stat.st_size or not set(session_key).issubset(VALID_KEY_CHARS):
+                # Empty placeholder or temporary file left behind.
+                os.unlink(entry.path)
+                return True
+            session = cls(session_key)
+            # When an expired session is loaded, its file is removed. Prevent
+            # creation of a new file by disabling the create() method.
+            session.create = lambda: None
+            session_data = session.load()
+            if not session.exists(session_key):
+                return True
+            session._set_expiry_mtime(session._key_to_file(), session_data)
+        except OSError:
+            pass
+        return False
+
+    @classmethod
+    def clear_expired(cls):
+        file_prefix = settings.SESSION_COOKIE_NAME
+
+        for entry in cls._iter_session_files():
+            session_key = entry.name[len(file_prefix):]
             session = cls(session_key)
             # When an expired session is loaded, its file is removed, and a
             # new file is immediately created. Prevent this by disabling
@@ -0,0 +1,313 @@
+"""
+Redis hash based session store.
+
+Every session is stored as redis hash with a field per session key.
+Save writes only the fields changed during the request (HSET/HDEL),
+and session without changes only gets its expiry refreshed with EXPIRE,
+so large sessions are not rewritten on every request.
+
+``SESSION_CACHE_ALIAS`` must be a redis cache, values are encoded with
+its serializer and compressor. Redis errors are handled by the cache
+(``IGNORE_EXCEPTIONS`` and circuit breaker options).
+
+In-place changes of mutable values are not tracked: assign the value
+again (``session[key] = value``) after changing it.
+"""
+from anthill.framework.conf import settings
+from anthill.framework.core.cache import caches
+from anthill.framework.core.cache.backends.redis.client.default import (
+    _main_exceptions, _main_async_exceptions,
+)
+from anthill.framework.core.cache.backends.redis.exceptions import ConnectionInterrupted
+from anthill.framework.sessions.backends.base import (
+    CreateError, SessionBase, UpdateError, VALID_KEY_CHARS,
+)
+from anthill.framework.utils.crypto import get_random_string
+from anthill.framework.utils.encoding import force_str
+
+KEY_PREFIX = "anthill.framework.sessions.redis_hash"
+
+CREATE, UPDATE, REPLACE = 'create', 'update', 'replace'
+
+# Writes the session hash atomically.
+# KEYS[1] - session key.
+# ARGV[1] - mode, ARGV[2] - expiry in seconds, ARGV[3] - number of fields to set,
+# followed by field/value pairs to set and then by fields to delete.
+# Empty field keeps hash of empty session alive, as redis removes empty hashes.
+_save_lua = """
+local exists = redis.call('EXISTS', KEYS[1])
+if ARGV[1] == 'create' then
+    if exists == 1 then return 0 end
+else
+    if exists == 0 then return 0 end
+    if ARGV[1] == 'replace' then redis.call('DEL', KEYS[1]) end
+end
+redis.call('HSET', KEYS[1], '', '')
+local i = 4
+for _ = 1, tonumber(ARGV[3]) do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+    i = i + 2
+end
+for j = i, #ARGV do
+    redis.call('HDEL', KEYS[1], ARGV[j])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+
+class SessionStore(SessionBase):
+    """
+    A redis hash based session store.
+    """
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        self._cache = caches[settings.SESSION_CACHE_ALIAS]
+        super().__init__(session_key)
+        # Keys changed since the session was loaded or saved.
+        self._dirty = set()
+        # Whether the whole session must be rewritten.
+        self._replace = False
+
+    # Changes tracking.
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._dirty.add(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._dirty.add(key)
+
+    def pop(self, key, *args):
+        if key in self._session:
+            self._dirty.add(key)
+        return super().pop(key, *args)
+
+    def setdefault(self, key, value):
+        if key not in self._session:
+            self._dirty.add(key)
+        return super().setdefault(key, value)
+
+    def update(self, dict_):
+        dict_ = dict(dict_)
+        super().update(dict_)
+        self._dirty.update(dict_)
+
+    def clear(self):
+        super().clear()
+        self._dirty.clear()
+        self._replace = True
+
+    # Storage.
+
+    def _make_cache_key(self, session_key):
+        return self._cache.client.make_key('.'.join([self.cache_key_prefix, session_key]))
+
+    @property
+    def cache_key(self):
+        return self._make_cache_key(self._get_or_create_session_key())
+
+    def _get_client(self, key):
+        client = self._cache.client
+        if hasattr(client, 'get_server'):
+            # Sharded cache.
+            return client.get_server(key)
+        return client.get_client(write=True)
+
+    def _get_async_client(self, key):
+        client = self._cache.client
+        if hasattr(client, 'get_async_server'):
+            # Sharded cache.
+            return client.get_async_server(key)
+        return client.get_async_client(write=True)
+
+    @property
+    def _async_supported(self):
+        return self._cache.client.async_supported
+
+    def _run(self, key, func):
+        client = self._get_client(key)
+        try:
+            return func(client)
+        except _main_exceptions as e:
+            raise ConnectionInterrupted(connection=client, parent=e)
+
+    async def _arun(self, key, func):
+        client = self._get_async_client(key)
+        try:
+            return await func(client)
+        except _main_async_exceptions as e:
+            raise ConnectionInterrupted(connection=client, parent=e)
+
+    def _call(self, key, func, return_value=None):
+        """
+        Calls ``func(client)`` with redis client of ``key``,
+        handling errors the same way as the cache does.
+        """
+        # noinspection PyProtectedMember
+        return self._cache._call(self._run, return_value, key, func)
+
+    async def _acall(self, key, func, return_value=None):
+        """Async version of _call()."""
+        # noinspection PyProtectedMember
+        return await self._cache._acall(self._arun, return_value, key, func)
+
+    @staticmethod
+    def _save_script(client, key, args):
+        # EVALSHA, the script is sent only if redis has not cached it yet.
+        return client.register_script(_save_lua)(keys=[key], args=args, client=client)
+
+    def _get_new_session_key(self):
+        # Key collisions are detected on save in create(),
+        # so there is no need to ask redis if the key exists.
+        return get_random_string(32, VALID_KEY_CHARS)
+
+    def _load_result(self, raw_data):
+        self._dirty.clear()
+        self._replace = False
+        if raw_data:
+            decode = self._cache.client.decode
+            return {force_str(field): decode(value)
+                    for field, value in raw_data.items() if field}
+        self._session_key = None
+        return {}
+
+    def _save_args(self, must_create):
+        """
+        Return script arguments to save the session,
+        or None if only expiry must be refreshed.
+        """
+        data = self._session_cache
+        deleted = []
+        if must_create:
+            mode, fields = CREATE, data
+        elif self._replace:
+            mode, fields = REPLACE, data
+        elif self._dirty:
+            mode = UPDATE
+            fields = {key: data[key] for key in self._dirty if key in data}
+            deleted = [key for key in self._dirty if key not in data]
+        else:
+            return None
+        encode = self._cache.client.encode
+        args = [mode, self.get_expiry_age(), len(fields)]
+        for key, value in fields.items():
+            args.extend((key, encode(value)))
+        args.extend(deleted)
+        return args
+
+    def _check_saved(self, result, must_create):
+        if not result:
+            raise CreateError if must_create else UpdateError
+        self._dirty.clear()
+        self._replace = False
+
+    def load(self):
+        key = self.cache_key
+        try:
+            raw_data = self._call(key, lambda client: client.hgetall(key))
+        except Exception:
+            raw_data = None
+        return self._load_result(raw_data)
+
+    async def aload(self):
+        if not self._async_supported:
+            return await super().aload()
+        key = self.cache_key
+        try:
+            raw_data = await self._acall(key, lambda client: client.hgetall(key))
+        except Exception:
+            raw_data = None
+        return self._load_result(raw_data)
+
+    def create(self):
+        for i in range(10000):
+            self._session_key = self._get_new_session_key()
+            try:
+                self.save(must_create=True)
+            except CreateError:
+                continue
+            self.modified = True
+            return
+        raise RuntimeError(
+            "Unable to create a new session key. "
+            "It is likely that redis is unavailable.")
+
+    async def acreate(self):
+        for i in range(10000):
+            self._session_key = self._get_new_session_key()
+            try:
+                await self.asave(must_create=True)
+            except CreateError:
+                continue
+            self.modified = True
+            return
+        raise RuntimeError(
+            "Unable to create a new session key. "
+            "It is likely that redis is unavailable.")
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        self._get_session(no_load=must_create)
+        key = self.cache_key
+        args = self._save_args(must_create)
+        if args is None:
+            expiry_age = self.get_expiry_age()
+            result = self._call(key, lambda client: client.expire(key, expiry_age))
+        else:
+            result = self._call(key, lambda client: self._save_script(client, key, args))
+        self._check_saved(result, must_create)
+
+    async def asave(self, must_create=False):
+        if not self._async_supported:
+            return await super().asave(must_create=must_create)
+        if self.session_key is None:
+            return await self.acreate()
+        await self._aget_session(no_load=must_create)
+        key = self.cache_key
+        args = self._save_args(must_create)
+        if args is None:
+            expiry_age = self.get_expiry_age()
+            result = await self._acall(key, lambda client: client.expire(key, expiry_age))
+        else:
+            result = await self._acall(key, lambda client: self._save_script(client, key, args))
+        self._check_saved(result, must_create)
+
+    def exists(self, session_key):
+        if not session_key:
+            return False
+        key = self._make_cache_key(session_key)
+        return bool(self._call(key, lambda client: client.exists(key), False))
+
+    async def aexists(self, session_key):
+        if not self._async_supported:
+            return await super().aexists(session_key)
+        if not session_key:
+            return False
+        key = self._make_cache_key(session_key)
+        return bool(await self._acall(key, lambda client: client.exists(key), False))
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        key = self._make_cache_key(session_key)
+        self._call(key, lambda client: client.delete(key))
+
+    async def adelete(self, session_key=None):
+        if not self._async_supported:
+            return await super().adelete(session_key)
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        key = self._make_cache_key(session_key)
+        await self._acall(key, lambda client: client.delete(key))
+
+    @classmethod
+    def clear_expired(cls):
+        pass
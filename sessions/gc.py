@@ -0,0 +1,92 @@
+"""
+Incremental removal of expired sessions.
+
+Expired sessions are removed in bounded batches with a delay
+between them, so garbage collection never competes with live traffic.
+"""
+from anthill.framework.conf import settings
+from anthill.framework.sessions.handlers import get_session_store_class
+from anthill.framework.utils.asynchronous import thread_pool_exec
+from tornado.ioloop import IOLoop, PeriodicCallback
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger('anthill.application')
+
+
+def _get_options(batch_size, delay):
+    if batch_size is None:
+        batch_size = settings.SESSION_GC_BATCH_SIZE
+    if delay is None:
+        delay = settings.SESSION_GC_BATCH_DELAY
+    return batch_size, delay
+
+
+def clear_expired_sessions(batch_size=None, delay=None, max_batches=None):
+    """
+    Remove expired sessions of the session engine in batches.
+    Return the number of removed sessions.
+    """
+    batch_size, delay = _get_options(batch_size, delay)
+    store_class = get_session_store_class(settings.SESSION_ENGINE)
+    total = batches = 0
+    while True:
+        removed = store_class.clear_expired_batch(batch_size)
+        total += removed
+        batches += 1
+        if removed < batch_size or (max_batches and batches >= max_batches):
+            return total
+        time.sleep(delay)
+
+
+async def aclear_expired_sessions(batch_size=None, delay=None, max_batches=None):
+    """Same as clear_expired_sessions(), but batches are run in the thread pool."""
+    batch_size, delay = _get_options(batch_size, delay)
+    store_class = get_session_store_class(settings.SESSION_ENGINE)
+    total = batches = 0
+    while True:
+        removed = await thread_pool_exec(store_class.clear_expired_batch, batch_size)
+        total += removed
+        batches += 1
+        if removed < batch_size or (max_batches and batches >= max_batches):
+            return total
+        await asyncio.sleep(delay)
+
+
+class SessionGC:
+    """Periodic removal of expired sessions on the IOLoop."""
+
+    def __init__(self, interval=None, batch_size=None, delay=None, max_batches=None):
+        self.interval = interval or settings.SESSION_GC_INTERVAL
+        self.batch_size, self.delay = _get_options(batch_size, delay)
+        self.max_batches = max_batches
+        self._running = False
+        self._periodic_callback = PeriodicCallback(self._schedule, self.interval * 1000)
+
+    def start(self):
+        self._periodic_callback.start()
+
+    def stop(self):
+        self._periodic_callback.stop()
+
+    def _schedule(self):
+        if not self._running:
+            IOLoop.current().spawn_callback(self.run)
+
+    async def run(self):
+        self._running = True
+        try:
+            removed = await aclear_expired_sessions(
+                self.batch_size, self.delay, self.max_batches)
+        except NotImplementedError:
+            logger.warning('Session engine %s does not support clearing expired sessions.',
+                           settings.SESSION_ENGINE)
+            self.stop()
+        except Exception:
+            logger.exception('Cannot clear expired sessions.')
+        else:
+            if removed:
+                logger.debug('Expired sessions removed: %s.', removed)
+        finally:
+            self._running = False
@@ -3,14 +3,20 @@ from anthill.framework.core.exceptions import SuspiciousOperation
 from anthill.framework.sessions.backends.base import UpdateError
 from anthill.framework.conf import settings
 from importlib import import_module
+import functools
 import time
 
 
+@functools.lru_cache(maxsize=None)
+def get_session_store_class(engine):
+    """Return SessionStore class of the session engine, imported once per process."""
+    return import_module(engine).SessionStore
+
+
 class SessionHandlerMixin:
     # noinspection PyAttributeOutsideInit
     def init_session(self):
-        session_engine = import_module(settings.SESSION_ENGINE)
-        self.SessionStore = session_engine.SessionStore
+        self.SessionStore = get_session_store_class(settings.SESSION_ENGINE)
 
     # noinspection PyAttributeOutsideInit
     def setup_session(self):
@@ -21,7 +27,39 @@ class SessionHandlerMixin:
     def _is_websocket(self):
         return hasattr(self, 'ws_connection')
 
-    def update_session(self):
+    @property
+    def session(self):
+        """Session store, created on first access."""
+        try:
+            return self._session_store
+        except AttributeError:
+            self.setup_session()
+            return self._session_store
+
+    # noinspection PyAttributeOutsideInit
+    @session.setter
+    def session(self, value):
+        self._session_store = value
+
+    def has_session_cookie(self):
+        return settings.SESSION_COOKIE_NAME in self.cookies
+
+    async def aget_session(self):
+        """Return session with its data loaded without blocking the loop."""
+        session = self.session
+        # noinspection PyProtectedMember
+        await session._aget_session()
+        return session
+
+    def _prepare_session_update(self):
+        """
+        Delete the session cookie if the session has been emptied.
+        Return True if the session must be saved.
+        """
+        if not hasattr(self, '_session_store'):
+            # Session was not used while handling the request.
+            if not (settings.SESSION_SAVE_EVERY_REQUEST and self.has_session_cookie()):
+                return False
         # If session was modified, or if the configuration is to save the
         # session every time, save the changes and set a session cookie or delete
         # the session cookie if the session has been emptied.
@@ -30,45 +68,64 @@ class SessionHandlerMixin:
             modified = self.session.modified
             empty = self.session.is_empty()
         except AttributeError:
-            pass
+            return False
+        # First check if we need to delete this cookie.
+        # The session should be deleted only if the session is entirely empty
+        if settings.SESSION_COOKIE_NAME in self.cookies and empty and not self._is_websocket:
+            self.clear_cookie(
+                settings.SESSION_COOKIE_NAME,
+                path=settings.SESSION_COOKIE_PATH,
+                domain=settings.SESSION_COOKIE_DOMAIN,
+            )
+            return False
+        if accessed:
+            patch_vary_headers(self._headers, ('Cookie',))
+        # Skip session save for 500 responses.
+        return ((modified or settings.SESSION_SAVE_EVERY_REQUEST) and not empty and
+                self._status_code != 500)
+
+    def _set_session_cookie(self):
+        """Refresh the client cookie after the session is saved."""
+        if self._is_websocket:
+            return
+        if self.session.get_expire_at_browser_close():
+            max_age = None
+            expires = None
         else:
-            # First check if we need to delete this cookie.
-            # The session should be deleted only if the session is entirely empty
-            if settings.SESSION_COOKIE_NAME in self.cookies and empty and not self._is_websocket:
-                self.clear_cookie(
-                    settings.SESSION_COOKIE_NAME,
-                    path=settings.SESSION_COOKIE_PATH,
-                    domain=settings.SESSION_COOKIE_DOMAIN,
-                )
-            else:
-                if accessed:
-                    patch_vary_headers(self._headers, ('Cookie',))
-                if (modified or settings.SESSION_SAVE_EVERY_REQUEST) and not empty:
-                    if self.session.get_expire_at_browser_close():
-                        max_age = None
-                        expires = None
-                    else:
-                        max_age = self.session.get_expiry_age()
-                        expires = time.time() + max_age
-                    # Save the session data and refresh the client cookie.
-                    # Skip session save for 500 responses.
-                    if self._status_code != 500:
-                        try:
-                            self.session.save()
-                        except UpdateError:
-                            raise SuspiciousOperation(
-                                "The request's session was deleted before the "
-                                "request completed. The user may have logged "
-                                "out in a concurrent request, for example."
-                            )
-                        if not self._is_websocket:
-                            self.set_cookie(
-                                settings.SESSION_COOKIE_NAME,
-                                self.session.session_key,
-                                max_age=max_age,
-                                expires=expires,
-                                domain=settings.SESSION_COOKIE_DOMAIN,
-                                path=settings.SESSION_COOKIE_PATH,
-                                secure=settings.SESSION_COOKIE_SECURE or None,
-                                httponly=settings.SESSION_COOKIE_HTTPONLY or None
-                            )
+            max_age = self.session.get_expiry_age()
+            expires = time.time() + max_age
+        self.set_cookie(
+            settings.SESSION_COOKIE_NAME,
+            self.session.session_key,
+            max_age=max_age,
+            expires=expires,
+            domain=settings.SESSION_COOKIE_DOMAIN,
+            path=settings.SESSION_COOKIE_PATH,
+            secure=settings.SESSION_COOKIE_SECURE or None,
+            httponly=settings.SESSION_COOKIE_HTTPONLY or None
+        )
+
+    @staticmethod
+    def _session_deleted_error():
+        return SuspiciousOperation(
+            "The request's session was deleted before the "
+            "request completed. The user may have logged "
+            "out in a concurrent request, for example."
+        )
+
+    def update_session(self):
+        if self._prepare_session_update():
+            try:
+                self.session.save()
+            except UpdateError:
+                raise self._session_deleted_error()
+            self._set_session_cookie()
+
+    async def aupdate_session(self):
+        """Async version of update_session()."""
+        if self._prepare_session_update():
+            try:
+                await self.session.asave()
+            except UpdateError:
+                raise self._session_deleted_error()
+            self._set_session_cookie()
@@ -16,4 +16,21 @@ class PickleSerializer:
         return pickle.loads(data)
 
 
+class MSGPackSerializer:
+    """
+    Compact binary serializer, requires msgpack package.
+    Same as json, tuples are loaded as lists.
+    """
+
+    def __init__(self):
+        import msgpack
+        self._msgpack = msgpack
+
+    def dumps(self, obj):
+        return self._msgpack.packb(obj, use_bin_type=True)
+
+    def loads(self, data):
+        return self._msgpack.unpackb(data, raw=False)
+
+
 JSONSerializer = BaseJSONSerializer
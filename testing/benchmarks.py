@@ -0,0 +1,436 @@
+"""Micro-benchmarks of performance critical framework parts."""
+from anthill.framework.utils.module_loading import import_string
+from itertools import islice
+import base64
+import datetime
+import decimal
+import hashlib
+import hmac
+import logging
+import random
+import string
+import timeit
+import time
+import uuid
+
+logger = logging.getLogger('anthill.application')
+
+
+def hash_ring_routing(nodes=8, keys=100000, replicas=None, ketama=False, repeat=3):
+    """
+    Measures per-key routing cost of the consistent hash ring.
+    Returns best time per key in microseconds.
+    """
+    from anthill.framework.core.cache.backends.redis.hash_ring import HashRing
+
+    ring = HashRing(['redis://node-%s:6379/0' % i for i in range(nodes)],
+                    replicas=replicas, ketama=ketama)
+    key_list = [':1:key-%s' % i for i in range(keys)]
+
+    def route():
+        get_node = ring.get_node
+        for key in key_list:
+            get_node(key)
+
+    best = min(timeit.repeat(route, number=1, repeat=repeat))
+    return best / keys * 1e6
+
+
+# Cache serializers and compressors
+
+REDIS_BACKENDS_PATH = 'anthill.framework.core.cache.backends.redis'
+
+SERIALIZERS = {
+    'pickle': REDIS_BACKENDS_PATH + '.serializers.pickle.PickleSerializer',
+    'json': REDIS_BACKENDS_PATH + '.serializers.json.JSONSerializer',
+    'msgpack': REDIS_BACKENDS_PATH + '.serializers.msgpack.MSGPackSerializer',
+}
+
+COMPRESSORS = {
+    'identity': REDIS_BACKENDS_PATH + '.compressors.identity.IdentityCompressor',
+    'zlib': REDIS_BACKENDS_PATH + '.compressors.zlib.ZlibCompressor',
+    'lz4': REDIS_BACKENDS_PATH + '.compressors.lz4.Lz4Compressor',
+    'lzma': REDIS_BACKENDS_PATH + '.compressors.lzma.LzmaCompressor',
+    'adaptive': REDIS_BACKENDS_PATH + '.compressors.adaptive.AdaptiveCompressor',
+}
+
+
+def _random_text(rnd, length):
+    return ''.join(rnd.choice(string.ascii_letters + ' ') for _ in range(length))
+
+
+def synthesize_payloads(count=50, seed=0):
+    """
+    Returns dict of payload kind -> list of values, looking like
+    session data, marshmallow dumps and permission blobs.
+    """
+    rnd = random.Random(seed)
+    now = datetime.datetime(2019, 1, 1)
+
+    def session():
+        return {
+            '_auth_user_id': str(rnd.randint(1, 10 ** 6)),
+            '_auth_user_backend': 'anthill.framework.auth.backends.ModelBackend',
+            '_auth_user_hash': uuid.UUID(int=rnd.getrandbits(128)).hex * 2,
+            '_session_expiry': rnd.randint(0, 1209600),
+            'csrf_token': uuid.UUID(int=rnd.getrandbits(128)).hex,
+            'locale': rnd.choice(['en', 'ru', 'de']),
+        }
+
+    def model_dump():
+        return [{
+            'id': rnd.randint(1, 10 ** 6),
+            'username': _random_text(rnd, 12),
+            'email': '%s@example.com' % _random_text(rnd, 8).replace(' ', ''),
+            'created': (now + datetime.timedelta(seconds=rnd.randint(0, 10 ** 7))).isoformat(),
+            'is_active': rnd.random() > 0.1,
+            'rating': round(rnd.random() * 100, 2),
+            'bio': _random_text(rnd, rnd.randint(0, 300)),
+        } for _ in range(rnd.randint(5, 50))]
+
+    def permissions():
+        domains = ['profile', 'store', 'message', 'game', 'admin']
+        return {
+            domain: [{
+                'domain': domain,
+                'action': rnd.choice(['read', 'write', '*']),
+                'target': rnd.choice(['*', str(rnd.randint(1, 1000))]),
+            } for _ in range(rnd.randint(1, 10))]
+            for domain in rnd.sample(domains, rnd.randint(1, len(domains)))
+        }
+
+    return {
+        'session': [session() for _ in range(count)],
+        'marshmallow': [model_dump() for _ in range(count)],
+        'permissions': [permissions() for _ in range(count)],
+    }
+
+
+def capture_payloads(cache, limit=200, pattern='*'):
+    """
+    Returns dict with values sampled from live redis cache, up to ``limit``
+    values from every shard. Integers are skipped, as they are stored
+    without serialization.
+    """
+    serverdict = getattr(cache.client, '_serverdict', None)
+    if serverdict is not None:
+        # Sharded client has no single connection.
+        clients = list(serverdict.values())
+    else:
+        clients = [cache.client.get_client(write=False)]
+    pattern = cache.client.make_pattern(pattern)
+    values = []
+    for client in clients:
+        for key in islice(client.scan_iter(match=pattern, count=100), limit):
+            raw = client.get(key)
+            if raw is None:
+                continue
+            value = cache.client.decode(raw)
+            if isinstance(value, int) and not isinstance(value, bool):
+                continue
+            values.append(value)
+    return {'captured': values}
+
+
+def _percentile(data, percent):
+    data = sorted(data)
+    if not data:
+        return 0.0
+    return data[min(len(data) - 1, int(len(data) * percent / 100))]
+
+
+def _load_codecs(names, paths, options):
+    codecs = {}
+    for name in names:
+        try:
+            codecs[name] = import_string(paths[name])(options=options)
+        except (ImportError, KeyError):
+            # Optional package is not installed.
+            continue
+    return codecs
+
+
+def benchmark_codec(serializer, compressor, values, repeat=20):
+    """
+    Runs ``values`` through serializer and compressor.
+    Returns dict with timings (microseconds), sizes and throughput
+    of serialized data. Raises exception if values can not be encoded.
+    """
+    encode_times, decode_times = [], []
+    raw_size = size = 0
+    lossless = True
+    for value in values:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            serialized = serializer.dumps(value)
+            encoded = compressor.compress(serialized)
+            encode_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            decoded = serializer.loads(compressor.decompress(encoded))
+            decode_times.append(time.perf_counter() - start)
+        raw_size += len(serializer.dumps(value))
+        size += len(encoded)
+        lossless = lossless and decoded == value
+
+    total_encode, total_decode = sum(encode_times), sum(decode_times)
+    return {
+        'encode_p99': _percentile(encode_times, 99) * 1e6,
+        'decode_p99': _percentile(decode_times, 99) * 1e6,
+        'encode_mean': total_encode / len(encode_times) * 1e6,
+        'decode_mean': total_decode / len(decode_times) * 1e6,
+        'encode_mb_s': raw_size * repeat / total_encode / 1e6 if total_encode else 0.0,
+        'decode_mb_s': raw_size * repeat / total_decode / 1e6 if total_decode else 0.0,
+        'size': size / len(values),
+        'serialized_size': raw_size / len(values),
+        'lossless': lossless,
+    }
+
+
+def _log_codec_error(payload, serializer, compressor, error):
+    logger.warning('Cannot encode %s payload with %s serializer and %s compressor: %s',
+                   payload, serializer, compressor, error)
+
+
+def cache_codecs(payloads=None, serializers=None, compressors=None, options=None, repeat=20,
+                 on_error=_log_codec_error):
+    """
+    Benchmarks every serializer x compressor combination on every payload kind.
+    Returns list of result dicts. Failed combinations have no result,
+    ``on_error(payload, serializer, compressor, error)`` is called for them.
+    """
+    payloads = payloads or synthesize_payloads()
+    options = options or {}
+    serializers = _load_codecs(serializers or SERIALIZERS, SERIALIZERS, options)
+    compressors = _load_codecs(compressors or COMPRESSORS, COMPRESSORS, options)
+
+    results = []
+    for kind, values in payloads.items():
+        if not values:
+            continue
+        for serializer_name, serializer in serializers.items():
+            for compressor_name, compressor in compressors.items():
+                try:
+                    result = benchmark_codec(serializer, compressor, values, repeat=repeat)
+                except Exception as e:
+                    on_error(kind, serializer_name, compressor_name, e)
+                    continue
+                result.update(payload=kind, serializer=serializer_name,
+                              compressor=compressor_name)
+                results.append(result)
+    return results
+
+
+def recommend_options(results, bandwidth=125e6):
+    """
+    Returns ``OPTIONS`` of the combination with the lowest cost, counting
+    p99 encode and decode time and time to transfer the value both ways
+    over the network of ``bandwidth`` bytes/s. Combinations lossy on any
+    payload kind (e.g. json turning tuples into lists), or failed on any
+    of them (those have no results), are skipped.
+    """
+    kinds = {result['payload'] for result in results}
+    costs, covered, lossy = {}, {}, set()
+    for result in results:
+        combination = result['serializer'], result['compressor']
+        if not result['lossless']:
+            lossy.add(combination)
+        cost = (result['encode_p99'] + result['decode_p99'] +
+                2 * result['size'] / bandwidth * 1e6)
+        costs[combination] = costs.get(combination, 0) + cost
+        covered.setdefault(combination, set()).add(result['payload'])
+    costs = {combination: cost for combination, cost in costs.items()
+             if combination not in lossy and covered[combination] == kinds}
+    if not costs:
+        return None
+    serializer, compressor = min(costs, key=costs.get)
+    return {
+        'SERIALIZER': SERIALIZERS[serializer],
+        'COMPRESSOR': COMPRESSORS[compressor],
+    }
+
+
+def format_report(results):
+    header = ('payload', 'serializer', 'compressor', 'size', 'enc p99 us', 'dec p99 us',
+              'enc MB/s', 'dec MB/s', 'lossless')
+    lines = ['%-12s %-10s %-10s %10s %11s %11s %9s %9s %9s' % header]
+    for r in sorted(results, key=lambda r: (r['payload'], r['encode_p99'] + r['decode_p99'])):
+        lines.append('%-12s %-10s %-10s %10d %11.1f %11.1f %9.1f %9.1f %9s' % (
+            r['payload'], r['serializer'], r['compressor'], r['size'],
+            r['encode_p99'], r['decode_p99'], r['encode_mb_s'], r['decode_mb_s'],
+            'yes' if r['lossless'] else 'no'))
+    return '\n'.join(lines)
+
+
+# Sessions
+
+SESSION_SERIALIZERS = {
+    'json': 'anthill.framework.sessions.serializers.JSONSerializer',
+    'pickle': 'anthill.framework.sessions.serializers.PickleSerializer',
+    'msgpack': 'anthill.framework.sessions.serializers.MSGPackSerializer',
+}
+
+
+def _legacy_session_codec(session, serializer):
+    """
+    Session encode/decode as done before the versioned format:
+    HMAC key derived on every call, hex digest, base64 of the whole.
+    """
+    from anthill.framework.conf import settings
+
+    key_salt = ("anthill.framework.sessions" + session.__class__.__name__).encode()
+
+    def hash(serialized):
+        key = hashlib.sha1(key_salt + settings.SECRET_KEY.encode()).digest()
+        return hmac.new(key, msg=serialized, digestmod=hashlib.sha1).hexdigest()
+
+    def encode(session_dict):
+        serialized = serializer().dumps(session_dict)
+        return base64.b64encode(hash(serialized).encode() + b':' + serialized).decode('ascii')
+
+    def decode(session_data):
+        digest, serialized = base64.b64decode(session_data.encode()).split(b':', 1)
+        if not hmac.compare_digest(digest.decode(), hash(serialized)):
+            raise ValueError('Session data corrupted')
+        return serializer().loads(serialized)
+
+    return encode, decode
+
+
+def session_codec(payload=None, serializers=None, number=10000, repeat=3):
+    """
+    Measures per-request CPU cost of session encode + decode round trip,
+    for the legacy and the current wire format with every serializer.
+    Returns dict of (format, serializer) -> best time in microseconds.
+    """
+    from anthill.framework.sessions.backends.base import SessionBase
+
+    payload = payload or synthesize_payloads(count=1)['session'][0]
+    session = SessionBase()
+    results = {}
+    for name in serializers or SESSION_SERIALIZERS:
+        try:
+            serializer = import_string(SESSION_SERIALIZERS[name])
+            serializer()
+        except ImportError:
+            # Optional package is not installed.
+            continue
+        session.serializer = serializer
+        codecs = {
+            'legacy': _legacy_session_codec(session, serializer),
+            'current': (session.encode, session.decode),
+        }
+        for fmt, (encode, decode) in codecs.items():
+            best = min(timeit.repeat(
+                lambda: decode(encode(payload)), number=number, repeat=repeat))
+            results[(fmt, name)] = best / number * 1e6
+    return results
+
+
+# JSON engines
+
+JSON_ENGINES = {
+    'json': 'anthill.framework.utils.jsonengine.JSONEngine',
+    'orjson': 'anthill.framework.utils.jsonengine.OrjsonEngine',
+}
+
+
+def _response_envelopes(payloads):
+    """Wraps payloads into handlers response envelopes with non-native values."""
+    now = datetime.datetime(2019, 1, 1)
+    envelopes = []
+    for i, data in enumerate(payloads['marshmallow'] + payloads['permissions']):
+        envelopes.append({
+            'meta': {'code': 200, 'message': 'OK', 'generated': now + datetime.timedelta(seconds=i)},
+            'data': data,
+            'balance': decimal.Decimal('%d.%02d' % (i, i % 100)),
+        })
+    return envelopes
+
+
+def json_engines(payloads=None, engines=None, repeat=20):
+    """
+    Measures dumps and loads of handlers response envelopes
+    with every JSON engine available.
+    Returns dict of engine -> dict of best times in microseconds per value.
+    """
+    from anthill.framework.utils.serializer import alchemy_default
+
+    payloads = payloads or synthesize_payloads()
+    envelopes = _response_envelopes(payloads)
+    results = {}
+    for name in engines or JSON_ENGINES:
+        try:
+            engine = import_string(JSON_ENGINES[name])()
+        except ImportError:
+            # Optional package is not installed.
+            continue
+        encoded = [engine.dumpb(v, default=alchemy_default) for v in envelopes]
+        dumps = min(timeit.repeat(
+            lambda: [engine.dumpb(v, default=alchemy_default) for v in envelopes],
+            number=1, repeat=repeat))
+        loads = min(timeit.repeat(
+            lambda: [engine.loads(v) for v in encoded], number=1, repeat=repeat))
+        results[name] = {
+            'dumps': dumps / len(envelopes) * 1e6,
+            'loads': loads / len(envelopes) * 1e6,
+            'size': sum(len(v) for v in encoded) / len(encoded),
+        }
+    return results
+
+
+# Model serializers
+
+def _legacy_model_dump(obj):
+    """Model instance dump as done before per-mapper serializers, by `dir()`."""
+    fields = {}
+    for field in [x for x in dir(obj)
+                  if not x.startswith('_') and not x.startswith('rel_') and x != 'metadata']:
+        data = getattr(obj, field)
+        fields[field] = data.isoformat() if hasattr(data, 'isoformat') else data
+    return fields
+
+
+def model_serializers(rows=10000, repeat=3):
+    """
+    Measures serialization of a list response of model instances,
+    by legacy `dir()` based dump and by compiled per-mapper serializers.
+    Returns dict of method -> best time in milliseconds per list.
+    """
+    from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float
+    from sqlalchemy.ext.declarative import declarative_base
+    from sqlalchemy.orm import configure_mappers
+    from anthill.framework.db.sqlalchemy.activerecord import ActiveRecordMixin
+    from anthill.framework.utils.serializer import get_model_serializer
+
+    class Row(ActiveRecordMixin, declarative_base()):
+        __tablename__ = 'benchmark_row'
+        id = Column(Integer, primary_key=True)
+        username = Column(String(64))
+        email = Column(String(128))
+        created = Column(DateTime)
+        is_active = Column(Boolean)
+        rating = Column(Float)
+        bio = Column(String(512))
+
+    configure_mappers()
+    rnd = random.Random(0)
+    now = datetime.datetime(2019, 1, 1)
+    objects = [Row(
+        id=i,
+        username=_random_text(rnd, 12),
+        email='%s@example.com' % _random_text(rnd, 8).replace(' ', ''),
+        created=now + datetime.timedelta(seconds=rnd.randint(0, 10 ** 7)),
+        is_active=rnd.random() > 0.1,
+        rating=round(rnd.random() * 100, 2),
+        bio=_random_text(rnd, rnd.randint(0, 300)),
+    ) for i in range(rows)]
+
+    serializer = get_model_serializer(Row)
+    methods = {
+        'legacy': lambda: [_legacy_model_dump(obj) for obj in objects],
+        'encoder': lambda: [serializer(obj) for obj in objects],
+        'to_dict': lambda: [obj.to_dict() for obj in objects],
+    }
+    return {name: min(timeit.repeat(method, number=1, repeat=repeat)) * 1e3
+            for name, method in methods.items()}
@@ -1,3 +1,4 @@
+from anthill.framework.utils.scoping import bind_context
 from tornado.concurrent import Future, chain_future
 from concurrent.futures import ThreadPoolExecutor
 from tornado.process import cpu_count
@@ -30,7 +31,8 @@ class ThreadPoolExecution:
         self._pool = ThreadPoolExecutor(max_workers=self._max_workers)
 
     def _as_future(self, func, *args, **kwargs):
-        c_future = self._pool.submit(func, *args, **kwargs)
+        # Keep the caller's scope (e.g. database session) inside the worker thread.
+        c_future = self._pool.submit(bind_context(func), *args, **kwargs)
         # Concurrent Futures are not usable with await. Wrap this in a
         # Tornado Future instead, using self.add_future for thread-safety.
         t_future = Future()
@@ -1,5 +1,5 @@
 from anthill.framework.core.cache import cache
-from anthill.framework.utils.asynchronous import thread_pool_exec as async_exec
+from anthill.framework.core.cache.tags import TaggedCache
 from anthill.framework.utils.encoding import force_bytes, iri_to_uri
 from anthill.framework.conf import settings
 from anthill.framework.http import HttpNotAllowedError
@@ -15,8 +15,28 @@ __all__ = [
 ]
 
 
-def _cached(timeout, key, cache=cache, key_prefix=None, handler_method=False, http_method=None):
+def _db_scoped(producer):
+    """
+    Value may be computed in background, outliving the request,
+    so it gets its own database session, if database is used.
+    """
+    from anthill.framework.apps import app
+    from anthill.framework.apps.cls import ApplicationExtensionNotRegistered
+    try:
+        db = app.db
+    except ApplicationExtensionNotRegistered:
+        return producer
+    return db.scoped(producer)
+
+
+def _cached(timeout, key, cache=cache, key_prefix=None, handler_method=False, http_method=None,
+            stale_timeout=0, tags=()):
+    if tags and stale_timeout:
+        raise ValueError('stale_timeout is not supported for tagged cache values.')
+
     def decorator(func):
+        tagged = TaggedCache(cache) if tags else None
+
         def get_key(handler):
             if callable(key):
                 return key(handler, timeout, key_prefix, cache) if handler_method else key()
@@ -31,6 +51,8 @@ def _cached(timeout, key, cache=cache, key_prefix=None, handler_method=False, ht
         def wrapper(*args, **kwargs):
             validate_http_method(args[0])
             k = get_key(args[0])
+            if tagged is not None:
+                return tagged.get_or_set(k, partial(func, *args, **kwargs), timeout, tags=tags)
             result = cache.get(k)
             if result is None:
                 result = func(*args, **kwargs)
@@ -41,11 +63,13 @@ def _cached(timeout, key, cache=cache, key_prefix=None, handler_method=False, ht
         async def wrapper_async(*args, **kwargs):
             validate_http_method(args[0])
             k = get_key(args[0])
-            result = await async_exec(cache.get, k)
-            if result is None:
-                result = await func(*args, **kwargs)
-                await async_exec(cache.set, k, result, timeout)
-            return result
+            producer = _db_scoped(partial(func, *args, **kwargs))
+            if tagged is not None:
+                return await tagged.aget_or_set(k, producer, timeout=timeout, tags=tags)
+            # Concurrent callers share one computation,
+            # stale value is served while it is recomputed.
+            return await cache.aget_or_set(
+                k, producer, ttl=timeout, stale_ttl=stale_timeout)
 
         if inspect.iscoroutinefunction(func):
             return wrapper_async
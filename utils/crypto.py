@@ -1,6 +1,7 @@
 """
 Crypto functions and utilities.
 """
+import functools
 import hashlib
 import hmac
 import random
@@ -21,19 +22,13 @@ except NotImplementedError:
     using_sysrandom = False
 
 
-def salted_hmac(key_salt, value, secret=None):
+@functools.lru_cache(maxsize=256)
+def _salted_hmac_base(key_salt, secret):
     """
-    Return the HMAC-SHA1 of 'value', using a key generated from key_salt and a
-    secret (which defaults to settings.SECRET_KEY).
-
-    A different key_salt should be passed in for every application of HMAC.
+    Return HMAC object keyed with the key derived from key_salt and secret.
+    Derived key and HMAC pads are computed once per (key_salt, secret) pair,
+    the object is copied for every message.
     """
-    if secret is None:
-        secret = settings.SECRET_KEY
-
-    key_salt = force_bytes(key_salt)
-    secret = force_bytes(secret)
-
     # We need to generate a derived key from our base key.  We can do this by
     # passing the key_salt and our base key through a pseudo-random function and
     # SHA1 works nicely.
@@ -43,7 +38,22 @@ def salted_hmac(key_salt, value, secret=None):
     # line is redundant and could be replaced by key = key_salt + secret, since
     # the hmac module does the same thing for keys longer than the block size.
     # However, we need to ensure that we *always* do this.
-    return hmac.new(key, msg=force_bytes(value), digestmod=hashlib.sha1)
+    return hmac.new(key, digestmod=hashlib.sha1)
+
+
+def salted_hmac(key_salt, value, secret=None):
+    """
+    Return the HMAC-SHA1 of 'value', using a key generated from key_salt and a
+    secret (which defaults to settings.SECRET_KEY).
+
+    A different key_salt should be passed in for every application of HMAC.
+    """
+    if secret is None:
+        secret = settings.SECRET_KEY
+
+    mac = _salted_hmac_base(force_bytes(key_salt), force_bytes(secret)).copy()
+    mac.update(force_bytes(value))
+    return mac
 
 
 def get_random_string(length=12,
@@ -1,9 +1,9 @@
 from functools import update_wrapper
 from tornado.web import (
-    url, RedirectHandler, RequestHandler, authenticated as _authenticated)
+    url, RedirectHandler, RequestHandler, authenticated as tornado_authenticated)
 from functools import wraps, partial
 from tornado.gen import sleep
-from inspect import iscoroutinefunction
+from inspect import iscoroutinefunction, isawaitable
 import logging
 
 
@@ -206,6 +206,25 @@ def auth_generic_route(uri, template, handler):
     return AuthHandler
 
 
+def _authenticated(method):
+    """
+    tornado.web.authenticated resolving the current user before,
+    as it is not preloaded by default.
+    """
+    check = tornado_authenticated(method)
+
+    @wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        if hasattr(self, 'aget_current_user'):
+            await self.aget_current_user()
+        result = check(self, *args, **kwargs)
+        if isawaitable(result):
+            result = await result
+        return result
+
+    return wrapper
+
+
 def authenticated(methods=None):
     """
     Extension for tornado.web.authenticated decorator.
@@ -0,0 +1,109 @@
+"""
+Pluggable JSON engine.
+
+The engine is selected with ``JSON_ENGINE`` setting:
+
+* ``'json'`` - standard library module (default);
+* ``'orjson'`` - orjson, if installed;
+* dotted path to a custom engine class.
+
+Output is compact UTF-8 JSON with any engine. Objects the engine
+can't serialize natively are passed to the ``default`` hook,
+e.g. ``anthill.framework.utils.serializer.json_default``.
+"""
+import functools
+import json
+import logging
+
+from anthill.framework.utils.module_loading import import_string
+
+__all__ = ['JSONEngine', 'OrjsonEngine', 'get_engine', 'dumps', 'dumpb', 'loads']
+
+logger = logging.getLogger('anthill.application')
+
+
+class JSONEngine:
+    """JSON engine based on standard library ``json`` module."""
+    name = 'json'
+
+    def dumps(self, obj, default=None, sort_keys=False, indent=None):
+        """Serialize ``obj`` to JSON string."""
+        separators = (',', ': ') if indent is not None else (',', ':')
+        return json.dumps(obj, default=default, sort_keys=sort_keys, indent=indent,
+                          separators=separators, ensure_ascii=False)
+
+    def dumpb(self, obj, default=None, sort_keys=False, indent=None):
+        """Serialize ``obj`` to UTF-8 encoded JSON bytes."""
+        return self.dumps(obj, default=default, sort_keys=sort_keys, indent=indent).encode('utf-8')
+
+    def loads(self, s):
+        """Deserialize JSON ``str`` or ``bytes``."""
+        return json.loads(s)
+
+
+class OrjsonEngine(JSONEngine):
+    """
+    JSON engine based on ``orjson``.
+
+    Date and time objects are passed to ``default`` hook,
+    so they are serialized the same way as with standard engine.
+    """
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+        self._option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def _get_option(self, sort_keys, indent):
+        option = self._option
+        if sort_keys:
+            option |= self._orjson.OPT_SORT_KEYS
+        if indent is not None:
+            # orjson supports only 2 spaces indentation.
+            option |= self._orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, default=None, sort_keys=False, indent=None):
+        return self.dumpb(obj, default=default, sort_keys=sort_keys, indent=indent).decode('utf-8')
+
+    def dumpb(self, obj, default=None, sort_keys=False, indent=None):
+        return self._orjson.dumps(obj, default=default, option=self._get_option(sort_keys, indent))
+
+    def loads(self, s):
+        return self._orjson.loads(s)
+
+
+ENGINES = {
+    'json': JSONEngine,
+    'orjson': OrjsonEngine,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _load_engine(name):
+    engine_class = ENGINES.get(name) or import_string(name)
+    try:
+        return engine_class()
+    except ImportError as e:
+        logger.warning('JSON engine `%s` is not available (%s), '
+                       'standard json module is used.' % (name, e))
+        return JSONEngine()
+
+
+def get_engine():
+    """Return JSON engine configured with ``JSON_ENGINE`` setting."""
+    from anthill.framework.conf import settings
+    return _load_engine(getattr(settings, 'JSON_ENGINE', None) or 'json')
+
+
+def dumps(obj, default=None, sort_keys=False, indent=None):
+    return get_engine().dumps(obj, default=default, sort_keys=sort_keys, indent=indent)
+
+
+def dumpb(obj, default=None, sort_keys=False, indent=None):
+    return get_engine().dumpb(obj, default=default, sort_keys=sort_keys, indent=indent)
+
+
+def loads(s):
+    return get_engine().loads(s)
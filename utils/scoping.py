@@ -0,0 +1,89 @@
+"""
+Context-local scopes.
+
+Scope identity is kept in a context variable, so every request, websocket
+message or background task running on the same IOLoop thread gets its own
+scope. Falls back to thread identity if ``contextvars`` is not available
+(Python < 3.7).
+"""
+from contextlib import contextmanager
+from _thread import get_ident
+import functools
+import itertools
+
+try:
+    import contextvars
+except ImportError:  # Python < 3.7
+    contextvars = None
+
+__all__ = [
+    'get_scope_ident', 'new_scope', 'use_scope', 'run_in_new_scope', 'bind_context'
+]
+
+_counter = itertools.count()
+
+if contextvars is not None:
+    _current_scope = contextvars.ContextVar('anthill_scope', default=None)
+else:
+    _current_scope = None
+
+
+def get_scope_ident():
+    """
+    Returns identity of the current scope.
+    Outside of any scope returns identity of the current thread.
+    """
+    if _current_scope is not None:
+        scope = _current_scope.get()
+        if scope is not None:
+            return scope
+    return get_ident()
+
+
+def _next_scope():
+    return 'scope-%s' % next(_counter)
+
+
+@contextmanager
+def use_scope(scope=None):
+    """
+    Activates ``scope`` (or a brand new one) for the duration of
+    the ``with`` block. Yields scope identity.
+    """
+    if _current_scope is None:
+        yield get_ident()
+        return
+    token = _current_scope.set(scope or _next_scope())
+    try:
+        yield _current_scope.get()
+    finally:
+        _current_scope.reset(token)
+
+
+new_scope = functools.partial(use_scope, None)
+
+
+def _run_in_new_scope(func, args, kwargs):
+    _current_scope.set(_next_scope())
+    return func(*args, **kwargs)
+
+
+def run_in_new_scope(func, *args, **kwargs):
+    """
+    Calls ``func`` in a copy of the current context with a new scope activated.
+    All tasks and callbacks started by ``func`` inherit that scope.
+    """
+    if contextvars is None:
+        return func(*args, **kwargs)
+    context = contextvars.copy_context()
+    return context.run(_run_in_new_scope, func, args, kwargs)
+
+
+def bind_context(func):
+    """
+    Binds ``func`` to a copy of the current context,
+    so it keeps the current scope when called from another thread.
+    """
+    if contextvars is None:
+        return func
+    return functools.partial(contextvars.copy_context().run, func)
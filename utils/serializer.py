@@ -1,78 +1,127 @@
 from anthill.framework.utils.duration import duration_iso_string
 from anthill.framework.utils.functional import Promise
 from anthill.framework.utils.timezone import is_aware
+from sqlalchemy import inspect
 from sqlalchemy.ext.declarative import DeclarativeMeta
 from sqlalchemy.orm import state
 from tornado import escape
 import datetime
 import decimal
 import json
+import keyword
 import uuid
 
 
+def anthill_default(o):
+    """
+    Encode date/time, decimal types, and UUIDs.
+    Default hook for json encoders, raises TypeError for other objects.
+    """
+    # See "Date Time String Format" in the ECMA-262 specification.
+    if isinstance(o, datetime.datetime):
+        r = o.isoformat()
+        if o.microsecond:
+            r = r[:23] + r[26:]
+        if r.endswith('+00:00'):
+            r = r[:-6] + 'Z'
+        return r
+    elif isinstance(o, datetime.date):
+        return o.isoformat()
+    elif isinstance(o, datetime.time):
+        if is_aware(o):
+            raise ValueError("JSON can't represent timezone-aware times.")
+        r = o.isoformat()
+        if o.microsecond:
+            r = r[:12]
+        return r
+    elif isinstance(o, datetime.timedelta):
+        return duration_iso_string(o)
+    elif isinstance(o, (decimal.Decimal, uuid.UUID, Promise)):
+        return str(o)
+    raise TypeError('Object of type %s is not JSON serializable' % o.__class__.__name__)
+
+
+def compile_serializer(fields, name='serialize'):
+    """
+    Returns function turning an object into dict in one pass.
+
+    :param fields: sequence of ``(key, attribute, convert)`` triples, where
+        ``convert`` is a callable applied to the attribute value, or None.
+    """
+    namespace = {'_getattr': getattr}
+    items = []
+    for i, (key, attr, convert) in enumerate(fields):
+        if attr.isidentifier() and not keyword.iskeyword(attr):
+            value = 'obj.%s' % attr
+        else:
+            value = '_getattr(obj, %r)' % attr
+        if convert is not None:
+            namespace['_convert%d' % i] = convert
+            value = '_convert%d(%s)' % (i, value)
+        items.append('%r: %s' % (key, value))
+    source = 'def %s(obj):\n    return {%s}\n' % (name, ', '.join(items))
+    exec(source, namespace)
+    return namespace[name]
+
+
+def get_model_serializer(model):
+    """
+    Returns serializer of SQLAlchemy model instances used by json encoders,
+    compiled once per model class.
+
+    Columns and relationships are included, except names starting
+    with ``_`` or ``rel_``. Values are left for the encoder to convert.
+    """
+    try:
+        return model.__dict__['__json_serializer__']
+    except KeyError:
+        pass
+    mapper = inspect(model)
+    fields = [
+        (prop.key, prop.key, None)
+        for prop in list(mapper.column_attrs) + list(mapper.relationships)
+        if not prop.key.startswith(('_', 'rel_'))
+    ]
+    serializer = compile_serializer(fields, name='serialize_%s' % model.__name__)
+    setattr(model, '__json_serializer__', serializer)
+    return serializer
+
+
+def alchemy_default(obj):
+    """
+    Encode SQLAlchemy model instances and result rows, bytes
+    and objects with `isoformat`, falling back to `anthill_default`.
+    Default hook for json encoders, raises TypeError for other objects.
+    """
+    if isinstance(obj, state.InstanceState):
+        return None
+    if isinstance(obj.__class__, DeclarativeMeta):  # an SQLAlchemy class
+        return get_model_serializer(obj.__class__)(obj)
+    if isinstance(obj, bytes):
+        return escape.to_unicode(obj)
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    if isinstance(obj, tuple) or hasattr(obj, '_fields'):
+        # Result rows, encoded as lists same as plain tuples.
+        return list(obj)
+    return anthill_default(obj)
+
+
 class AnthillJSONEncoder(json.JSONEncoder):
     """
     JSONEncoder subclass that knows how to encode date/time, decimal types, and
     UUIDs.
     """
     def default(self, o):
-        # See "Date Time String Format" in the ECMA-262 specification.
-        if isinstance(o, datetime.datetime):
-            r = o.isoformat()
-            if o.microsecond:
-                r = r[:23] + r[26:]
-            if r.endswith('+00:00'):
-                r = r[:-6] + 'Z'
-            return r
-        elif isinstance(o, datetime.date):
-            return o.isoformat()
-        elif isinstance(o, datetime.time):
-            if is_aware(o):
-                raise ValueError("JSON can't represent timezone-aware times.")
-            r = o.isoformat()
-            if o.microsecond:
-                r = r[:12]
-            return r
-        elif isinstance(o, datetime.timedelta):
-            return duration_iso_string(o)
-        elif isinstance(o, (decimal.Decimal, uuid.UUID, Promise)):
-            return str(o)
-        else:
+        try:
+            return anthill_default(o)
+        except TypeError:
             return super().default(o)
 
 
 class AlchemyJSONEncoder(json.JSONEncoder):
     def default(self, obj):
-        def dump_sqlalchemy_obj(sqlalchemy_obj):
-            fields = {}
-            for field in [x for x in dir(sqlalchemy_obj)
-                          if not x.startswith('_')  # sqlalch builtin attr
-                             and not x.startswith('rel_')  # for my attr, which are references to other tbls
-                             and x != 'metadata']:
-                data = sqlalchemy_obj.__getattribute__(field)
-                try:
-                    # this will fail on non-encodable values, like other classes
-                    # also deals with every type which has an `isoformat` attr, like
-                    # datetime.datetime
-                    if hasattr(data, 'isoformat'):
-                        fields[field] = data.isoformat()
-                    # # no need of this if we are not taking `rel_*` attrs
-                    # elif isinstance(data.__class__, DeclarativeMeta): # an SQLAlchemy class
-                    # fields[field] = dump_sqlalchemy_obj(data)
-                    else:
-                        fields[field] = dump_sqlalchemy_obj(data) if isinstance(data.__class__,
-                                                                                DeclarativeMeta) else data
-                except TypeError:
-                    fields[field] = None
-            # a json-encodable dict
-            return fields
-
-        if isinstance(obj, state.InstanceState):
-            return None
-        if isinstance(obj.__class__, DeclarativeMeta):  # an SQLAlchemy class
-            return dump_sqlalchemy_obj(obj)
-        if isinstance(obj, bytes):
-            return escape.to_unicode(obj)
-        if hasattr(obj, 'isoformat'):
-            return obj.isoformat()
-        return json.JSONEncoder.default(self, obj)
+        try:
+            return alchemy_default(obj)
+        except TypeError:
+            return json.JSONEncoder.default(self, obj)